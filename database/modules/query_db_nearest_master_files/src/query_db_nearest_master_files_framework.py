@@ -3,11 +3,12 @@ import configparser as cp
 from datetime import datetime, timezone
 import psycopg2
 import re
-import hashlib
 import ast
 
 # Pipeline dependencies
 from kpfpipe.logger import *
+from kpfpipe.tools.checksum_tools import verify_md5
+from kpfpipe.tools.db_tools import db_connection, get_db_version
 from kpfpipe.models.level0 import KPF0
 from kpfpipe.primitives.level0 import KPF0_Primitive
 from kpfpipe.pipelines.fits_primitives import to_fits
@@ -16,14 +17,9 @@ from keckdrpframework.models.arguments import Arguments
 # Global read-only variables
 DEFAULT_CFG_PATH = 'database/modules/query_db_nearest_master_files/configs/default.cfg'
 
-def md5(fname):
-    hash_md5 = hashlib.md5()
-    
+def verify_checksum(fname,checksum):
     try:
-        with open(fname, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        return verify_md5(fname,checksum)
     except:
         print("*** Error: Cannot open file =",fname,"; quitting...")
         exit(65)
@@ -102,47 +98,20 @@ class QueryDBNearestMasterFilesFramework(KPF0_Primitive):
         self.logger.info('master_file_path = {}'.format(master_file_path))
 
 
-        # Get database connection parameters from environment.
-
-        dbport = os.getenv('DBPORT')
-        dbname = os.getenv('DBNAME')
-        dbuser = os.getenv('DBUSER')
-        dbpass = os.getenv('DBPASS')
-        dbserver = os.getenv('DBSERVER')
-
-
-        # Connect to database
+        # Connect to database, with a connection of the pool of this process.
+        # The database version is queried once per process.
 
         try:
-            conn = psycopg2.connect(host=dbserver,database=dbname,port=dbport,user=dbuser,password=dbpass)
-        except:
+            with db_connection() as conn:
+                db_version = get_db_version(conn)
+        except psycopg2.OperationalError:
             print("Could not connect to database...")
             self.logger.info('Could not connect to database...')
             return Arguments(64)
 
-        # Open database cursor.
-
-        cur = conn.cursor()
-
-
-        # Select database version.
-
-        q1 = 'SELECT version();'
-        self.logger.info('q1 = {}'.format(q1))
-        cur.execute(q1)
-        db_version = cur.fetchone()
         self.logger.info('PostgreSQL database version = {}'.format(db_version))
 
 
-        # Check database current_user.
-
-        q2 = 'SELECT current_user;'
-        self.logger.info('q2 = {}'.format(q2))
-        cur.execute(q2)
-        for record in cur:
-            self.logger.info('record = {}'.format(record))
-
-
         # Define query template.
 
         query_template =\
@@ -194,8 +163,10 @@ class QueryDBNearestMasterFilesFramework(KPF0_Primitive):
 
                 self.logger.info('query = {}'.format(query))
 
-                cur.execute(query)
-                record = cur.fetchone()
+                with db_connection() as conn:
+                    with conn.cursor() as cur:
+                        cur.execute(query)
+                        record = cur.fetchone()
 
                 if record is not None:
                     cId = record[0]
@@ -217,12 +188,12 @@ class QueryDBNearestMasterFilesFramework(KPF0_Primitive):
                     self.logger.info('File existence = {}'.format(isExist))
 
 
-                    # Compute checksum and compare with database value.
+                    # Compare checksum with database value (the file is only read if its checksum is not cached).
 
-                    cksum = md5(filename)
-                    self.logger.info('cksum = {}'.format(cksum))
+                    checksum_ok = verify_checksum(filename,checksum)
+                    self.logger.info('checksum_ok = {}'.format(checksum_ok))
 
-                    if cksum == checksum:
+                    if checksum_ok:
                         print("File checksum is correct...")
                     else:
                         print("*** Error: File checksum is incorrect; quitting...")
@@ -234,18 +205,6 @@ class QueryDBNearestMasterFilesFramework(KPF0_Primitive):
                     query_db_nearest_master_files_exit_code = 0
 
                 
-        # Close database cursor and then connection.
-
-        try:
-            cur.close()
-        except (Exception, psycopg2.DatabaseError) as error:
-            print(error)
-            query_db_nearest_master_files_exit_code = 1
-        finally:
-            if conn is not None:
-                conn.close()
-                print('Database connection closed.')
-
         self.logger.info('Finished {}'.format(self.__class__.__name__))
 
         exit_list = [query_db_nearest_master_files_exit_code,nearest_master_files_list]
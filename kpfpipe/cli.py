@@ -24,6 +24,7 @@ from keckdrpframework.config.framework_config import ConfigClass
 
 from kpfpipe.pipelines.kpfpipeline import KPFPipeline
 from kpfpipe.logger import start_logger
+from kpfpipe.tools.git_tools import get_git_provenance
 
 # This is the default framework configuration file path
 framework_config = 'configs/framework.cfg'
@@ -44,6 +45,9 @@ def _parseArguments(in_args: list) -> argparse.Namespace:
     parser.add_argument('-c', '--config', required=True, dest="config_file", type=str, help="Configuration file")
     parser.add_argument('--date', dest='date', type=str, default=None, help="Date for the data to be processed.")
     parser.add_argument('-n', '--ncpus', dest='ncpus', type=int, default=1, help="Number of CPU cores to utilize.")
+    parser.add_argument('--max-pending', dest='max_pending', type=int, default=None,
+                        help="For use with --reprocess and --ncpus > 1. Maximum number of files waiting in the "
+                             "event queue while existing files are queued, 2 per worker by default.")
 
 
     args = parser.parse_args(in_args[1:])
@@ -51,7 +55,7 @@ def _parseArguments(in_args: list) -> argparse.Namespace:
     return args
 
 
-def worker(worker_num, pipeline_config, framework_logcfg_file, framework_config_file):
+def worker(worker_num, pipeline_config, framework_logcfg_file, framework_config_file, recipe=None):
     """The worker framework instances that will execute items from the queue
 
     Parameters
@@ -64,6 +68,8 @@ def worker(worker_num, pipeline_config, framework_logcfg_file, framework_config_
         Logger config file
     framework_config_file : str
         Framework config file
+    recipe : str
+        Recipe file, compiled and with its primitive modules imported before waiting for events
     """
     # Initialize the framework however you normally do
     try:
@@ -83,9 +89,44 @@ def worker(worker_num, pipeline_config, framework_logcfg_file, framework_config_
     # tells this instance to wait for something to happen, forever
     # qm_only=False, ingest_data_only=False,
     framework.pipeline.start(pipeline_config)
+    framework.pipeline.worker_stats.name = f'KPFPipe-{worker_num}'
+    if recipe is not None:
+        framework.pipeline.preload_recipe(recipe)
+        framework.logger.info(f"Preloaded recipe {recipe}")
     framework.start(wait_for_event=True, continuous=True)
 
 
+def enqueue_files(framework, arg, files, max_pending=None, poll_interval=0.5):
+    """Append a next_file event for each file to the event queue
+
+    Each event gets its own copy of the arguments, with the time it was queued for the latency
+    statistics of the workers.
+
+    Parameters
+    ----------
+    framework : Framework
+        Framework owning the event queue
+    arg : Arguments
+        Arguments of the events, e.g. the recipe
+    files : list
+        Paths of the files
+    max_pending : int
+        If set, wait before queueing a file while this many events are pending, so that
+        files arriving in the meantime are not queued behind all the files
+    poll_interval : float
+        Seconds between checks of the queue size while waiting
+    """
+    for fname in files:
+        if max_pending:
+            while framework.event_queue.qsize() >= max_pending:
+                time.sleep(poll_interval)
+        file_arg = copy(arg)
+        file_arg.file_path = fname
+        file_arg.watch = True
+        file_arg.queued_at = time.time()
+        framework.append_event('next_file', file_arg)
+
+
 class FileAlarm(PatternMatchingEventHandler):
     def __init__(self, framework, arg, patterns=["*"], cooldown=1):
         PatternMatchingEventHandler.__init__(self, patterns=patterns,
@@ -127,7 +168,8 @@ class FileAlarm(PatternMatchingEventHandler):
 
         self.arg.date_dir = os.path.basename(os.path.dirname(self.arg.file_path))
         if self.arg.file_path.endswith('.fits') and self.check_redundant(event):
-            self.framework.append_event('next_file', self.arg)
+            self.arg.queued_at = time.time()
+            self.framework.append_event('next_file', copy(self.arg))
 
     def on_modified(self, event):
         self.logging.info("File modification event: {}".format(event.src_path))
@@ -153,6 +195,8 @@ def main():
     This is executed when 'kpfpipe' is called from commandline 
     '''
     args = _parseArguments(sys.argv)
+    # Resolve the git provenance for data receipts once, before any worker processes are started
+    get_git_provenance()
     # Set the pipeline and read the config file.
     # Using configparser for any configuration reading on the pipeline's
     # level and below. 
@@ -161,32 +205,34 @@ def main():
     recipe = args.recipe
     datestr = datetime.now().strftime(format='%Y%m%d')
 
-    # Using the multiprocessing library, create the specified number of instances
-    if args.watch and args.ncpus > 1:
-        frame_config = 'configs/framework_multi.cfg'
-        for i in range(args.ncpus):
-            # This could be done with a careful use of subprocess.Popen, if that's more your style
-            p = Process(target=worker, args=(i, pipe_config, framework_logcfg, frame_config))
-            p.start()
-    else:
-        frame_config = framework_config
+    multi_worker = args.watch and args.ncpus > 1
+    frame_config = 'configs/framework_multi.cfg' if multi_worker else framework_config
 
     # Try to initialize the framework
+    # In multi-worker mode this starts the queue manager, before any worker tries to connect to it
     try:
         framework = Framework(pipe, frame_config)
         framework.pipeline.start(pipe_config)
     except Exception as e:
-        framework.pipeline.logger.error("Failed to initialize framework, exiting ...", e)
+        print("Failed to initialize framework, exiting ...", e)
         traceback.print_exc()
         sys.exit(1)
     arg = Arguments(name='action_args')
     arg.recipe = recipe
-    # watch mode
 
+    # Using the multiprocessing library, create the specified number of instances
+    workers = []
+    if multi_worker:
+        for i in range(args.ncpus):
+            # This could be done with a careful use of subprocess.Popen, if that's more your style
+            p = Process(target=worker, args=(i, pipe_config, framework_logcfg, frame_config, recipe))
+            p.start()
+            workers.append(p)
 
+    # watch mode
     if args.watch != None:
-        framework.logger.info("Starting queue manager only, no processing")
-        framework._get_queue_manager(ConfigClass(frame_config))
+        if multi_worker:
+            framework.logger.info("Starting queue manager only, no processing")
 
         framework.pipeline.logger.info("Waiting for files to appear in {}".format(args.watch))
         framework.pipeline.logger.info("Getting existing file list.")
@@ -201,22 +247,30 @@ def main():
 
         if args.reprocess:
             framework.pipeline.logger.info("Found {:d} files to process.".format(len(infiles)))
+            arg.date_dir = datestr
 
-            for fname in infiles:
-                arg = arg
-                arg.date_dir = datestr
-                arg.file_path = fname
-                arg.watch = True
-                framework.append_event('next_file', arg)
-                time.sleep(0.2)
-                            
-            while len(framework.get_pending_events()[0]) > 0:
-                framework.pipeline.logger.debug("Waiting for event queue to clear {}".format(framework.get_pending_events()[0]))
-                time.sleep(3)
-
-            framework.append_event('exit', arg)
-
-        if args.ncpus > 1:
+            if multi_worker:
+                # keep the workers busy without queueing the whole night ahead of new files
+                max_pending = args.max_pending if args.max_pending else 2 * args.ncpus
+                enqueue_files(framework, arg, infiles, max_pending=max_pending)
+                # one exit per worker, each worker takes it after its last file
+                for _ in workers:
+                    framework.append_event('exit', arg)
+                for p in workers:
+                    p.join()
+                framework.pipeline.logger.info("Finished reprocessing {:d} files.".format(len(infiles)))
+                observer.stop()
+                try:
+                    framework.event_queue.terminate()
+                except Exception:
+                    pass
+                os._exit(0)
+            else:
+                # the files are processed once the framework starts below
+                enqueue_files(framework, arg, infiles)
+                framework.append_event('exit', arg)
+
+        if multi_worker:
             framework.start(qm_only=True)
         else:
             framework.start(wait_for_event=True, continuous=True)
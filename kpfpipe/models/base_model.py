@@ -18,12 +18,12 @@ from astropy.time import Time
 from astropy.table import Table
 import numpy as np
 import pandas as pd
-import git
 import datetime
-import hashlib
 
 # Pipeline dependencies
 from kpfpipe.tools.git_tools import *
+from kpfpipe.tools.checksum_tools import md5_file
+from kpfpipe.tools.reference_cache import load_reference
 from kpfpipe.models.metadata.receipt_columns import *
 from kpfpipe.models.metadata.config_columns import *
 from kpfpipe.models.metadata.KPF_definitions import FITS_TYPE_MAP
@@ -128,8 +128,9 @@ class KPFDataModel(object):
         self.header['RECEIPT'] = fits.Header()
         self.header['CONFIG'] = fits.Header()
 
+        # receipt rows added since the receipt DataFrame was last accessed
+        self._receipt_rows = []
         self.receipt = pd.DataFrame([], columns=RECEIPT_COL)
-        self.RECEIPT = self.receipt
 
         self.config = pd.DataFrame([], columns=CONFIG_COL)
         self.CONFIG = self.config
@@ -146,6 +147,41 @@ class KPFDataModel(object):
         self.level = None # set in each derived class
         self.read_methods = dict()
 
+        # extensions of a lazily read file that are not materialized yet,
+        # and the open HDU list they are read from
+        self._lazy_extensions = OrderedDict()
+        self._lazy_hdul = None
+
+    def __getattr__(self, name):
+        # only called when the attribute is not found, e.g. for an extension
+        # of a lazily read file that has not been accessed yet
+        lazy_extensions = self.__dict__.get('_lazy_extensions')
+        if lazy_extensions is None or name not in lazy_extensions:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        value = lazy_extensions.pop(name)()
+        setattr(self, name, value)
+        return value
+
+    @property
+    def receipt(self):
+        # materialize the rows added by receipt_add_entry() in one concatenation
+        if self._receipt_rows:
+            rows = pd.DataFrame(self._receipt_rows)
+            self._receipt_rows = []
+            if len(self._receipt) == 0:
+                self._receipt = rows.reindex(columns=self._receipt.columns.union(rows.columns, sort=False))
+            else:
+                self._receipt = pd.concat([self._receipt, rows], ignore_index=True)
+        return self._receipt
+
+    @receipt.setter
+    def receipt(self, value):
+        self._receipt_rows = []
+        self._receipt = value
+
+    # RECEIPT is the extension name of the receipt
+    RECEIPT = receipt
+
     def __getitem__(self, key):
         return getattr(self, key.upper())
 
@@ -163,7 +199,7 @@ class KPFDataModel(object):
 # =============================================================================
 # I/O related methods
     @classmethod
-    def from_fits(cls, fn, data_type='KPF'):
+    def from_fits(cls, fn, data_type='KPF', lazy=False, cache=False):
         """Create a data instance from a file
 
         This method emplys the ``read`` method for reading the file. Refer to 
@@ -172,20 +208,28 @@ class KPFDataModel(object):
         Args: 
             fn (str): file path (relative to the repository)
             data_type (str): (optional) instrument type of the file [default='KPF']
+            lazy (bool): (optional) defer reading the extension data until first accessed [default=False]
+            cache (bool): (optional) for static reference files (master calibrations, order masks, ...)
+                read many times by a process: return a copy of the instance kept in the process-wide
+                reference data cache, see :func:`kpfpipe.tools.reference_cache.load_reference`.
+                Ignored if lazy is set [default=False]
             
         Returns: 
             cls (data model class): the data instance containing the file content
 
         """
+        if cache and not lazy and os.path.isfile(fn):
+            return load_reference(fn, lambda f: cls.from_fits(f, data_type=data_type),
+                                  kind='{}.from_fits:{}'.format(cls.__name__, data_type))
         this_data = cls()
         if not os.path.isfile(fn):
             this_data.to_fits(fn)
         # populate it with self.read()
-        this_data.read(fn, data_type=data_type)
+        this_data.read(fn, data_type=data_type, lazy=lazy)
         # Return this instance
         return this_data
 
-    def read(self, fn, data_type, overwrite=False):
+    def read(self, fn, data_type, overwrite=False, lazy=False):
         """Read the content of a .fits file and populate this 
         data structure. 
 
@@ -193,6 +237,10 @@ class KPFDataModel(object):
             fn (str): file path (relative to the repository)
             data_type (str): instrument type of the file
             overwrite (bool): if this instance is not empty, specifies whether to overwrite
+            lazy (bool): if True, the file is memory-mapped and kept open, and the data of 
+                image and table extensions (other than the receipt) is only read when the 
+                extension is first accessed. Headers are read right away. Supported by the 
+                'KPF' reader; other readers read all data right away.
         
         Raises:
             IOError: when a invalid file is presented
@@ -212,42 +260,53 @@ class KPFDataModel(object):
             raise IOError('Cannot overwrite existing data')
 
         self.filename = os.path.basename(fn)
-        with fits.open(fn) as hdu_list:
+        self._lazy_extensions = OrderedDict()
+        self._lazy_hdul = None
+        receipt = None
+        hdu_list = fits.open(fn, memmap=True) if lazy else fits.open(fn)
+        try:
             # Handles the Receipt and the auxilary HDUs 
             for hdu in hdu_list:
                 if isinstance(hdu, fits.PrimaryHDU):
                     self.header[hdu.name] = hdu.header
                 elif isinstance(hdu, fits.BinTableHDU):
-                    t = Table.read(hdu)
                     if 'RECEIPT' in hdu.name:
                         # Table contains the RECEIPT
+                        t = Table.read(hdu)
                         df = t.to_pandas()
-                        df = df.reindex(df.columns.union(RECEIPT_COL,
-                                                         sort=False),
-                                                         axis=1, fill_value='')
-                        setattr(self, hdu.name, df)
-                        setattr(self, hdu.name.lower(), getattr(self, hdu.name))
+                        receipt = df.reindex(df.columns.union(RECEIPT_COL,
+                                                              sort=False),
+                                                              axis=1, fill_value='')
+                    else:
+                        self._set_extension_data(hdu.name, lambda hdu=hdu: Table.read(hdu).to_pandas(), lazy)
                     self.header[hdu.name] = hdu.header
-                    setattr(self, hdu.name, t.to_pandas())
             # Leave the rest of HDUs to level specific readers
             if data_type in self.read_methods.keys():
+                if lazy and data_type == 'KPF':
+                    self._lazy_hdul = hdu_list
                 self.read_methods[data_type](hdu_list)
             else:
                 # the provided data_type is not recognized, ie.
                 # not in the self.read_methods list
                 raise IOError('cannot recognize data type {}'.format(data_type))
+            if receipt is not None:
+                self.receipt = receipt
+        finally:
+            if self._lazy_hdul is None:
+                # nothing is left to read from the file
+                self.load_extensions()
+                hdu_list.close()
 
         # compute MD5 sum of source file and write it into a receipt entry for tracking.
         # Note that MD5 sum has known security vulnerabilities, but we are only using
         # this to ensure data integrity, and there is no known reason for someone to try
         # to hack astronomical data files.  If something more secure is is needed,
-        # substitute hashlib.sha256 for hashlib.md5
-        md5 = hashlib.md5()
-        with open(fn, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                md5.update(chunk)
+        # substitute hashlib.sha256 for hashlib.md5 in kpfpipe.tools.checksum_tools.
+        # The checksum is cached for the process, so a file that is read again
+        # unchanged is not hashed again.
+        md5_sum = md5_file(fn)
         self.receipt_add_entry('from_fits', self.__module__,
-                               f'md5_sum={md5.hexdigest()}', 'PASS')
+                               f'md5_sum={md5_sum}', 'PASS')
 
     
     def to_fits(self, fn):
@@ -285,6 +344,33 @@ class KPFDataModel(object):
             os.makedirs(os.path.dirname(fn), exist_ok=True)
         hdul.writeto(fn, overwrite=True, output_verify='silentfix')
 
+    def _set_extension_data(self, ext_name, loader, lazy=None):
+        '''
+        Set the data of an extension read from file, or defer it until the 
+        extension is first accessed if the file is read lazily
+
+        Args:
+            ext_name (str): extension name
+            loader (callable): function without arguments that returns the extension data
+            lazy (bool): (optional) whether to defer reading [default: whether the file is read lazily]
+        '''
+        if lazy is None:
+            lazy = self._lazy_hdul is not None
+        if lazy:
+            # remove the default empty value, so that __getattr__ is reached on access
+            self.__dict__.pop(ext_name, None)
+            self._lazy_extensions[ext_name] = loader
+        else:
+            self._lazy_extensions.pop(ext_name, None)
+            setattr(self, ext_name, loader())
+
+    def load_extensions(self):
+        '''
+        Read the data of all extensions of a lazily read file that have not been accessed yet
+        '''
+        for ext_name in list(self._lazy_extensions.keys()):
+            getattr(self, ext_name)
+
 # =============================================================================
 # Receipt related members
     def receipt_add_entry(self, module, mod_path, param, status, chip='all'):
@@ -301,26 +387,11 @@ class KPFDataModel(object):
         # time of execution in ISO format
         time = datetime.datetime.now().isoformat()
 
-        # get version control info (git)
-        repo = git.Repo(search_parent_directories=True)
-        try:
-            git_commit_hash = repo.head.object.hexsha
-            git_branch = repo.active_branch.name
-            git_tag = str(repo.tags[-1])
-        except TypeError:  # expected if running in testing env
-            git_commit_hash = ''
-            git_branch = ''
-            git_tag = ''
-        except ValueError:  # 12/22/22 new behavior under Docker
-            git_commit_hash = get_git_revision_hash()
-            git_branch = get_git_branch()
-            git_tag = get_git_tag()
-        except BrokenPipeError:  # 1/10/23 behavior under Docker uncovered by hour-long testing
-            git_commit_hash = get_git_revision_hash()
-            git_branch = get_git_branch()
-            git_tag = get_git_tag()
-
-        # add the row to the bottom of the table
+        # get version control info (git), resolved once per process
+        git_commit_hash, git_branch, git_tag = get_git_provenance()
+
+        # add the row to the bottom of the table; the rows are buffered 
+        # and only concatenated to the DataFrame when the receipt is accessed
         row = {'Time': time,
                'Code_Release': git_tag,
                'Commit_Hash': git_commit_hash,
@@ -331,8 +402,7 @@ class KPFDataModel(object):
                'Module_Path': mod_path,
                'Module_Param': param,
                'Status': status}
-        self.receipt = self.receipt.append(row, ignore_index=True)
-        self.RECEIPT = self.receipt
+        self._receipt_rows.append(row)
 
     def receipt_info(self, receipt_name):
         '''
@@ -389,7 +459,9 @@ class KPFDataModel(object):
         elif ext_name not in self.extensions.keys():
             raise KeyError('Extension {} could not be found'.format(ext_name))
         
-        delattr(self, ext_name)
+        lazy_loader = self._lazy_extensions.pop(ext_name, None)
+        if lazy_loader is None or ext_name in self.__dict__:
+            delattr(self, ext_name)
         del self.header[ext_name]
         del self.extensions[ext_name]
 
@@ -88,12 +88,13 @@ class KPF0(KPFDataModel):
             if isinstance(hdu, fits.ImageHDU):
                 if hdu.name not in self.extensions:
                     self.create_extension(hdu.name, np.ndarray)
-                setattr(self, hdu.name, hdu.data)
+                self._set_extension_data(hdu.name, lambda hdu=hdu: hdu.data)
             elif isinstance(hdu, fits.BinTableHDU):
                 if hdu.name not in self.extensions:
                     self.create_extension(hdu.name, pd.DataFrame)
-                table = Table(hdu.data).to_pandas()
-                setattr(self, hdu.name, table)
+                if hdu.name != 'RECEIPT':
+                    # the receipt is read by the base model
+                    self._set_extension_data(hdu.name, lambda hdu=hdu: Table(hdu.data).to_pandas())
             elif hdu.name != 'PRIMARY' and hdu.name != 'RECEIPT':
                 warnings.warn("Unrecognized extension {} of type {}".format(hdu.name, type(hdu)))
                 continue
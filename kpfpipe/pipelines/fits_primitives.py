@@ -60,6 +60,8 @@ class FromFitsBasePrimitive(BasePrimitive):
             args[0]: Name of FITS file (path). Should be extracted
                      from config in recipe.
             data_type: 'KPF' or 'NEID. Defaults to 'KPF'
+            cache: True for a static reference file, e.g. a master calibration,
+                   to keep it in the process-wide reference data cache. Defaults to False
         outputs
             python object of type data_model
         """
@@ -68,8 +70,12 @@ class FromFitsBasePrimitive(BasePrimitive):
             data_type = self.action.args['data_type']
         except KeyError:
             data_type = 'KPF'
+        try:
+            cache = bool(self.action.args['cache'])
+        except KeyError:
+            cache = False
         print(f"_perform_common: {filename} data_type is {data_type}")
-        data_model = data_model.from_fits(filename, data_type)
+        data_model = data_model.from_fits(filename, data_type, cache=cache)
 
         return Arguments(data_model, name=name+'_from_fits_result')
 
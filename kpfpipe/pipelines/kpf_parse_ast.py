@@ -12,6 +12,20 @@ from keckdrpframework.models.arguments import Arguments
 from keckdrpframework.models.processing_context import ProcessingContext
 import configparser as cp
 
+def recipe_file_key(path):
+    """
+    recipe_file_key() returns the modification time and size of a recipe file, used to find out whether a
+    parsed recipe is out of date, or None if the file no longer exists.
+
+    Args:
+        path (str): path of the recipe file
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
 class RecipeError(Exception):
     """
     RecipeError is raised whenever an error in the recipe or recipe processing is encountered.  The most
@@ -42,7 +56,8 @@ class KpfPipelineNodeVisitor(NodeVisitor):
         This flag is set by resume_recipe() just before it starts walking the recipe syntax tree, which
         starts from the top each time. (Each visit_<syntax_element> method is responsible for behaving
         correctly in the face of these multiple "duplicate" calls, either by redoing work quickly, or by
-        saving state and results of work already done.  See the notes about the kpf_completed flag below.)
+        saving state and results of work already done.  See the notes about the kpf_completed flag and the
+        kpf_body_index program counter below.)
         visit_Call() uses this flag to trigger the processing of the return value(s) from the data processing
         primitive previously enqueued to the framework that resume_recipe() is following  This flag
         distinguishes returning from a finished call from preparing for a new call.
@@ -57,6 +72,13 @@ class KpfPipelineNodeVisitor(NodeVisitor):
     has been completed, and as necessary the result has been stored in an attribute of the AST
     node itself. Some visit_<syntax_element>() methods store additional state and parameters.  Those
     behaviors are covered below in the method documentation.
+
+    The nodes holding a list of statements (Module, For and If) keep the index of the statement being
+    processed in the attribute kpf_body_index, which acts as a program counter for that block.  Together
+    the program counters along the tree form the continuation of the recipe: when resume_recipe() walks
+    the tree from the top again, each block jumps straight to its pending statement instead of visiting
+    the statements already completed, so resuming costs a visit per nesting level rather than a visit
+    per statement executed so far.  See _visit_body().
     """
 
     def __init__(self, pipeline=None, context=None):
@@ -85,6 +107,8 @@ class KpfPipelineNodeVisitor(NodeVisitor):
         self.call_output = None
         self._builtins = {}
         self.subrecipe_depth = 0
+        # subrecipe files parsed so far: absolute path -> recipe_file_key() when parsed
+        self.subrecipe_files = {}
 
     def register_builtin(self, key, func, nargs):
         """
@@ -107,6 +131,35 @@ class KpfPipelineNodeVisitor(NodeVisitor):
     def load_env_value(self, key, value):
         self._env[key] = value
 
+    def _visit_body(self, node, body):
+        """
+        _visit_body() visits the statements in body, a list of statements belonging to node, starting
+        from the statement saved in the node's kpf_body_index attribute.  The index is updated before
+        each statement is visited, so that it still points to the pending statement when a data processing
+        primitive is queued, and is set past the end of the body once all statements are completed.
+
+        Args:
+            node: the Module, For or If node holding the statements
+            body: the list of statements to visit, e.g. node.body or node.orelse
+
+        Returns:
+            True if all statements in body have been completed, False if a call to a data processing
+            primitive is pending.
+        """
+        for ix in range(getattr(node, 'kpf_body_index', 0), len(body)):
+            setattr(node, 'kpf_body_index', ix)
+            self.visit(body[ix])
+            if self.awaiting_call_return:
+                return False
+        setattr(node, 'kpf_body_index', len(body))
+        return True
+
+    @staticmethod
+    def _reset_body_index(node):
+        """ _reset_body_index() rewinds the program counter of node to its first statement. """
+        if hasattr(node, 'kpf_body_index'):
+            delattr(node, 'kpf_body_index')
+
     def visit_Module(self, node):
         """
         visit_Module() processes "module" node of a parsed recipe.
@@ -124,6 +177,7 @@ class KpfPipelineNodeVisitor(NodeVisitor):
         """
         if self._reset_visited_states:
             setattr(node, 'kpf_started', False)
+            self._reset_body_index(node)
             for item in node.body:
                 self.visit(item)
             if self.subrecipe_depth == 0:
@@ -134,10 +188,8 @@ class KpfPipelineNodeVisitor(NodeVisitor):
             if self.subrecipe_depth == 0:
                 self._params = {}
             setattr(node, 'kpf_started', True)
-        for item in node.body:
-            self.visit(item)
-            if self.awaiting_call_return:
-                return
+        if not self._visit_body(node, node.body):
+            return
         if self.subrecipe_depth == 0:
             self._params = None # let allocated memory get collected
 
@@ -168,8 +220,10 @@ class KpfPipelineNodeVisitor(NodeVisitor):
             return
         if not getattr(node, 'kpf_completed', False):
             module = node.module
-            # append the module path to the framework's primitive_path
-            self.context.config.primitive_path = tuple([*self.context.config.primitive_path, module])
+            # append the module path to the framework's primitive_path, once, so that
+            # running the statement again, e.g. for the next file in watch mode, doesn't grow it
+            if module not in self.context.config.primitive_path:
+                self.context.config.primitive_path = tuple([*self.context.config.primitive_path, module])
             loadQSizeBefore = len(self._load)
             for name in node.names:
                 self.visit(name)
@@ -302,6 +356,7 @@ class KpfPipelineNodeVisitor(NodeVisitor):
             setattr(node, 'kpf_started', False)
             if hasattr(node, 'kpf_params'):
                 delattr(node, 'kpf_params')
+            self._reset_body_index(node)
             self.visit(node.target)
             self.visit(node.iter)
             for subnode in node.body:
@@ -351,16 +406,15 @@ class KpfPipelineNodeVisitor(NodeVisitor):
             while current_arg is not None:
                 self.pipeline.logger.debug(f"For: in while loop with current_arg {current_arg}, type {type(current_arg)}")
                 self._params[target] = current_arg
-                for subnode in node.body:
-                    self.visit(subnode)
-                    if self.awaiting_call_return:
-                        return
+                if not self._visit_body(node, node.body):
+                    return
                 # reset the node visited states for all nodes
                 # underneath this "for" loop to set up for the
                 # next iteration of the loop.
                 self.pipeline.logger.debug("For: resetting visited states before looping")
                 for subnode in node.body:
                     self.reset_visited_states(subnode)
+                self._reset_body_index(node)
                 # iterate by updating current_arg (and the arg iterator)
                 try:
                     current_arg = next(args_iter)
@@ -725,7 +779,9 @@ class KpfPipelineNodeVisitor(NodeVisitor):
 
         If the function's name is the special case "invoke_subrecipe", the one expected
         argument is a path to a recipe file. If it has not already been, it is parsed into
-        an abstract syntax tree (AST) and hung on the "call" tree node for future use.
+        an abstract syntax tree (AST) and hung on the "call" tree node for future use, and
+        the file is recorded in subrecipe_files so that the pipeline parses the recipes
+        again when it changes (see KPFPipeline.compile_recipe()).
         The subtree is then "visited" just like any other subtree.  The head of the
         subrecipe tree is a "module" node, as for all recipes.  See visit_module() for
         more details on how subrecipes are handled.
@@ -760,6 +816,13 @@ class KpfPipelineNodeVisitor(NodeVisitor):
             setattr(node, 'kpf_completed', False)
             for arg in node.args:
                 self.visit(arg)
+            subrecipe = getattr(node, '_kpf_subrecipe', None)
+            if subrecipe:
+                # the subrecipe tree is kept for the next run; reset it as part of this node
+                saved_depth = self.subrecipe_depth
+                self.subrecipe_depth = self.subrecipe_depth + 1
+                self.visit(subrecipe)
+                self.subrecipe_depth = saved_depth
             return
         self.pipeline.logger.debug(f"Call: {node.func.id} on recipe line {node.lineno}; kpf_completed is {getattr(node, 'kpf_completed', False)}")
         if node.func.id == 'invoke_subrecipe':
@@ -767,10 +830,12 @@ class KpfPipelineNodeVisitor(NodeVisitor):
             if not subrecipe:
                 self.pipeline.logger.debug(f"invoke_subrecipe: opening and parsing recipe file {node.args[0].s}")
                 # TODO: do some argument checking here
+                key = recipe_file_key(node.args[0].s)
                 with open(node.args[0].s) as f:
                     fstr = f.read()
                     subrecipe = parse(fstr)
                 node._kpf_subrecipe = subrecipe
+                self.subrecipe_files[os.path.abspath(node.args[0].s)] = key
             else:
                 self.pipeline.logger.debug(f"invoke_subrecipe: found existing subrecipe of type {type(subrecipe)}")
             saved_depth = self.subrecipe_depth
@@ -872,6 +937,7 @@ class KpfPipelineNodeVisitor(NodeVisitor):
             setattr(node, 'kpf_completed_test', False)
             if hasattr(node, 'kpf_boolResult'):
                 delattr(node, 'kpf_boolResult')
+            self._reset_body_index(node)
             self.visit(node.test)
             for item in node.body:
                 self.visit(item)
@@ -894,17 +960,13 @@ class KpfPipelineNodeVisitor(NodeVisitor):
             if boolResult:
                 self.pipeline.logger.debug(
                     f"If on recipe line {node.lineno} pushing and visiting Ifso")
-                for item in node.body:
-                    self.visit(item)
-                    if self.awaiting_call_return:
-                        return
+                if not self._visit_body(node, node.body):
+                    return
             else:
                 self.pipeline.logger.debug(
                     f"If on recipe line {node.lineno} pushing and visiting Else")
-                for item in node.orelse:
-                    self.visit(item)
-                    if self.awaiting_call_return:
-                        return
+                if not self._visit_body(node, node.orelse):
+                    return
             setattr(node, 'kpf_completed', True)
 
     def visit_List(self, node):
@@ -1014,7 +1076,7 @@ class KpfPipelineNodeVisitor(NodeVisitor):
             self.visit(node.value)
             if self.awaiting_call_return:
                 return
-            setattr(node, 'kpf_complted', True)
+            setattr(node, 'kpf_completed', True)
 
     def visit_Attribute(self, node):
         """
@@ -1109,4 +1171,29 @@ class KpfPipelineNodeVisitor(NodeVisitor):
         self.visit(node)
         self._load.clear()
         self._store.clear()
+        self._reset_visited_states = False
+
+    def reset_recipe(self, tree):
+        """
+        reset_recipe() prepares the tree of a recipe that has already been run, completely or not, to be
+        run again from the start, e.g. on the next file in watch mode.  All nodes are reset as by
+        reset_visited_states(), including the trees of invoked subrecipes, except the "from ... import"
+        statements of the recipe, whose primitives are already in the pipeline's event_table.
+
+        Args:
+            tree: the Module node returned by ast.parse() for the recipe
+        """
+        self._reset_visited_states = True
+        self.awaiting_call_return = False
+        self.returning_from_call = False
+        self.call_output = None
+        self.subrecipe_depth = 0
+        setattr(tree, 'kpf_started', False)
+        self._reset_body_index(tree)
+        for item in tree.body:
+            if not isinstance(item, _ast.ImportFrom):
+                self.visit(item)
+        self._params = None
+        self._load.clear()
+        self._store.clear()
         self._reset_visited_states = False
\ No newline at end of file
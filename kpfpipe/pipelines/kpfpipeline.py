@@ -11,10 +11,12 @@ import glob
 from dotenv.main import load_dotenv
 
 from kpfpipe.logger import start_logger
+from kpfpipe.tools.worker_stats import WorkerStats
+from kpfpipe.tools import db_tools
 
 # AST recipe support
 import ast
-from kpfpipe.pipelines.kpf_parse_ast import KpfPipelineNodeVisitor
+from kpfpipe.pipelines.kpf_parse_ast import KpfPipelineNodeVisitor, recipe_file_key
 import kpfpipe.config.pipeline_config as cfg
 
 # KeckDRPFramework dependencies
@@ -60,6 +62,10 @@ class KPFPipeline(BasePipeline):
     def __init__(self, context: ProcessingContext):
         BasePipeline.__init__(self, context)
         load_dotenv()
+        # compiled recipes: absolute recipe path -> (file stat key, recipe AST, recipe visitor)
+        self._recipe_cache = {}
+        # throughput and latency of the files processed in watch mode, see next_file()
+        self.worker_stats = WorkerStats(self.name)
     
     def register_recipe_builtins(self):
         """
@@ -172,19 +178,14 @@ class KPFPipeline(BasePipeline):
 
         Before starting processing the recipe, built-in functions available to recipes without
         having to enqueue them to the Framework are registered, and values defined in the environment
-        are imported so that they are also available to recipes.
+        are imported so that they are also available to recipes.  This is done once per recipe file,
+        see compile_recipe().
 
         Args:
             action (keckdrpframework.models.action.Action): Keck DRPF Action object
             context (keckdrpframework.models.ProcessingContext.ProcessingContext): Keck DRPF ProcessingContext object
         """
         recipe_file = getattr(action.args, 'recipe', None)
-        if recipe_file is not None:
-            with open(recipe_file) as f:
-                fstr = f.read()
-        else:
-            fstr = ''
-        self._recipe_ast = ast.parse(fstr)
         context.args = action.args
 
         if 'file_path' in context.args.iter_kw() and '.fits' in context.args['file_path']:
@@ -208,6 +209,43 @@ class KPFPipeline(BasePipeline):
         self.context.logger = self.logger
         self.logger.info("*************** Executing recipe {} ***************".format(recipe_file))
         
+        self.compile_recipe(recipe_file, context)
+        self._recipe_visitor.visit(self._recipe_ast)
+        self.check_recipe_finished()
+
+        return Arguments(name="start_recipe_return")
+
+    def compile_recipe(self, recipe_file, context):
+        """
+        compile_recipe() sets up self._recipe_ast and self._recipe_visitor to run the recipe file.
+
+        The recipe is parsed, a new recipe visitor is created, the built-in functions are registered
+        and the environment is loaded only the first time the recipe file is run, or when the file has
+        been modified since, or any of the subrecipes it has invoked.  Otherwise, e.g. for each new file in
+        watch mode, the cached recipe tree and visitor are reused, and only the state of the previous run is
+        reset (see KpfPipelineNodeVisitor.reset_recipe()), so the "from ... import" statements are not
+        evaluated again.  Subrecipes are parsed once along with the recipe that invokes them.
+
+        Args:
+            recipe_file (str): path of the recipe file, or None for an empty recipe
+            context (keckdrpframework.models.ProcessingContext.ProcessingContext): Keck DRPF ProcessingContext object
+        """
+        if recipe_file is not None:
+            recipe_path = os.path.abspath(recipe_file)
+            key = recipe_file_key(recipe_path)
+            cached = self._recipe_cache.get(recipe_path)
+            if cached is not None and cached[0] == key and \
+                    all(recipe_file_key(path) == subkey for path, subkey in cached[2].subrecipe_files.items()):
+                self.logger.debug(f"compile_recipe: reusing compiled recipe {recipe_path}")
+                _, self._recipe_ast, self._recipe_visitor = cached
+                self._recipe_visitor.context = context
+                self._recipe_visitor.reset_recipe(self._recipe_ast)
+                return
+            with open(recipe_path) as f:
+                fstr = f.read()
+        else:
+            fstr = ''
+        self._recipe_ast = ast.parse(fstr)
         self._recipe_visitor = KpfPipelineNodeVisitor(pipeline=self, context=context)
 
         self.register_recipe_builtins()
@@ -216,19 +254,53 @@ class KPFPipeline(BasePipeline):
             self.preload_env()
         except Exception as e:
             self.logger.error(f"KPF-Pipeline couldn't load environment due to exception {e}")
-        
-        self._recipe_visitor.visit(self._recipe_ast)
 
-        return Arguments(name="start_recipe_return")
+        if recipe_file is not None:
+            self._recipe_cache[recipe_path] = (key, self._recipe_ast, self._recipe_visitor)
+
+    def preload_recipe(self, recipe_file):
+        """
+        preload_recipe() prepares a worker process to run the recipe file before the first file arrives.
+        The recipe is compiled (see compile_recipe()) and the modules of the primitives it imports are
+        imported, so that this time is not added to the latency of the first file processed.
+
+        Args:
+            recipe_file (str): path of the recipe file
+        """
+        self.compile_recipe(recipe_file, self.context)
+        for node in self._recipe_ast.body:
+            if isinstance(node, ast.ImportFrom):
+                try:
+                    importlib.import_module(node.module)
+                except Exception as e:
+                    self.logger.warning(f"preload_recipe: couldn't import {node.module}: {e}")
+
+    def check_recipe_finished(self):
+        """
+        check_recipe_finished() records the end of the file being processed in watch mode once the recipe
+        has run to the end, i.e. no data processing primitive is pending, and logs its processing time and
+        the statistics of the process.  The database records queued by the recipe are inserted then.
+        """
+        if self._recipe_visitor.awaiting_call_return:
+            return
+        db_tools.flush_all_db_inserts(self.logger)
+        done = self.worker_stats.finish_file()
+        if done is not None:
+            self.logger.info(f"Finished {done['file_path']} in {done['processing_time']:.1f} s "
+                             f"({done['latency']:.1f} s since queued)")
+            self.logger.info(self.worker_stats.summary())
 
     def exit_loop(self, action, context):
         """
-        Force the Keck DRP Framework to exit the infinite loop
+        Force the Keck DRP Framework to exit the infinite loop.  The database records still queued are
+        inserted first, since os._exit() doesn't run the exit handlers of the process.
 
         Args:
             action (keckdrpframework.models.action.Action): Keck DRPF Action object
             context (keckdrpframework.models.ProcessingContext.ProcessingContext): Keck DRPF ProcessingContext object
         """
+        self.logger.info(self.worker_stats.summary())
+        db_tools.flush_all_db_inserts(self.logger)
         self.logger.info("exiting pipeline...")
         os._exit(1)
 
@@ -249,6 +321,7 @@ class KPFPipeline(BasePipeline):
         self._recipe_visitor.awaiting_call_return = False
         self._recipe_visitor.call_output = action.args # framework put previous output here
         self._recipe_visitor.visit(self._recipe_ast)
+        self.check_recipe_finished()
 
         return Arguments(name="resume_recipe_return")  # nothing to actually return, but meet the Framework requirement
 
@@ -263,6 +336,7 @@ class KPFPipeline(BasePipeline):
         action.args['date_dir'] = os.path.basename(os.path.dirname(
                                                    file_path))
 
+        self.worker_stats.start_file(file_path, getattr(action.args, 'queued_at', None))
         self.start_recipe(action, context)
 
         return Arguments(name="next_file")
@@ -0,0 +1,75 @@
+import os
+import hashlib
+
+# Read size for hashing; large blocks keep the Python overhead per byte negligible
+MD5_BLOCK_SIZE = 8 * 1024 * 1024
+
+# Process-wide cache of file checksums: absolute path -> (file stat key, hex digest)
+_md5_cache = {}
+
+
+def _stat_key(fname) -> tuple:
+    st = os.stat(fname)
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def md5_file(fname, use_cache=True, block_size=MD5_BLOCK_SIZE) -> str:
+    """Compute the MD5 checksum of a file.
+
+    The file is read in large blocks into a reused buffer. With ``use_cache``, the
+    checksum is remembered for the process and returned without reading the file
+    again as long as its device, inode, modification time and size are unchanged.
+
+    Args:
+        fname (str): path of the file
+        use_cache (bool): (optional) look up and store the checksum in the process-wide cache [default=True]
+        block_size (int): (optional) number of bytes read at a time [default=MD5_BLOCK_SIZE]
+
+    Returns:
+        str: hex digest of the MD5 checksum
+
+    Raises:
+        OSError: if the file cannot be read
+    """
+    path = os.path.abspath(fname)
+    key = _stat_key(path)
+    if use_cache:
+        cached = _md5_cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+    hash_md5 = hashlib.md5()
+    buf = bytearray(block_size)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            hash_md5.update(view[:n])
+    checksum = hash_md5.hexdigest()
+
+    if use_cache:
+        _md5_cache[path] = (key, checksum)
+    return checksum
+
+
+def verify_md5(fname, checksum, use_cache=True) -> bool:
+    """Check a file against a known MD5 checksum, e.g. the one stored in the database.
+
+    The file is only read if its checksum is not cached for the current state of the file.
+
+    Args:
+        fname (str): path of the file
+        checksum (str): expected hex digest
+        use_cache (bool): (optional) use the process-wide cache [default=True]
+
+    Returns:
+        bool: whether the checksum of the file matches
+    """
+    return md5_file(fname, use_cache=use_cache) == checksum
+
+
+def clear_md5_cache() -> None:
+    """Forget all cached checksums."""
+    _md5_cache.clear()
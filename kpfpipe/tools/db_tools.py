@@ -0,0 +1,280 @@
+import os
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import pool
+
+# Environment variables of the database connection parameters
+DB_SERVER_ENV = 'DBSERVER'
+DB_NAME_ENV = 'DBNAME'
+DB_PORT_ENV = 'DBPORT'
+DB_USER_ENV = 'DBUSER'
+DB_PASS_ENV = 'DBPASS'
+
+# Environment variables setting the largest number of pooled connections of a process,
+# and how long (in seconds) reference values read from the database are cached
+DB_POOL_MAX_ENV = 'KPFPIPE_DB_POOL_MAX'
+DB_POOL_MAX = 4
+DB_CACHE_TTL_ENV = 'KPFPIPE_DB_CACHE_TTL'
+DB_CACHE_TTL = 600.
+
+# Pooled connections kept open between uses (psycopg2 pools close returned connections beyond this)
+DB_POOL_MIN = 1
+
+# Number of L0 infobits defined in the l0infobits table
+N_L0_INFOBITS = 14
+
+# Process-wide state: (process ID, connection parameters) -> connection pool and pending inserts, and
+# connection parameters -> database version, (time read, infobit parameters)
+_db_lock = threading.RLock()
+_db_pools = {}
+_db_versions = {}
+_infobit_cache = {}
+_pending_inserts = {}
+
+
+def _connection_params() -> tuple:
+    return tuple(os.getenv(env) for env in (DB_SERVER_ENV, DB_NAME_ENV, DB_PORT_ENV, DB_USER_ENV, DB_PASS_ENV))
+
+
+def _cache_ttl() -> float:
+    return float(os.environ.get(DB_CACHE_TTL_ENV, DB_CACHE_TTL))
+
+
+def get_db_pool(params=None):
+    """Get the connection pool of this process for the database set in the environment.
+
+    The pool is made on first use, with the connection parameters in the DBSERVER, DBNAME, DBPORT, DBUSER
+    and DBPASS environment variables, and holds up to ``KPFPIPE_DB_POOL_MAX`` connections, DB_POOL_MIN of
+    which stay open between uses. A forked process makes its own pool rather than using the connections
+    of its parent.
+
+    Args:
+        params (tuple): (optional) connection parameters instead of the environment [default=None]
+
+    Returns:
+        psycopg2.pool.ThreadedConnectionPool: the connection pool
+
+    Raises:
+        psycopg2.OperationalError: if the database cannot be connected to
+    """
+    params = _connection_params() if params is None else params
+    key = (os.getpid(), params)
+    with _db_lock:
+        db_pool = _db_pools.get(key)
+        if db_pool is None:
+            host, database, port, user, password = params
+            db_pool = pool.ThreadedConnectionPool(DB_POOL_MIN, int(os.environ.get(DB_POOL_MAX_ENV, DB_POOL_MAX)),
+                                                  host=host, database=database, port=port,
+                                                  user=user, password=password)
+            _db_pools[key] = db_pool
+    return db_pool
+
+
+@contextmanager
+def db_connection(params=None):
+    """Borrow a connection of the pool of this process, as a context manager.
+
+    The transaction is committed when the block ends, or rolled back if it raises. A connection that was
+    closed or lost is dropped from the pool instead of being returned to it.
+
+    Args:
+        params (tuple): (optional) connection parameters instead of the environment [default=None]
+
+    Yields:
+        psycopg2.extensions.connection: the database connection
+
+    Raises:
+        psycopg2.OperationalError: if the database cannot be connected to
+    """
+    db_pool = get_db_pool(params)
+    conn = db_pool.getconn()
+    if conn.closed:
+        db_pool.putconn(conn, close=True)
+        conn = db_pool.getconn()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        db_pool.putconn(conn, close=broken or bool(conn.closed))
+
+
+def close_db_pools() -> None:
+    """Close the pooled connections of this process."""
+    with _db_lock:
+        for key in [key for key in _db_pools if key[0] == os.getpid()]:
+            _db_pools.pop(key).closeall()
+
+
+def get_db_version(conn) -> tuple:
+    """Database version, queried once per database.
+
+    Args:
+        conn (psycopg2.extensions.connection): database connection
+
+    Returns:
+        tuple: record of ``SELECT version();``
+    """
+    params = _connection_params()
+    with _db_lock:
+        if params not in _db_versions:
+            with conn.cursor() as cur:
+                cur.execute('SELECT version();')
+                _db_versions[params] = cur.fetchone()
+        return _db_versions[params]
+
+
+def get_l0_infobit_params(conn, n_bits=N_L0_INFOBITS) -> tuple:
+    """Latest param1 and param2 of the L0 infobits, read in one query and cached for ``KPFPIPE_DB_CACHE_TTL`` seconds.
+
+    Args:
+        conn (psycopg2.extensions.connection): database connection
+        n_bits (int): (optional) number of infobits [default=N_L0_INFOBITS]
+
+    Returns:
+        tuple: lists of param1 and of param2, in the order of the bits found in the l0infobits table
+    """
+    key = (_connection_params(), n_bits)
+    with _db_lock:
+        cached = _infobit_cache.get(key)
+        if cached is not None and time.time() - cached[0] < _cache_ttl():
+            return list(cached[1]), list(cached[2])
+
+        with conn.cursor() as cur:
+            cur.execute('SELECT DISTINCT ON (bit) bit, param1, param2 from l0infobits ' +
+                        'where bit >= 0 and bit < %s order by bit, created desc;', (n_bits,))
+            records = cur.fetchall()
+
+        p1_bits = [record[1] for record in records]
+        p2_bits = [record[2] for record in records]
+        _infobit_cache[key] = (time.time(), p1_bits, p2_bits)
+        return list(p1_bits), list(p2_bits)
+
+
+def clear_db_cache() -> None:
+    """Forget the cached database version and infobit parameters."""
+    with _db_lock:
+        _db_versions.clear()
+        _infobit_cache.clear()
+
+
+def queue_db_insert(query, batch_size=1, logger=None) -> int:
+    """Queue an insert statement, and run the queued statements once batch_size of them are pending.
+
+    The statements still pending are run by flush_all_db_inserts(), which the pipeline calls when each
+    recipe finishes and before it exits.
+
+    Args:
+        query (str): complete insert statement
+        batch_size (int): (optional) number of statements run together [default=1]
+        logger (logging.Logger): (optional) logger of failed statements [default=None]
+
+    Returns:
+        int: number of statements run and committed, 0 while the statement is pending
+    """
+    params = _connection_params()
+    with _db_lock:
+        pending = _pending_inserts.setdefault((os.getpid(), params), [])
+        pending.append((query, logger))
+        if len(pending) < batch_size:
+            return 0
+    return flush_db_inserts(params)
+
+
+def flush_db_inserts(params=None) -> int:
+    """Run the pending insert statements for the database set in the environment.
+
+    The statements are sent together and committed in one transaction. If that fails, each statement is
+    run in its own transaction, so that only the failing ones are skipped.
+
+    Args:
+        params (tuple): (optional) connection parameters instead of the environment [default=None]
+
+    Returns:
+        int: number of statements committed
+
+    Raises:
+        psycopg2.OperationalError: if the database cannot be connected to; the statements stay pending
+    """
+    params = _connection_params() if params is None else params
+    key = (os.getpid(), params)
+    with _db_lock:
+        pending = _pending_inserts.pop(key, [])
+    if not pending:
+        return 0
+
+    try:
+        with db_connection(params) as conn:
+            with conn.cursor() as cur:
+                cur.execute(';\n'.join(query.rstrip().rstrip(';') for query, _ in pending) + ';')
+        return len(pending)
+    except psycopg2.OperationalError:
+        _requeue_inserts(key, pending)
+        raise
+    except Exception:
+        pass
+
+    n_inserted = 0
+    for i, (query, logger) in enumerate(pending):
+        try:
+            with db_connection(params) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query)
+            n_inserted += 1
+        except psycopg2.OperationalError:
+            _requeue_inserts(key, pending[i:])
+            raise
+        except Exception as error:
+            if logger is not None:
+                logger.info('*** Error inserting record ({}); skipping...'.format(error))
+    return n_inserted
+
+
+def _requeue_inserts(key, statements) -> None:
+    with _db_lock:
+        _pending_inserts[key] = statements + _pending_inserts.get(key, [])
+
+
+def flush_all_db_inserts(logger=None) -> int:
+    """Run the pending insert statements of this process, for all databases.
+
+    A forked process inherits the pending inserts of its parent, which only the parent runs. The
+    statements that cannot be run because a database cannot be connected to stay pending.
+
+    Args:
+        logger (logging.Logger): (optional) logger of the databases that could not be connected to [default=None]
+
+    Returns:
+        int: number of statements committed
+    """
+    n_inserted = 0
+    for pid, params in list(_pending_inserts):
+        if pid != os.getpid():
+            continue
+        try:
+            n_inserted += flush_db_inserts(params)
+        except Exception as error:
+            message = '*** Error inserting pending records ({})'.format(error)
+            if logger is not None:
+                logger.info(message)
+            else:
+                print(message)
+    return n_inserted
+
+
+def _flush_at_exit() -> None:
+    flush_all_db_inserts()
+    close_db_pools()
+
+
+atexit.register(_flush_at_exit)
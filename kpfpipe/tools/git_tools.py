@@ -1,5 +1,17 @@
+import os
 import subprocess
 
+# Environment variables that override the git provenance written to receipts, e.g. in
+# containers without the git repository. KPFPIPE_GIT_INFO_FILE names a file with
+# 'commit=...', 'branch=...' and 'tag=...' lines; the other three set single values.
+GIT_INFO_FILE_ENV = 'KPFPIPE_GIT_INFO_FILE'
+GIT_COMMIT_ENV = 'KPFPIPE_GIT_COMMIT'
+GIT_BRANCH_ENV = 'KPFPIPE_GIT_BRANCH'
+GIT_TAG_ENV = 'KPFPIPE_GIT_TAG'
+
+# Process-wide (commit hash, branch, tag), resolved once by get_git_provenance()
+_git_provenance = None
+
 def get_git_revision_hash() -> str:
     return subprocess.check_output(['git', 'rev-parse', 'HEAD']).decode('ascii').strip()
 
@@ -8,3 +20,69 @@ def get_git_tag() -> str:
 
 def get_git_branch() -> str:
     return subprocess.check_output(['git', 'rev-parse', '--abbrev-ref', 'HEAD']).decode('ascii').strip()
+
+def read_git_info_file(fn) -> dict:
+    info = {}
+    with open(fn, 'r') as f:
+        for line in f:
+            if '=' in line:
+                key, value = line.split('=', 1)
+                info[key.strip().lower()] = value.strip()
+    return info
+
+def query_git_provenance() -> tuple:
+    '''
+    Look up (commit hash, branch, tag) of the pipeline code in the git repository
+    '''
+    import git
+    try:
+        repo = git.Repo(search_parent_directories=True)
+        git_commit_hash = repo.head.object.hexsha
+        git_branch = repo.active_branch.name
+        git_tag = str(repo.tags[-1]) if len(repo.tags) > 0 else ''
+    except (TypeError, git.InvalidGitRepositoryError, git.NoSuchPathError):  # expected if running in testing env
+        git_commit_hash = ''
+        git_branch = ''
+        git_tag = ''
+    except (ValueError, BrokenPipeError):  # behavior under Docker
+        try:
+            git_commit_hash = get_git_revision_hash()
+            git_branch = get_git_branch()
+            git_tag = get_git_tag()
+        except (OSError, subprocess.CalledProcessError):
+            git_commit_hash = ''
+            git_branch = ''
+            git_tag = ''
+    return git_commit_hash, git_branch, git_tag
+
+def get_git_provenance(refresh=False) -> tuple:
+    '''
+    Return (commit hash, branch, tag) of the pipeline code.
+
+    The values are resolved on the first call and cached for the process. Values
+    given by KPFPIPE_GIT_COMMIT, KPFPIPE_GIT_BRANCH and KPFPIPE_GIT_TAG, or in the
+    file named by KPFPIPE_GIT_INFO_FILE, take precedence over the git repository,
+    which is only queried if any value is left.
+
+    Args:
+        refresh (bool): (optional) resolve the values again [default=False]
+    '''
+    global _git_provenance
+    if _git_provenance is not None and not refresh:
+        return _git_provenance
+
+    info = {}
+    if os.environ.get(GIT_INFO_FILE_ENV):
+        info.update(read_git_info_file(os.environ[GIT_INFO_FILE_ENV]))
+    for key, env in (('commit', GIT_COMMIT_ENV), ('branch', GIT_BRANCH_ENV), ('tag', GIT_TAG_ENV)):
+        if env in os.environ:
+            info[key] = os.environ[env]
+
+    if not all(key in info for key in ('commit', 'branch', 'tag')):
+        git_commit_hash, git_branch, git_tag = query_git_provenance()
+        info.setdefault('commit', git_commit_hash)
+        info.setdefault('branch', git_branch)
+        info.setdefault('tag', git_tag)
+
+    _git_provenance = (info['commit'], info['branch'], info['tag'])
+    return _git_provenance
@@ -49,7 +49,7 @@ pipe_config = "examples/default_simple.cfg"
 
 
 def run_recipe(recipe: str, pipe_config: str=pipe_config, date_dir=None,
-               file_path='', watch=False):
+               file_path='', watch=False, repeat=1):
     """
     This is the code that runs the given recipe.
     It mimics the kpf framework/pipeline startup code in cli.py, but writes
@@ -58,6 +58,8 @@ def run_recipe(recipe: str, pipe_config: str=pipe_config, date_dir=None,
     The framework is put in testing mode so that it passes exceptions
     on to this testing code.  That we can test the proper handling of
     recipe errors, e.g. undefined variables.
+    The recipe is started repeat times on the same pipeline, as for
+    consecutive files in watch mode.
     """
     pipe = KpfPipelineForTesting
 
@@ -90,7 +92,8 @@ def run_recipe(recipe: str, pipe_config: str=pipe_config, date_dir=None,
             arg.date_dir = date_dir
         arg.file_path = file_path
         arg.watch = watch
-        framework.append_event('start_recipe', arg)
+        for _ in range(repeat):
+            framework.append_event('start_recipe', arg)
         framework.main_loop()
 
 def recipe_test(recipe: str, pipe_config: str=pipe_config, **kwargs):
@@ -0,0 +1,155 @@
+import os
+import copy
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+from kpfpipe.tools.checksum_tools import md5_file
+
+# Environment variables setting the size limit of the process-wide reference data cache (in MB),
+# and a directory where the arrays of the cached data are stored as memory-mapped .npy files,
+# so that the worker processes of a watch with --ncpus share their pages instead of each holding a copy.
+REFERENCE_CACHE_MB_ENV = 'KPFPIPE_REFERENCE_CACHE_MB'
+REFERENCE_CACHE_DIR_ENV = 'KPFPIPE_REFERENCE_CACHE_DIR'
+REFERENCE_CACHE_MB = 2048
+
+# Arrays smaller than this are kept in memory even if a cache directory is set
+SHARE_MIN_BYTES = 1024 * 1024
+
+# Process-wide cache: (kind, absolute path) -> (file stat key, md5 checksum, value, bytes, shared arrays)
+_reference_cache = OrderedDict()
+_reference_cache_bytes = 0
+
+
+def _stat_key(fname) -> tuple:
+    st = os.stat(fname)
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _max_cache_bytes() -> int:
+    return int(float(os.environ.get(REFERENCE_CACHE_MB_ENV, REFERENCE_CACHE_MB)) * 1024 * 1024)
+
+
+def _nbytes(value, seen=None) -> int:
+    """Approximate memory held by a cached value, not counting memory-mapped arrays."""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.memmap):
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, dict):
+        return sum(_nbytes(v, seen) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v, seen) for v in value)
+    if hasattr(value, '__dict__'):
+        return sum(_nbytes(v, seen) for v in vars(value).values())
+    return 0
+
+
+def _share_array(data, share_dir, name):
+    path = os.path.join(share_dir, name + '.npy')
+    if not os.path.isfile(path):
+        tmp_path = path + '.{}.tmp'.format(os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.save(f, data, allow_pickle=False)
+        os.replace(tmp_path, path)
+    return np.load(path, mmap_mode='r')
+
+
+def _share_arrays(value, checksum, share_dir) -> list:
+    """Move the large arrays of a value, or the attributes of a data model, to memory-mapped files.
+
+    Returns:
+        list: memory-mapped arrays now held by the value
+    """
+    if isinstance(value, np.ndarray):
+        return []
+    shared = {}
+    attrs = vars(value) if hasattr(value, '__dict__') else {}
+    for key, data in list(attrs.items()):
+        if type(data) is np.ndarray and data.dtype != object and data.nbytes >= SHARE_MIN_BYTES:
+            if id(data) not in shared:
+                shared[id(data)] = _share_array(data, share_dir, '{}_{}'.format(checksum, key))
+            attrs[key] = shared[id(data)]
+    return list(shared.values())
+
+
+def _copy_on_write_memo(shared) -> dict:
+    """deepcopy() memo mapping the shared arrays copy-on-write instead of copying their data."""
+    return {id(data): np.load(data.filename, mmap_mode='c') for data in shared}
+
+
+def load_reference(fn, loader, kind=''):
+    """Load static reference data through the process-wide reference data cache.
+
+    The first call for a file runs ``loader(fn)`` and keeps the result. Later calls return a copy of the
+    kept value, without reading the file again, as long as its path, modification time and MD5 checksum
+    are unchanged. The checksum itself is cached per file state (see :func:`checksum_tools.md5_file`).
+    The least recently used values are dropped once the cache holds more than ``KPFPIPE_REFERENCE_CACHE_MB``
+    megabytes.
+
+    When ``KPFPIPE_REFERENCE_CACHE_DIR`` is set, the large array attributes of the loaded value (e.g. the
+    image extensions of a data model) are stored in that directory as .npy files named by the file checksum
+    and memory-mapped. The copies handed out map them copy-on-write, so processes sharing the directory
+    share the pages until they modify the data.
+
+    Args:
+        fn (str): path of the reference file
+        loader (callable): function reading the file, called with fn
+        kind (str): (optional) name of the loader, for files read by different loaders [default='']
+
+    Returns:
+        object: the data returned by loader, or a copy of it
+
+    Raises:
+        OSError: if the file does not exist
+    """
+    global _reference_cache_bytes
+    path = os.path.abspath(fn)
+    key = (kind, path)
+    stat_key = _stat_key(path)
+    checksum = md5_file(path)
+    entry = _reference_cache.get(key)
+    if entry is None or entry[0] != stat_key or entry[1] != checksum:
+        if entry is not None:
+            drop_reference(fn, kind)
+        value = loader(fn)
+        shared = []
+        share_dir = os.environ.get(REFERENCE_CACHE_DIR_ENV)
+        if share_dir:
+            os.makedirs(share_dir, exist_ok=True)
+            shared = _share_arrays(value, checksum, share_dir)
+        nbytes = _nbytes(value)
+        entry = (stat_key, checksum, value, nbytes, shared)
+        if nbytes > _max_cache_bytes():
+            # too large to be kept, only the memory-mapped arrays need a writable copy
+            return copy.deepcopy(value, _copy_on_write_memo(shared)) if shared else value
+        _reference_cache[key] = entry
+        _reference_cache_bytes += nbytes
+        while _reference_cache_bytes > _max_cache_bytes() and len(_reference_cache) > 1:
+            _, old_entry = _reference_cache.popitem(last=False)
+            _reference_cache_bytes -= old_entry[3]
+    else:
+        _reference_cache.move_to_end(key)
+
+    return copy.deepcopy(entry[2], _copy_on_write_memo(entry[4]))
+
+
+def drop_reference(fn, kind='') -> None:
+    """Drop a file from the reference data cache."""
+    global _reference_cache_bytes
+    entry = _reference_cache.pop((kind, os.path.abspath(fn)), None)
+    if entry is not None:
+        _reference_cache_bytes -= entry[3]
+
+
+def clear_reference_cache() -> None:
+    """Drop all cached reference data."""
+    global _reference_cache_bytes
+    _reference_cache.clear()
+    _reference_cache_bytes = 0
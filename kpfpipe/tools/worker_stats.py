@@ -0,0 +1,71 @@
+import time
+
+
+class WorkerStats:
+    """Throughput and latency of the files processed by one pipeline process.
+
+    The processing time of a file runs from :func:`start_file()` to :func:`finish_file()`. The latency
+    also includes the time the file waited in the event queue, when the time it was queued is known.
+
+    Args:
+        name (str): (optional) name of the process, used in the summary [default='']
+
+    Attributes:
+        n_files (int): number of files finished
+        n_unfinished (int): number of files started but not finished, e.g. because of an error in the recipe
+        busy_time (float): total processing time of the finished files, in seconds
+        total_latency (float): total latency of the finished files, in seconds
+        max_latency (float): largest latency of a finished file, in seconds
+    """
+
+    def __init__(self, name=''):
+        self.name = name
+        self.start_time = time.time()
+        self.n_files = 0
+        self.n_unfinished = 0
+        self.busy_time = 0.
+        self.total_latency = 0.
+        self.max_latency = 0.
+        self._current = None
+
+    def start_file(self, file_path, queued_at=None) -> None:
+        """Record the start of the processing of a file.
+
+        Args:
+            file_path (str): path of the file
+            queued_at (float): (optional) time.time() when the file was queued [default=None]
+        """
+        if self._current is not None:
+            self.n_unfinished += 1
+        now = time.time()
+        self._current = (file_path, now, queued_at if queued_at is not None else now)
+
+    def finish_file(self) -> dict:
+        """Record the end of the processing of the current file.
+
+        Returns:
+            dict: 'file_path', 'processing_time' and 'latency' of the file, or None if no file was started
+        """
+        if self._current is None:
+            return None
+        file_path, started_at, queued_at = self._current
+        self._current = None
+        now = time.time()
+        processing_time = now - started_at
+        latency = now - queued_at
+        self.n_files += 1
+        self.busy_time += processing_time
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        return {'file_path': file_path, 'processing_time': processing_time, 'latency': latency}
+
+    def summary(self) -> str:
+        """One line summary of the files processed so far."""
+        elapsed = max(time.time() - self.start_time, 1e-9)
+        if self.n_files == 0:
+            return f"{self.name}: no files processed in {elapsed:.0f} s"
+        return (f"{self.name}: {self.n_files} files in {elapsed:.0f} s "
+                f"({self.n_files * 3600. / elapsed:.1f} files/hour, {100. * self.busy_time / elapsed:.0f}% busy), "
+                f"mean processing {self.busy_time / self.n_files:.1f} s, "
+                f"mean latency {self.total_latency / self.n_files:.1f} s, max latency {self.max_latency:.1f} s, "
+                f"{self.n_unfinished} unfinished")
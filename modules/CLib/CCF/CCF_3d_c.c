@@ -222,6 +222,145 @@ double * ccf_pixels(
     return ccf;
 }
 
+/*
+ * ccf_steps: computes the cross correlation of a spectrum and a mask for
+ * all velocity steps in one call.
+ *
+ * arguments:
+ *  m_l: left edges of mask, length n, sorted in ascending order
+ *  m_h: right edges of mask, length n, sorted in ascending order
+ *  wav: the wavelengths of the spectrum [Angstroms], length m
+ *  spec: flux values of the spectrum, length m
+ *  weight: mask weights, length n
+ *  sn: additional SNR scaling factor, length m (usually set to array of all 1s)
+ *  v_r: the radial velocities at which to calculate the CCF [km/s], length n_v
+ *  v_b: the barycentric velocity of the spectrum [km/s]
+ *  n: length of mask-related arrays (see above)
+ *  m: length of spectrum-related arrays (see above)
+ *  n_v: length of v_r
+ *  ccf_out: output buffer for the CCF at each velocity step, length n_v
+ *  ccf_pix_out: output buffer for the CCF at each velocity step and pixel,
+ *               size n_v x (m-2) in row major order, or NULL if not needed
+ *
+ * The shifted mask buffers are allocated once for all steps, and the mask
+ * line iterator of each step starts from where the previous step started
+ * instead of from the first line. The result at each step is the same as
+ * that of ccf() and ccf_pixels().
+ */
+void ccf_steps(
+    double m_l[], double m_h[], double wav[], double spec[], double weight[],
+    double sn[], double v_r[], double v_b, int n, int m, int n_v,
+    double ccf_out[], double ccf_pix_out[]
+) {
+
+    double c = 2.99792458e5; /* Speed of light [km/s] */
+
+    int cond;
+    double gamma, ccf, val;
+    double fraction, pix_init, pix_end;
+
+    int i, j, k, i_start;
+
+    double *m_lloc;
+    double *m_hloc;
+    double *pix;
+
+    m_lloc = (double *)malloc(n * sizeof(double));
+    m_hloc = (double *)malloc(n * sizeof(double));
+
+    if ((m_lloc == NULL) | (m_hloc == NULL))
+    {
+        fprintf(
+            stderr, "Fatal error: out of memory. Terminating program.\n"
+        );
+        exit(1);
+    }
+
+    i_start = 0;
+    for (k = 0; k < n_v; k++) {
+
+        /* Doppler factor, 3D. */
+        gamma = (1. + (v_r[k] / c)) / (1. + (v_b / c));
+
+        /* Doppler shift mask; shifts all lines in the mask. */
+        for (i = 0; i < n; i++) {
+            m_lloc[i] = m_l[i] * gamma;
+            m_hloc[i] = m_h[i] * gamma;
+        }
+
+        pix = (ccf_pix_out == NULL) ? NULL : (ccf_pix_out + (long)k * (m - 2));
+
+        /* Move the starting mask line back to the first line ending after
+         * the first pixel starts, the forward search below does the rest.
+         */
+        pix_init = 0.5 * (wav[0] + wav[1]);
+        while ((i_start > 0) && (m_hloc[i_start - 1] >= pix_init)) {
+            i_start--;
+        }
+
+        i = i_start; /* Marks current location in mask; the mask line iterator. */
+        ccf = 0.;
+        cond = 0;
+
+        /* Loop over all wavelengths in the spectrum. */
+        for (j = 1; j < m - 1; j++) {
+
+            pix_init = 0.5 * (wav[j - 1] + wav[j]);
+            pix_end = 0.5 * (wav[j] + wav[j + 1]);
+            val = 0.;
+
+            while ((m_hloc[i] < pix_init) & (cond == 0)) {
+                if (i == n - 1) {
+                    cond = 1;
+                }
+                if (cond == 0) {
+                    i++;
+                }
+            }
+
+            if (j == 1) {
+                i_start = i;
+            }
+
+            if ((pix_end < m_hloc[i]) & (pix_init > m_lloc[i])) {
+
+                /* Case 1: pixel fully within mask. */
+                val = spec[j] * weight[i] * sn[j];
+            } else if (
+                ((pix_end < m_hloc[i]) & (pix_init < m_lloc[i])) &
+                (pix_end > m_lloc[i])
+            ) {
+
+                /* Case 2: only right half of pixel within mask. */
+                fraction = (pix_end - m_lloc[i]) / (pix_end - pix_init);
+                val = spec[j] * weight[i] * fraction * sn[j];
+            } else if (
+                ((pix_end > m_hloc[i]) & (pix_init > m_lloc[i])) &
+                (pix_init < m_hloc[i])
+            ) {
+
+                /* Case 3: only left half of pixel within mask. */
+                fraction = (m_hloc[i] - pix_init) / (pix_end - pix_init);
+                val = spec[j] * weight[i] * fraction * sn[j];
+            } else if ((pix_end > m_hloc[i]) & (pix_init < m_lloc[i])) {
+
+                /* Case 4: only middle part of pixel within mask. */
+                fraction = (m_hloc[i] - m_lloc[i]) / (pix_end - pix_init);
+                val = spec[j] * weight[i] * fraction * sn[j];
+            }
+
+            ccf += val;
+            if (pix != NULL) {
+                pix[j - 1] = val;
+            }
+        }
+        ccf_out[k] = ccf;
+    }
+
+    free(m_hloc);
+    free(m_lloc);
+}
+
 /* 
  * Minimal test of the functonality of ccf()
  */
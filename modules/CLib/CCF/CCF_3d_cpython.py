@@ -8,6 +8,7 @@ c_ccf_lib = CDLL(lib_path)
 
 ccf = c_ccf_lib.ccf
 ccf_pixels = c_ccf_lib.ccf_pixels
+ccf_steps = c_ccf_lib.ccf_steps
 ccf.argtypes = [
     np.ctypeslib.ndpointer(dtype=np.float64, ndim=1, flags='C_CONTIGUOUS'),
     np.ctypeslib.ndpointer(dtype=np.float64, ndim=1, flags='C_CONTIGUOUS'),
@@ -32,7 +33,23 @@ ccf_pixels.argtypes = [
     c_int,
     c_int
     ]
+ccf_steps.argtypes = [
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1, flags='C_CONTIGUOUS'),
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1, flags='C_CONTIGUOUS'),
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1, flags='C_CONTIGUOUS'),
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1, flags='C_CONTIGUOUS'),
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1, flags='C_CONTIGUOUS'),
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1, flags='C_CONTIGUOUS'),
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1, flags='C_CONTIGUOUS'),
+    c_double,
+    c_int,
+    c_int,
+    c_int,
+    np.ctypeslib.ndpointer(dtype=np.float64, ndim=1, flags='C_CONTIGUOUS'),
+    c_void_p
+    ]
 ccf.restype = c_double
+ccf_steps.restype = None
 
 
 def calc_ccf(m_l, m_h, wav, spec, weight, sn, v_r, v_b):
@@ -97,6 +114,51 @@ def calc_ccf_pixels(m_l, m_h, wav, spec, weight, sn, v_r, v_b):
     return ccf_ps
 
 
+def calc_ccf_steps(m_l, m_h, wav, spec, weight, sn, v_r, v_b, with_pixels=False):
+    """
+    Python wrapper that calls the C implementation of ccf calculation on all
+    velocity steps in one call
+
+    Args:
+        m_l (np.array of np.float64): left edges of mask, length N, in
+            ascending order
+        m_h (np.array of np.float64): right edges of mask, length N, in
+            ascending order
+        wav (np.array of np.float64): the wavelengths of the spectrum
+            [Angstroms], length M
+        spec (np.array of np.float64): flux values of the spectrum, length M
+        weight (np.array of np.float64): mask weights, length N
+        sn (np.array of np.float64): additional SNR scaling factor, length M
+            (usually set to array of all 1s)
+        v_r (np.array of np.float64): the radial velocities at which to
+            calculate the CCF [km/s], length V
+        v_b (float): the barycentric velocity of the spectrum [km/s]
+        with_pixels (bool): also return the CCF on pixels. Defaults to False.
+
+    Returns:
+        np.array: the calculated CCF at each velocity step, length V
+        np.array: the calculated CCF of pixels at each velocity step,
+            size V x (M-2), only returned if `with_pixels` is True
+
+    """
+
+    n = len(weight)
+    m = len(spec)
+    v_r = np.ascontiguousarray(v_r, dtype=np.float64)
+    n_v = len(v_r)
+
+    ccf_values = np.zeros(n_v, dtype=np.float64)
+    ccf_ps = np.zeros((n_v, m-2), dtype=np.float64) if with_pixels else None
+    ccf_steps(
+        m_l, m_h, wav, spec, weight, sn, v_r, c_double(v_b),
+        c_int(n), c_int(m), c_int(n_v), ccf_values,
+        ccf_ps.ctypes.data_as(c_void_p) if with_pixels else None
+    )
+    if with_pixels:
+        return ccf_values, ccf_ps
+    return ccf_values
+
+
 if __name__ == '__main__':
     """
     Tests barebones functionality of calc_ccf()
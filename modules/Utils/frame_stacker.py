@@ -1,6 +1,91 @@
+import functools
+from statistics import NormalDist
 import numpy as np
 import numpy.ma as ma
 
+# Approximate number of float64 copies of a row band held at once by compute()
+# (input band, median/percentile work arrays, clipping masks and masked-array temporaries).
+STACK_WORK_COPIES = 6
+
+CLIP_CORR_METHODS = ['analytic', 'monte_carlo']
+
+
+def compute_clip_corr_analytic(n_sigma):
+
+    """
+    Compute the variance correction factor for n-sigma clipping of standard normal
+    deviates analytically.  Sigma = 0.5 * (p84 - p16) of a standard normal distribution
+    is the 84th-percentile point z84, so data are clipped at k = n_sigma * z84, and the
+    variance of the normal distribution truncated at +/-k is
+    1 - 2 k phi(k) / (2 Phi(k) - 1).
+
+    Return the correction factor, which is the inverse of the truncated variance.
+    """
+
+    normal = NormalDist()
+    k = n_sigma * normal.inv_cdf(0.84)
+    var = 1.0 - 2.0 * k * normal.pdf(k) / (2.0 * normal.cdf(k) - 1.0)
+
+    return 1.0 / var
+
+
+def compute_clip_corr_monte_carlo(n_sigma,n_trials=10,n_samples=1000000,seed=0):
+
+    """
+    Compute the variance correction factor for n-sigma clipping with a Monte Carlo
+    simulation of standard normal deviates.  The random generator is seeded, so the
+    result is reproducible.
+
+    Return the correction factor, and the mean and standard deviation of the clipped
+    variance over the trials.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    var_trials = []
+    for x in range(0,n_trials):
+        a = rng.normal(0.0, 1.0, n_samples)
+        med = np.median(a, axis=0)
+        p16 = np.percentile(a, 16, axis=0)
+        p84 = np.percentile(a, 84, axis=0)
+        sigma = 0.5 * (p84 - p16)
+        mdmsg = med - n_sigma * sigma
+        b = np.less(a,mdmsg)
+        mdpsg = med + n_sigma * sigma
+        c = np.greater(a,mdpsg)
+        mask = np.any([b,c],axis=0)
+        mx = ma.masked_array(a, mask)
+        var = ma.getdata(mx.var(axis=0))
+        var_trials.append(var)
+
+    np_var_trials = np.array(var_trials)
+    avg_var_trials = np.mean(np_var_trials)
+    std_var_trials = np.std(np_var_trials)
+    corr_fact = 1.0 / avg_var_trials
+
+    return corr_fact,avg_var_trials,std_var_trials
+
+
+@functools.lru_cache(maxsize=None)
+def get_clip_corr_factor(n_sigma,method='analytic'):
+
+    """
+    Return the variance correction factor for n-sigma clipping, memoized by n_sigma and method.
+
+    Arguments:
+        n_sigma (float): Number of sigmas for data clipping.
+        method (str): 'analytic' (default) for the closed-form truncated-normal variance,
+            or 'monte_carlo' for the seeded Monte Carlo simulation.
+    """
+
+    if method == 'analytic':
+        return compute_clip_corr_analytic(float(n_sigma))
+    elif method == 'monte_carlo':
+        return compute_clip_corr_monte_carlo(float(n_sigma))[0]
+    else:
+        raise ValueError('clip correction method {} is not one of {}'.format(method,CLIP_CORR_METHODS))
+
+
 class FrameStacker:
 
     """
@@ -9,19 +94,30 @@ class FrameStacker:
         some number sigmas +/- the median on a pixel-by-pixel basis.
         Sigma is a robust estimator of data dispersion along the
         z-axis of the input stack at a given pixel position.
+        If a RAM budget is given, the stack is processed in bands of
+        image rows, so that only the rows of the current band are read
+        from the input frames and held in memory at once.
 
     Arguments:
-        frames_data (numpy array): 3-D stack of images.
+        frames_data (numpy array or list): 3-D stack of images, or list of 2-D frames
+            that support row slicing (e.g., numpy memmaps or astropy HDU sections).
         n_sigma (float): Number of sigmas for data clipping (default = 2.5).
+        max_ram_mb (float): Approximate peak RAM in MB for stacking (default = None for no limit).
+        clip_corr_method (str): Method of get_clip_corr_factor() for the variance correction
+            factor, 'analytic' or 'monte_carlo' (default = 'analytic').
 
     Attributes:
-        frames_data (numpy array) of image stack.
+        frames_data (numpy array or list) of image stack.
         n_sigma (float): Number of sigmas for data clipping (default = 2.5).
+        max_ram_mb (float): Approximate peak RAM in MB for stacking (default = None for no limit).
+        clip_corr_method (str): Method for the variance correction factor (default = 'analytic').
     """
 
-    def __init__(self,frames_data,n_sigma=2.5,logger=None):
+    def __init__(self,frames_data,n_sigma=2.5,logger=None,max_ram_mb=None,clip_corr_method='analytic'):
         self.frames_data = frames_data
         self.n_sigma = n_sigma
+        self.max_ram_mb = max_ram_mb
+        self.clip_corr_method = clip_corr_method
         if logger:
             self.logger = logger
         else:
@@ -34,64 +130,74 @@ class FrameStacker:
 
         """
         Compute a correction factor to properly reinflate the variance after it is
-        naturally diminished via data-clipping.  Employ a simple Monte Carlo method
-        and standard normal deviates to simulate the data-clipping and obtain the
-        correction factor.
+        naturally diminished via data-clipping.  The factor is that of standard normal
+        deviates clipped at n_sigma, as given by get_clip_corr_factor(), so that it is
+        deterministic and computed only once per n_sigma.
         """
 
-        n_sigma = self.n_sigma
-
-        var_trials = []
-        for x in range(0,10):
-            a = np.random.normal(0.0, 1.0, 1000000)
-            med = np.median(a, axis=0)
-            p16 = np.percentile(a, 16, axis=0)
-            p84 = np.percentile(a, 84, axis=0)
-            sigma = 0.5 * (p84 - p16)
-            mdmsg = med - n_sigma * sigma
-            b = np.less(a,mdmsg)
-            mdpsg = med + n_sigma * sigma
-            c = np.greater(a,mdpsg)
-            mask = np.any([b,c],axis=0)
-            mx = ma.masked_array(a, mask)
-            var = ma.getdata(mx.var(axis=0))
-            var_trials.append(var)
-
-        np_var_trials = np.array(var_trials)
-        avg_var_trials = np.mean(np_var_trials)
-        std_var_trials = np.std(np_var_trials)
-        corr_fact = 1.0 / avg_var_trials
+        corr_fact = get_clip_corr_factor(self.n_sigma,self.clip_corr_method)
 
         if self.logger:
-            self.logger.debug('{}.compute_clip_corr(): avg_var_trials,std_var_trials,corr_fact = {},{},{}'.\
-                format(self.__class__.__name__,avg_var_trials,std_var_trials,corr_fact))
+            self.logger.debug('{}.compute_clip_corr(): n_sigma,clip_corr_method,corr_fact = {},{},{}'.\
+                format(self.__class__.__name__,self.n_sigma,self.clip_corr_method,corr_fact))
         else:
-            print('---->{}.compute_clip_corr(): avg_var_trials,std_var_trials,corr_fact = {},{},{}'.\
-                format(self.__class__.__name__,avg_var_trials,std_var_trials,corr_fact))
+            print('---->{}.compute_clip_corr(): n_sigma,clip_corr_method,corr_fact = {},{},{}'.\
+                format(self.__class__.__name__,self.n_sigma,self.clip_corr_method,corr_fact))
 
         return corr_fact
 
-    def compute(self):
+    def get_stack_shape(self):
 
         """
-        Perform n-sigma data clipping and subsequent stack-averaging,
-        using data from class attributes.
+        Return the shape (n_frames, n_rows, n_cols) of the input stack.
+        """
 
-        Return the data-clipped-mean image.
+        if isinstance(self.frames_data,np.ndarray):
+            return np.shape(self.frames_data)
+
+        n_frames = len(self.frames_data)
+        n_rows,n_cols = self.frames_data[0].shape
+
+        return n_frames,n_rows,n_cols
+
+    def get_rows_per_band(self):
+
+        """
+        Return the number of image rows stacked at once, as limited by max_ram_mb.
         """
 
-        cf = self.compute_clip_corr()
+        n_frames,n_rows,n_cols = self.get_stack_shape()
 
-        a = self.frames_data
-        n_sigma = self.n_sigma
-        frames_data_shape = np.shape(a)
+        if self.max_ram_mb is None:
+            return n_rows
 
-        if self.logger:
-            self.logger.debug('{}.compute(): self.n_sigma,frames_data_shape = {},{}'.\
-                format(self.__class__.__name__,self.n_sigma,frames_data_shape))
-        else:
-            print('---->{}.compute(): self.n_sigma,frames_data_shape = {},{}'.\
-                format(self.__class__.__name__,self.n_sigma,frames_data_shape))
+        bytes_per_row = STACK_WORK_COPIES * 8 * n_frames * n_cols
+        rows_per_band = int(self.max_ram_mb * 1024 * 1024 / bytes_per_row)
+
+        return min(max(rows_per_band,1),n_rows)
+
+    def read_band(self,row_start,row_end):
+
+        """
+        Return the 3-D stack of rows row_start to row_end-1 of all input frames.
+        """
+
+        if isinstance(self.frames_data,np.ndarray):
+            return self.frames_data[:,row_start:row_end]
+
+        return np.array([frame[row_start:row_end] for frame in self.frames_data])
+
+    def compute_band(self,a,cf):
+
+        """
+        Perform n-sigma data clipping and subsequent stack-averaging
+        of the given 3-D stack a, and reinflate the variance by the
+        correction factor cf.
+
+        Return the data-clipped mean, variance, count and uncertainty images.
+        """
+
+        n_sigma = self.n_sigma
 
         med = np.median(a, axis=0)
         p16 = np.percentile(a, 16, axis=0)
@@ -108,6 +214,43 @@ class FrameStacker:
         cnt = ma.getdata(ma.count(mx,axis=0))
         unc = np.sqrt(var/cnt)
 
+        return avg,var,cnt,unc
+
+    def compute(self):
+
+        """
+        Perform n-sigma data clipping and subsequent stack-averaging,
+        using data from class attributes.  The stack is processed in
+        bands of image rows if max_ram_mb is set.
+
+        Return the data-clipped-mean image.
+        """
+
+        cf = self.compute_clip_corr()
+
+        frames_data_shape = self.get_stack_shape()
+        n_rows = frames_data_shape[1]
+        rows_per_band = self.get_rows_per_band()
+
+        if self.logger:
+            self.logger.debug('{}.compute(): self.n_sigma,frames_data_shape,rows_per_band = {},{},{}'.\
+                format(self.__class__.__name__,self.n_sigma,frames_data_shape,rows_per_band))
+        else:
+            print('---->{}.compute(): self.n_sigma,frames_data_shape,rows_per_band = {},{},{}'.\
+                format(self.__class__.__name__,self.n_sigma,frames_data_shape,rows_per_band))
+
+        band_results = []
+        for row_start in range(0,n_rows,rows_per_band):
+            row_end = min(row_start + rows_per_band,n_rows)
+            a = self.read_band(row_start,row_end)
+            band_results.append(self.compute_band(a,cf))
+            del a
+
+        if len(band_results) == 1:
+            avg,var,cnt,unc = band_results[0]
+        else:
+            avg,var,cnt,unc = [np.concatenate(x,axis=0) for x in zip(*band_results)]
+
         if self.logger:
             self.logger.debug('{}.compute(): avg(bias),avg(cnt),avg(unc) = {},{},{}'.\
                 format(self.__class__.__name__,avg.mean(),cnt.mean(),unc.mean()))
@@ -116,6 +259,3 @@ class FrameStacker:
                 format(self.__class__.__name__,avg.mean(),cnt.mean(),unc.mean()))
 
         return avg,var,cnt,unc
-
-
-
@@ -1,7 +1,198 @@
+import os
 import glob
+import json
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+import pandas as pd
 from astropy.io import fits
 
+# Primary-header keywords always recorded in the header index, as used by FitsHeaders.get_good_*().
+HEADER_INDEX_KEYWORDS = ['IMTYPE', 'OBJECT', 'SCI-OBJ', 'CAL-OBJ', 'SKY-OBJ', 'ELAPSED', 'EXPTIME', 'MJD-OBS']
+
+
+def read_primary_header_values(fits_file, keywords):
+
+    """
+    Read the primary header of a FITS file once and return a dictionary of the values
+    of the given keywords.  Keywords that are missing or have undefined values are omitted.
+    """
+
+    header = fits.getheader(fits_file, 0)
+
+    header_values = {}
+    for keyword in keywords:
+        if keyword in header:
+            val = header[keyword]
+            if isinstance(val, (str, bool, int, float)):
+                header_values[keyword] = val
+
+    return header_values
+
+
+class FitsHeaderIndex:
+
+    """
+    Description:
+        This class maintains an index of primary-header keyword values of FITS files,
+        so that each file header is read only once.  Headers are read in parallel threads,
+        and the index is cached in memory across instances and, optionally, in an on-disk
+        JSON sidecar file.  Entries are keyed by file path, and are reread whenever the
+        modification time or size of the file changes.
+
+    Arguments:
+        index_path (str): Pathname of the on-disk sidecar file (default = None for memory only).
+        n_threads (int): Number of threads for reading headers (default = 8).
+
+    Attributes:
+        index_path (str): Pathname of the on-disk sidecar file.
+        n_threads (int): Number of threads for reading headers.
+        memory_index (dict): Class-level index of path -> {'mtime', 'size', 'header'}.
+    """
+
+    memory_index = {}
+
+    def __init__(self, index_path=None, n_threads=8, logger=None):
+        self.index_path = index_path
+        self.n_threads = n_threads
+        self.logger = logger
+        self.loaded_index_path = False
+        self.index_path_entries = {}
+
+    def load_index_file(self):
+
+        """
+        Merge the entries of the on-disk sidecar file into the in-memory index.
+        """
+
+        self.loaded_index_path = True
+        if self.index_path is None or not os.path.exists(self.index_path):
+            return
+
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError) as err:
+            if self.logger:
+                self.logger.debug('FitsHeaderIndex: cannot read {}: {}; ignoring...'.format(self.index_path,err))
+            else:
+                print('---->FitsHeaderIndex: cannot read {}: {}; ignoring...'.format(self.index_path,err))
+            return
+
+        self.index_path_entries = index
+        for fits_file, entry in index.items():
+            if fits_file not in FitsHeaderIndex.memory_index:
+                FitsHeaderIndex.memory_index[fits_file] = entry
+
+    def save_index_file(self, fits_files):
+
+        """
+        Write the in-memory index entries of the given files to the on-disk sidecar file,
+        keeping those of other files already in it.
+        """
+
+        if self.index_path is None:
+            return
+
+        index = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                index = {}
+
+        for fits_file in fits_files:
+            index[fits_file] = FitsHeaderIndex.memory_index[fits_file]
+            self.index_path_entries[fits_file] = index[fits_file]
+
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def is_current(self, fits_file, stat, keywords):
+
+        """
+        Return True if the index entry of the file matches its modification time
+        and size and contains all given keywords.
+        """
+
+        entry = FitsHeaderIndex.memory_index.get(fits_file)
+        if entry is None:
+            return False
+        if entry['mtime'] != stat.st_mtime or entry['size'] != stat.st_size:
+            return False
+
+        return set(keywords).issubset(entry['keywords'])
+
+    def get_table(self, fits_files, keywords):
+
+        """
+        Return a pandas DataFrame, indexed by file path in the given order, of the
+        primary-header values of the given keywords.  Missing values are None.
+        """
+
+        keywords = list(dict.fromkeys(HEADER_INDEX_KEYWORDS + list(keywords)))
+
+        if not self.loaded_index_path:
+            self.load_index_file()
+
+        stale_files = []
+        stats = {}
+        for fits_file in fits_files:
+            stat = os.stat(fits_file)
+            stats[fits_file] = stat
+            if not self.is_current(fits_file, stat, keywords):
+                stale_files.append(fits_file)
+
+        if len(stale_files) > 0:
+            with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+                headers = list(executor.map(lambda f: read_primary_header_values(f, keywords), stale_files))
+            for fits_file, header_values in zip(stale_files, headers):
+                stat = stats[fits_file]
+                FitsHeaderIndex.memory_index[fits_file] = {'mtime': stat.st_mtime, 'size': stat.st_size,
+                                                           'keywords': keywords, 'header': header_values}
+
+        if self.index_path is not None:
+            unsaved_files = [fits_file for fits_file in fits_files
+                             if self.index_path_entries.get(fits_file) != FitsHeaderIndex.memory_index[fits_file]]
+            if len(unsaved_files) > 0:
+                self.save_index_file(unsaved_files)
+
+        if self.logger:
+            self.logger.debug('FitsHeaderIndex.get_table(): n_files,n_files_read = {},{}'.\
+                format(len(fits_files),len(stale_files)))
+        else:
+            print('---->FitsHeaderIndex.get_table(): n_files,n_files_read = {},{}'.\
+                format(len(fits_files),len(stale_files)))
+
+        rows = [FitsHeaderIndex.memory_index[fits_file]['header'] for fits_file in fits_files]
+        table = pd.DataFrame(rows, index=pd.Index(fits_files, dtype=object), columns=keywords, dtype=object)
+
+        return table.where(table.notna(), None)
+
+
+def match_string_lower(column, input_value):
+
+    """
+    Return boolean Series of string values of the column that match the input value in lowercase.
+    """
+
+    input_value = input_value.lower()
+
+    return column.map(lambda val: isinstance(val, str) and val.lower() == input_value).astype(bool)
+
+
+def to_float(column):
+
+    """
+    Return float Series of the values of the column, with NaN for missing or non-numeric values.
+    """
+
+    return pd.to_numeric(column.map(lambda val: None if isinstance(val, bool) else val),
+                         errors='coerce').astype(float)
+
+
 class FitsHeaders:
 
     """
@@ -9,20 +200,25 @@ class FitsHeaders:
         This class contains functions to retrieve and act upon information
         in the headers of FITS files located within a given data directory.
         Typically, the functions will act upon all FITS files under a given date.
+        Primary-header values are looked up in a FitsHeaderIndex, so each
+        file header is read only once.
 
     Arguments:
         search_path (str, which can include file glob): Directory path of FITS files.
         header_keywords (str or list of str): FITS keyword(s) of interest.
         header_values (str or list of str): Value(s) of FITS keyword(s), in list order.
+        header_index_path (str): Pathname of on-disk header index sidecar file (default = None for memory only).
+        n_threads (int): Number of threads for reading headers (default = 8).
 
     Attributes:
         header_keywords (str or list of str): FITS keyword(s) of interest.
         header_values (str or list of str): Value(s) of FITS keyword(s), in list order.
         n_header_keywords (int): Number of FITS keyword(s) of interest.
         input_fits_files (list of str): Individual FITS filename(s) that will be searched.
+        header_index (FitsHeaderIndex): Index of primary-header values of the FITS files.
     """
 
-    def __init__(self, search_path, header_keywords, header_values, logger=None):
+    def __init__(self, search_path, header_keywords, header_values, logger=None, header_index_path=None, n_threads=8):
         self.n_header_keywords = np.size(header_keywords)
         if not isinstance(header_keywords, list):
             header_keywords = [header_keywords]
@@ -31,51 +227,51 @@ class FitsHeaders:
         self.header_keywords = header_keywords
         self.header_values = header_values
         self.input_fits_files = glob.glob(search_path)
+        self.header_table = None
         if logger:
             self.logger = logger
             self.logger.debug('FitsHeaders class constructor: self.input_fits_files = {}'.format(self.input_fits_files))
         else:
             self.logger = None
             print('---->FitsHeaders class constructor: self.input_fits_files = {}'.format(self.input_fits_files))
+        self.header_index = FitsHeaderIndex(header_index_path, n_threads, self.logger)
 
-    def match_headers_string_lower(self):
+    def get_header_table(self):
 
         """
-        Return list of files that each has lowercase string matches
-        to all input FITS kewords/values of interest.
+        Return DataFrame of primary-header values of all input FITS files,
+        indexed by file path.
         """
 
-        matched_fits_files = []
-        for fits_file in self.input_fits_files:
+        if self.header_table is None:
+            self.header_table = self.header_index.get_table(self.input_fits_files, self.header_keywords)
 
-            match_count = 0
-            for i in range(self.n_header_keywords):
+        return self.header_table
 
-                input_value = (self.header_values[i]).lower()
+    def match_string_lower_mask(self):
 
-                try:
+        """
+        Return boolean Series of input FITS files that have lowercase string matches
+        to all input FITS keywords/values of interest.
+        """
 
-                    val = fits.getval(fits_file, self.header_keywords[i])
-                    fits_value = (val).lower()
-                    if (fits_value == input_value):
-                        match_count += 1
+        table = self.get_header_table()
 
-                except KeyError as err:
+        mask = pd.Series(True, index=table.index)
+        for i in range(self.n_header_keywords):
+            mask &= match_string_lower(table[self.header_keywords[i]], self.header_values[i])
 
-                    if self.logger:
-                        self.logger.debug('KeyError: {} ({}); skipping...'.format(err,fits_file))
-                    else:
-                        print('---->KeyError: {} ({}); skipping...'.format(err,fits_file))
+        return mask
 
-                except TypeError as err:
+    def match_headers_string_lower(self):
 
-                    if self.logger:
-                        self.logger.debug('TypeError: {} ({}); skipping...'.format(err,fits_file))
-                    else:
-                        print('---->TypeError: {} ({}); skipping...'.format(err,fits_file))
+        """
+        Return list of files that each has lowercase string matches
+        to all input FITS kewords/values of interest.
+        """
 
-            if match_count == self.n_header_keywords:
-                matched_fits_files.append(fits_file)
+        mask = self.match_string_lower_mask()
+        matched_fits_files = list(mask.index[mask.values])
 
         if self.logger:
              self.logger.debug('FitsHeaders.match_headers_string_lower(): matched_fits_files = {}'.\
@@ -94,53 +290,14 @@ class FitsHeaders:
         all input FITS kewords/values of interest.
         """
 
-        matched_fits_files = []
-        for fits_file in self.input_fits_files:
-
-            match_count = 0
-            for i in range(self.n_header_keywords):
-
-                input_value = float(self.header_values[i])
-
-                try:
-
-                    val = fits.getval(fits_file, self.header_keywords[i])
+        table = self.get_header_table()
 
-                    if self.logger:
-                        self.logger.debug('FitsHeaders.match_headers_float_le(): file,i,keyword,input_value,header_value = {},{},{},{},{}'.\
-                            format(fits_file,i,self.header_keywords[i],input_value,val))
-                    else:
-                        print('---->FitsHeaders.match_headers_float_le(): file,i,keyword,input_value,header_value = {},{},{},{},{}'.\
-                            format(fits_file,i,self.header_keywords[i],input_value,val))
+        mask = pd.Series(True, index=table.index)
+        for i in range(self.n_header_keywords):
+            input_value = float(self.header_values[i])
+            mask &= (to_float(table[self.header_keywords[i]]) <= input_value)
 
-                    try:
-                        fits_value = float(val)
-
-                        if (fits_value <= input_value): match_count += 1
-
-                    except ValueError as err2:
-
-                        if self.logger:
-                            self.logger.debug('ValueError: {}; skipping...'.format(err2))
-                        else:
-                            print('---->ValueError: {}; skipping...'.format(err2))
-
-                except KeyError as err:
-
-                    if self.logger:
-                        self.logger.debug('KeyError: {}; skipping...'.format(err))
-                    else:
-                        print('---->KeyError: {}; skipping...'.format(err))
-
-                except TypeError as err:
-
-                    if self.logger:
-                        self.logger.debug('TypeError: {}; skipping...'.format(err))
-                    else:
-                        print('---->TypeError: {}; skipping...'.format(err))
-
-            if match_count == self.n_header_keywords:
-                matched_fits_files.append(fits_file)
+        matched_fits_files = list(mask.index[mask.values])
 
         if self.logger:
              self.logger.debug('FitsHeaders.match_headers_float_le(): matched_fits_files = {}'.\
@@ -159,44 +316,18 @@ class FitsHeaders:
         or those with SCI-OBJ == "" or SCI-OBJ == "None".
         """
 
-        matched_fits_files = self.match_headers_string_lower()
-
-        filtered_matched_fits_files = []
-        for fits_file in matched_fits_files:
-
-            flag = 'remove'
-
-            try:
-
-                val1 = fits.getval(fits_file, 'SCI-OBJ')
-                val2 = fits.getval(fits_file, 'CAL-OBJ')
-                val3 = fits.getval(fits_file, 'SKY-OBJ')
-                val4 = fits.getval(fits_file, 'ELAPSED')        # Require EXPTIME <= 2.0 seconds to avoid saturation.
-
-                if ((val1 == val2) and (val2 == val3) and (val1 != '') and (val1.lower() != 'none') and (val4 <= 2.0)):
-                    flag = 'keep'
-                    filtered_matched_fits_files.append(fits_file)
-
-                if self.logger:
-                    self.logger.debug('flag,val1,val2,val3,val1.lower(),val4 = {},{},{},{},[{}],{}'.\
-                        format(flag,val1,val2,val3,val1.lower(),val4))
-                else:
-                    print('---->flag,val1,val2,val3,val1.lower(),val4 = {},{},{},{},[{}],{}'.\
-                        format(flag,val1,val2,val3,val1.lower(),val4))
-
-            except KeyError as err:
+        table = self.get_header_table()
 
-                if self.logger:
-                    self.logger.debug('KeyError: {}; removing {} from list...'.format(err,fits_file))
-                else:
-                    print('---->KeyError: {}; removing {} from list...'.format(err,fits_file))
+        val1 = table['SCI-OBJ']
+        val2 = table['CAL-OBJ']
+        val3 = table['SKY-OBJ']
+        val4 = to_float(table['ELAPSED'])        # Require EXPTIME <= 2.0 seconds to avoid saturation.
 
-            except TypeError as err:
+        is_str = val1.map(lambda val: isinstance(val, str)).astype(bool)
+        mask = self.match_string_lower_mask() & is_str & (val1 == val2) & (val2 == val3) & \
+            (val1 != '') & ~match_string_lower(val1, 'none') & (val4 <= 2.0)
 
-                if self.logger:
-                    self.logger.debug('TypeError: {}; removing {} from list...'.format(err,fits_file))
-                else:
-                    print('---->TypeError: {}; removing {} from list...'.format(err,fits_file))
+        filtered_matched_fits_files = list(mask.index[mask.values])
 
         if self.logger:
              self.logger.debug('FitsHeaders.get_good_flats(): filtered_matched_fits_files = {}'.\
@@ -213,49 +344,13 @@ class FitsHeaders:
         Return list of dark files defined by IMTYPE=‘dark’, but include only those
         with EXPTIME greater than or equal to the  specified minimum exposure time.
         """
-        matched_fits_files = self.match_headers_string_lower()
 
-        filtered_matched_fits_files = []
-        all_dark_objects = []
-        for fits_file in matched_fits_files:
+        table = self.get_header_table()
 
-            hdul = fits.open(fits_file)
-            
-            flag = 'remove'
+        mask = self.match_string_lower_mask() & (to_float(table['ELAPSED']) >= exptime_minimum)
 
-            try:
-
-                val4 = float(fits.getval(fits_file, 'ELAPSED'))
-
-                if (val4 >= exptime_minimum):
-                    flag = 'keep'
-                    filtered_matched_fits_files.append(fits_file)
-                    obj = hdul[0].header['OBJECT']
-                    if obj not in all_dark_objects:
-                        all_dark_objects.append(obj)
-
-                if self.logger:
-                    self.logger.debug('flag,val4 = {},{}'.\
-                        format(flag,val4))
-                else:
-                    print('---->flag,val4 = {},{}'.\
-                        format(flag,val4))
-
-            except KeyError as err:
-
-                if self.logger:
-                    self.logger.debug('KeyError: {}; removing {} from list...'.format(err,fits_file))
-                else:
-                    print('---->KeyError: {}; removing {} from list...'.format(err,fits_file))
-
-            except TypeError as err:
-
-                if self.logger:
-                    self.logger.debug('TypeError: {}; removing {} from list...'.format(err,fits_file))
-                else:
-                    print('---->TypeError: {}; removing {} from list...'.format(err,fits_file))
-                
-            hdul.close()
+        filtered_matched_fits_files = list(mask.index[mask.values])
+        all_dark_objects = self.get_objects(filtered_matched_fits_files)
 
         if self.logger:
              self.logger.debug('FitsHeaders.get_good_darks(): filtered_matched_fits_files = {}'.\
@@ -272,44 +367,10 @@ class FitsHeaders:
         Return list of arclamp files defined by IMTYPE=‘arclamp’, and a list of the various OBJECT keyword settings.
         """
 
-        matched_fits_files = []
-        all_arclamp_objects = []
-        for fits_file in self.input_fits_files:
-
-            hdul = fits.open(fits_file)
-            match_count = 0
-            for i in range(self.n_header_keywords):
-
-                input_value = (self.header_values[i]).lower()
-
-                try:
-
-                    val = hdul[0].header[self.header_keywords[i]]
-                    fits_value = (val).lower()
-                    if (fits_value == input_value):
-                        match_count += 1
-
-                except KeyError as err:
-
-                    if self.logger:
-                        self.logger.debug('KeyError: {} ({}); skipping...'.format(err,fits_file))
-                    else:
-                        print('---->KeyError: {} ({}); skipping...'.format(err,fits_file))
-
-                except TypeError as err:
-
-                    if self.logger:
-                        self.logger.debug('TypeError: {} ({}); skipping...'.format(err,fits_file))
-                    else:
-                        print('---->TypeError: {} ({}); skipping...'.format(err,fits_file))
+        mask = self.match_string_lower_mask()
 
-            if match_count == self.n_header_keywords:
-                matched_fits_files.append(fits_file)
-                obj = hdul[0].header['OBJECT']
-                if obj not in all_arclamp_objects:
-                    all_arclamp_objects.append(obj)
-                
-            hdul.close()
+        matched_fits_files = list(mask.index[mask.values])
+        all_arclamp_objects = self.get_objects(matched_fits_files)
 
         if self.logger:
              self.logger.debug('FitsHeaders.get_good_arclamps(): matched_fits_files = {}'.\
@@ -329,49 +390,12 @@ class FitsHeaders:
 
         exptime_maximum = 0.0
 
-        matched_fits_files = self.match_headers_string_lower()
+        table = self.get_header_table()
 
-        filtered_matched_fits_files = []
-        all_bias_objects = []
-        for fits_file in matched_fits_files:
+        mask = self.match_string_lower_mask() & (to_float(table['ELAPSED']) <= exptime_maximum)
 
-            hdul = fits.open(fits_file)
-
-            flag = 'remove'
-
-            try:
-
-                val4 = float(fits.getval(fits_file, 'ELAPSED'))
-
-                if (val4 <= exptime_maximum):
-                    flag = 'keep'
-                    filtered_matched_fits_files.append(fits_file)
-                    obj = hdul[0].header['OBJECT']
-                    if obj not in all_bias_objects:
-                        all_bias_objects.append(obj)
-
-                if self.logger:
-                    self.logger.debug('flag,val4 = {},{}'.\
-                        format(flag,val4))
-                else:
-                    print('---->flag,val4 = {},{}'.\
-                        format(flag,val4))
-
-            except KeyError as err:
-
-                if self.logger:
-                    self.logger.debug('KeyError: {}; removing {} from list...'.format(err,fits_file))
-                else:
-                    print('---->KeyError: {}; removing {} from list...'.format(err,fits_file))
-
-            except TypeError as err:
-
-                if self.logger:
-                    self.logger.debug('TypeError: {}; removing {} from list...'.format(err,fits_file))
-                else:
-                    print('---->TypeError: {}; removing {} from list...'.format(err,fits_file))
-                
-            hdul.close()
+        filtered_matched_fits_files = list(mask.index[mask.values])
+        all_bias_objects = self.get_objects(filtered_matched_fits_files)
 
         if self.logger:
              self.logger.debug('FitsHeaders.get_good_biases(): filtered_matched_fits_files = {}'.\
@@ -381,3 +405,13 @@ class FitsHeaders:
                 format(filtered_matched_fits_files))
 
         return filtered_matched_fits_files,all_bias_objects
+
+    def get_objects(self,fits_files):
+
+        """
+        Return list of the distinct OBJECT keyword settings of the given files, in order of first appearance.
+        """
+
+        objects = self.get_header_table().loc[fits_files, 'OBJECT']
+
+        return [obj for obj in dict.fromkeys(objects) if obj is not None]
@@ -1,7 +1,5 @@
 import numpy as np
-import numpy.ma as ma
 from astropy.io import fits
-import matplotlib.pyplot as plt
 
 # Pipeline dependencies
 from kpfpipe.logger import *
@@ -92,7 +90,10 @@ class OverscanSubtraction(KPF0_Primitive):
             self.n_sigma = self.action.args[13]
         except:
             self.n_sigma = 2.5
-            
+
+        # Overscan clipped mean (e-) of each channel image by FITS extension, for mode = 'clippedmean'
+        self.overscan_clipped_mean = {}
+
         self.module_config_path = DEFAULT_CFG_PATH
         if self.ffi_exts[0] == 'RED_CCD':
             self.module_config_path = DEFAULT_CFG_PATH_RED
@@ -205,19 +206,17 @@ class OverscanSubtraction(KPF0_Primitive):
     def median_subtraction(self,image,overscan_reg):
 
         """
-        Gets median of overscan data, subtracts value from raw science image data.
+        Gets median of overscan data in each row, subtracts value from raw science image data.
 
         Args:
-            image(np.ndarray): Array of image data
+            image(np.ndarray): Array of image data, or stack of channel images (channel, row, column)
             overscan_reg(np.ndarray): Array of pixel range of overscan relative to image pixel width
 
         Returns:
             raw_sub_os(np.ndarray): Raw image with overscan median subtracted
         """
 
-        raw_sub_os = np.zeros_like(image)
-        for row in range(0,raw_sub_os.shape[0]):
-            raw_sub_os[row,:] = image[row,:] - np.median(image[row,overscan_reg],keepdims=True)
+        raw_sub_os = image - np.median(image[...,overscan_reg],axis=-1,keepdims=True)
 
         return raw_sub_os
 
@@ -228,35 +227,40 @@ class OverscanSubtraction(KPF0_Primitive):
         Data-value clipping for outliers is defined at +/- n_sigma (float) times sigma of the
         data, given by a robust estimator of image-data dispersion, sigma = 0.5 * (p84 - p16).
 
-        Computes the clipped mean over the entire post-overscan strip (not row by row).
+        Computes the clipped mean over the entire post-overscan strip (not row by row) of each
+        channel image, and records it in self.overscan_clipped_mean by FITS extension.
 
         Args:
-            image(np.ndarray): Array of image data
+            image(np.ndarray): Array of image data, or stack of channel images (channel, row, column)
             overscan_reg(np.ndarray): Array of pixel range of overscan relative to image pixel width
+            ext(str or list): FITS extension of the image, or list of FITS extensions of the stacked images
 
         Returns:
             raw_sub_os(np.ndarray): Raw image with overscan clipped-mean subtracted
         """
 
-        a = image[:,overscan_reg]
+        a = image[...,overscan_reg]
         n_sigma = self.n_sigma
-        frame_data_shape = np.shape(a)
+        strip_axes = (-2,-1)
 
-        med = np.median(a)
-        p16 = np.percentile(a,16)
-        p84 = np.percentile(a,84)
+        med = np.median(a,axis=strip_axes,keepdims=True)
+        p16 = np.percentile(a,16,axis=strip_axes,keepdims=True)
+        p84 = np.percentile(a,84,axis=strip_axes,keepdims=True)
         sigma = 0.5 * (p84 - p16)
         mdmsg = med - n_sigma * sigma
         b = np.less(a,mdmsg)
         mdpsg = med + n_sigma * sigma
         c = np.greater(a,mdpsg)
         mask = b | c
-        mx = ma.masked_array(a, mask)
-        avg = ma.getdata(mx.mean())
-        overscan_clipped_mean[ext] = avg.item()
+        avg = np.sum(np.where(mask,0.0,a),axis=strip_axes,keepdims=True) / np.sum(~mask,axis=strip_axes,keepdims=True)
 
-        self.logger.debug('---->{}.clippedmean_subtraction(): ext,overscan_reg,n_sigma,p16,med,p84,sigma,avg = {},{},{},{},{},{},{},{}'.\
-            format(self.__class__.__name__,ext,overscan_reg,n_sigma,p16,med,p84,sigma,avg))
+        exts = [ext] if np.ndim(a) == 2 else ext
+        for i,ext_i in enumerate(exts):
+            self.overscan_clipped_mean[ext_i] = avg.reshape(-1)[i].item()
+
+            self.logger.debug('---->{}.clippedmean_subtraction(): ext,overscan_reg,n_sigma,p16,med,p84,sigma,avg = {},{},{},{},{},{},{},{}'.\
+                format(self.__class__.__name__,ext_i,overscan_reg,n_sigma,p16.reshape(-1)[i],med.reshape(-1)[i],
+                       p84.reshape(-1)[i],sigma.reshape(-1)[i],avg.reshape(-1)[i]))
 
         raw_sub_os = image - avg
 
@@ -265,28 +269,23 @@ class OverscanSubtraction(KPF0_Primitive):
 
     def polyfit_subtraction(self,image,overscan_reg): #need to double check that this works w fixes
 
-        """Performs linear fit on overscan data, subtracts fit values from raw science image data.
+        """Performs polynomial fit on overscan row means, subtracts fit values from raw science image data.
 
         Args:
-            image(np.ndarray): Array of image data
+            image(np.ndarray): Array of image data, or stack of channel images (channel, row, column)
             overscan_reg(np.ndarray): Array of pixel range of overscan relative to image pixel width
 
         Returns:
             raw_sub_os(np.ndarray): Raw image with overscan fit subtracted
         """
 
-        xx = np.arange(image.shape[0]) #double check this
-        raw_sub_os = np.zeros(image.shape)
-        means = []
-        for row in xx:
-            mean = np.mean(image[row,overscan_reg])
-            means.append(mean)
+        xx = np.arange(image.shape[-2]) #double check this
+        means = np.mean(image[...,overscan_reg],axis=-1)
 
-        polyfit = np.polyfit(xx,means,self.order)
-        polyval = np.polyval(polyfit,xx)
-        reshape = np.reshape(polyval,(-1,1))
-        for row in xx:
-            raw_sub_os[row] = image[row] - reshape[row]
+        # One fit per channel image, all solved together
+        polyfit = np.polyfit(xx,means.reshape(-1,len(xx)).T,self.order)
+        polyval = np.polyval(polyfit,xx[:,np.newaxis]).T.reshape(means.shape)
+        raw_sub_os = image - polyval[...,np.newaxis]
 
         return raw_sub_os
 
@@ -363,11 +362,42 @@ class OverscanSubtraction(KPF0_Primitive):
 
         return image_cut
 
+    def subtract_overscan(self,image_w_prescan,ext):
+
+        """
+        Chops off the prescan region and subtracts the overscan (method chosen by user) of a correctly-oriented
+        channel image, or of a stack of correctly-oriented channel images of the same shape.
+
+        Args:
+            image_w_prescan(np.ndarray): Channel image (row, column), or stack of channel images (channel, row, column)
+            ext(str or list): FITS extension of the image, or list of FITS extensions of the stacked images
+
+        Returns:
+            raw_sub_os(np.ndarray): Image or stack of images with overscan subtracted, without prescan region
+        """
+
+        srl_oscan_pxl_array,prl_oscan_pxl_array,srl_clipped_oscan,prl_clipped_oscan = \
+            self.overscan_arrays(image_w_prescan.reshape((-1,) + image_w_prescan.shape[-2:])[0])
+        # chop off prescan
+        new_img = image_w_prescan[...,self.prescan_reg[1]:-1]
+
+        if self.mode == 'median':
+            raw_sub_os = self.median_subtraction(new_img,srl_clipped_oscan)
+        elif self.mode == 'clippedmean':
+            raw_sub_os = self.clippedmean_subtraction(new_img,srl_clipped_oscan,ext)
+        elif self.mode == 'polynomial': # subtract linear fit of overscan
+            raw_sub_os = self.polyfit_subtraction(new_img,srl_clipped_oscan)
+        else:
+            raise TypeError('Input overscan subtraction mode set to value outside options.')
+
+        return raw_sub_os
+
     def run_oscan_subtraction(self,channel_imgs,channels,channel_keys,channel_rows,channel_cols,channel_exts):
 
         """
-        Performs overscan subtraction steps, in order: orient frame, subtract overscan (method
-        chosen by user) from correctly-oriented frame (overscan on right and bottom), cuts off overscan region.
+        Performs overscan subtraction steps, in order: orient frames, subtract overscan (method
+        chosen by user) from the stack of correctly-oriented frames (overscan on right and bottom),
+        or from each frame if the frames differ in shape, cuts off overscan region.
 
         Args:
             channel_imgs(np.ndarray): All extension images that make up a single FFI
@@ -383,45 +413,25 @@ class OverscanSubtraction(KPF0_Primitive):
         """
 
 
-        # create empty list for final, overscan subtracted/cut arrays
-        no_overscan_imgs = []
-
         n_channel_images = len(channel_imgs)
         self.logger.debug("=============> n_channel_images = {}".format(n_channel_images))
+        self.logger.debug('---->{}.run_oscan_subtraction(): exts = {}'.\
+            format(self.__class__.__name__,channel_exts))
+
+        # correctly-oriented channel images, overscan on right and bottom, subtracted as one stack;
+        # channel images of different shapes (and so overscan regions) are subtracted one at a time
+        new_imgs_w_prescan = [self.orientation_adjust(img,key) for img,key in zip(channel_imgs,channel_keys)]
+        exts = list(channel_exts[:n_channel_images])
+        if len(set(np.shape(img) for img in new_imgs_w_prescan)) == 1:
+            raw_sub_os = self.subtract_overscan(np.array(new_imgs_w_prescan),exts)
+        else:
+            self.logger.debug('---->{}.run_oscan_subtraction(): channel image shapes differ, subtracting one at a time'.\
+                format(self.__class__.__name__))
+            raw_sub_os = [self.subtract_overscan(img,ext) for img,ext in zip(new_imgs_w_prescan,exts)]
 
-        for img,key,ext in zip(channel_imgs,channel_keys,channel_exts):
-
-            ###gain addition###
-
-
-            ##########
-
-            self.logger.debug('---->{}.run_oscan_subtraction(): ext = {}'.\
-                format(self.__class__.__name__,ext))
-
-            new_img_w_prescan = self.orientation_adjust(img,key)
-            srl_oscan_pxl_array,prl_oscan_pxl_array,srl_clipped_oscan,prl_clipped_oscan = self.overscan_arrays(new_img_w_prescan)
-            # chop off prescan
-            new_img = new_img_w_prescan[:,self.prescan_reg[1]:-1]
-
-            # overscan subtraction for chosen method
-            if self.mode == 'median':
-                raw_sub_os = self.median_subtraction(new_img,srl_clipped_oscan)
-            elif self.mode == 'clippedmean':
-                raw_sub_os = self.clippedmean_subtraction(new_img,srl_clipped_oscan,ext)
-            elif self.mode == 'polynomial': # subtract linear fit of overscan
-                raw_sub_os = self.polyfit_subtraction(new_img,srl_clipped_oscan)
-            else:
-                raise TypeError('Input overscan subtraction mode set to value outside options.')
-
-            # chop off overscan  - put into overscan subtraction utility
-            new_img = self.overscan_cut(raw_sub_os,self.channel_datasec_nrows,self.channel_datasec_ncols)
-
-            # put img back into original orientation
-            og_oriented_img = self.orientation_adjust(new_img,key)
-            plt.imshow(og_oriented_img)
-
-            no_overscan_imgs.append(og_oriented_img)
+        # chop off overscan, and put imgs back into original orientation
+        no_overscan_imgs = [self.orientation_adjust(self.overscan_cut(img,self.channel_datasec_nrows,self.channel_datasec_ncols),key)
+                            for img,key in zip(raw_sub_os,channel_keys)]
 
         full_frame_img = self.generate_FFI(no_overscan_imgs,channel_rows,channel_cols)
 
@@ -516,9 +526,7 @@ class OverscanSubtraction(KPF0_Primitive):
                     frames_data.append(data_gain_corr)
                 frames_data = np.array(frames_data)
 
-                if self.mode == 'clippedmean':
-                    global overscan_clipped_mean
-                    overscan_clipped_mean = {}
+                self.overscan_clipped_mean = {}
 
                 for frame in range(len(self.ffi_exts)):
 
@@ -534,9 +542,9 @@ class OverscanSubtraction(KPF0_Primitive):
 
                     if self.mode == 'clippedmean':
                         i = 1
-                        for key in overscan_clipped_mean:
+                        for key in self.overscan_clipped_mean:
                             keywrd = "OSCANV" + str(i)
-                            keyval = overscan_clipped_mean[key]
+                            keyval = self.overscan_clipped_mean[key]
                             keycmt = "Overscan clipped mean (e-), " + key
                             l0_obj.header[self.ffi_exts[frame]][keywrd] = (keyval, keycmt)
                             i = i + 1
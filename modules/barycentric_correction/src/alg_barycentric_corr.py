@@ -2,6 +2,7 @@ import numpy as np
 import os
 import os.path
 import logging
+import hashlib
 from barycorrpy import get_BC_vel
 from astropy.utils import iers
 import pandas as pd
@@ -69,6 +70,13 @@ class BarycentricCorrectionAlg(ModuleAlgBase):
     STARNAME = 'starname'
     """ star name """
 
+    BC_CACHE_KEYS = [RA, DEC, PMRA, PMDEC, EPOCH, PX, LAT, LON, ALT, RV, STARNAME]
+    """ keys of observation configuration identifying a barycentric correction cache """
+    BC_CACHE_JD_DECIMALS = 8
+    """ decimals of Julian Date to match the time points in barycentric correction cache """
+    bc_cache = {}
+    """ barycentric correction cache loaded or computed in the process, keyed by observation configuration """
+
     def __init__(self, obs_config, config=None, logger=None, logger_name=None):
         ModuleAlgBase.__init__(self, logger_name or self.__class__.__name__, config, logger)
 
@@ -201,7 +209,9 @@ class BarycentricCorrectionAlg(ModuleAlgBase):
 
         # compute redshift from barycentric correction and save the result to the file if there is
         if np.size(zb_bc_corr) == 0 and obs_config is not None:
-            zb_list = BarycentricCorrectionAlg.get_bc_corr_period(obs_config, start_jd, days_period)
+            cache_dir = BarycentricCorrectionAlg.get_bc_cache_dir(data_path or save_to_path)
+            zb_list = BarycentricCorrectionAlg.get_bc_corr_period(obs_config, start_jd, days_period,
+                                                                  cache_dir=cache_dir)
             zb_bc_corr = np.array(zb_list)
 
         # store to csv file
@@ -249,13 +259,18 @@ class BarycentricCorrectionAlg(ModuleAlgBase):
         return zb_bc_file
 
     @staticmethod
-    def get_bc_corr_period(obs_config, start_jd, days_period=None):
+    def get_bc_corr_period(obs_config, start_jd, days_period=None, cache_dir=None):
         """Compute redshift values from barycentric velocity correction over a period of days.
 
+        The values are looked up from the barycentric correction cache of the target and only the days missing from
+        the cache are computed, in one call to barycorrpy.get_BC_vel. The cache is extended with the new values.
+
         Args:
             obs_config (dict): A dict instance containing observation configuration.
             start_jd (float): Starting time point in Julian Date format.
             days_period: Period of days for BC correction calculation. Defaults to None for one day.
+            cache_dir (str, optional): Directory of the barycentric correction cache file. Defaults to None for
+                the cache in the process only.
 
         Returns:
             numpy.ndarray: redshift from barycentric velocity correction for a period of days.
@@ -263,16 +278,127 @@ class BarycentricCorrectionAlg(ModuleAlgBase):
         """
         jds = np.arange(days_period, dtype=float) + start_jd if days_period else [start_jd]
         # jds = np.arange(days_period+1, dtype=float) + start_jd
-        zb_list = list()
-        for jd in jds:
-            # iso_t = Time(jd, format='jd', scale='utc')
-            bc = BarycentricCorrectionAlg.get_bc_corr(obs_config, jd)
-            if bc:
-                # zb_list.append(bc / LIGHT_SPEED_M)
-                zb_list.append(bc)
-            else:
-                zb_list.append(0.0)
-        return zb_list
+        zb_list = BarycentricCorrectionAlg.get_bc_corr_cached(obs_config, jds, cache_dir)
+        return zb_list.tolist()
+
+    @staticmethod
+    def get_bc_cache_dir(data_path):
+        """ Get the directory of the barycentric correction cache file.
+
+        Args:
+            data_path (str): Path of the redshift data file or directory.
+
+        Returns:
+            str: Directory for the cache file, or None if `data_path` is not set.
+
+        """
+        if not data_path:
+            return None
+        if os.path.isdir(data_path):
+            return data_path
+        dirname = os.path.dirname(data_path)
+        return dirname if dirname and os.path.isdir(dirname) else None
+
+    @staticmethod
+    def get_bc_cache_key(obs_config):
+        """ Compose the key identifying the barycentric correction cache of a target at an observatory.
+
+        Args:
+            obs_config (dict): A dict instance containing observation configuration.
+
+        Returns:
+            str: Key composed of the instrument, star name and the checksum of the star and observatory parameters.
+
+        """
+        params = '|'.join([k + '=' + str(obs_config.get(k)) for k in BarycentricCorrectionAlg.BC_CACHE_KEYS])
+        instrument = str(obs_config.get(BarycentricCorrectionAlg.SPEC, '')).lower()
+        target = str(obs_config.get(BarycentricCorrectionAlg.STARNAME, 'unknown')).lower().replace(' ', '_')
+        return instrument + '_' + target + '_' + hashlib.md5(params.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def get_bc_corr_cached(obs_config, jds, cache_dir=None):
+        """Get barycentric velocity correction on time points from the cache of the target.
+
+        The cache of the target is loaded from the file 'bc_cache_<key>.csv' under `cache_dir` if it is not in the
+        process yet. The time points missing from the cache are computed by
+        :func:`~barycentric_correction_alg.BarycentricCorrectionAlg.get_bc_corr_jds()` and added to the cache file.
+
+        Args:
+            obs_config (dict): A dict instance containing observation configuration.
+            jds (numpy.ndarray): Time points in Julian Date format.
+            cache_dir (str, optional): Directory of the cache file. Defaults to None for no cache file.
+
+        Returns:
+            numpy.ndarray: Barycentric velocity [m/s] correction at `jds`.
+
+        """
+        jds = np.atleast_1d(np.asarray(jds, dtype=float))
+        key = BarycentricCorrectionAlg.get_bc_cache_key(obs_config)
+        cache_file = os.path.join(cache_dir, 'bc_cache_' + key + '.csv') if cache_dir else None
+
+        cache = BarycentricCorrectionAlg.bc_cache.get(key)
+        if cache is None:
+            cache = BarycentricCorrectionAlg.read_bc_cache_file(cache_file)
+            BarycentricCorrectionAlg.bc_cache[key] = cache
+
+        jds_key = np.round(jds, BarycentricCorrectionAlg.BC_CACHE_JD_DECIMALS)
+        missing = np.array([jd not in cache for jd in jds_key], dtype=bool)
+        if np.any(missing) and cache_file is not None:
+            # time points may have been added to the cache file by another process
+            cache.update(BarycentricCorrectionAlg.read_bc_cache_file(cache_file))
+            missing = np.array([jd not in cache for jd in jds_key], dtype=bool)
+        if np.any(missing):
+            new_jds, new_idx = np.unique(jds_key[missing], return_index=True)
+            new_bc = BarycentricCorrectionAlg.get_bc_corr_jds(obs_config, jds[missing][new_idx])
+            cache.update(zip(new_jds, new_bc))
+            BarycentricCorrectionAlg.write_bc_cache_file(cache_file, cache)
+
+        return np.array([cache[jd] for jd in jds_key], dtype=float)
+
+    @staticmethod
+    def read_bc_cache_file(cache_file):
+        """ Read the barycentric correction cache file of a target.
+
+        Args:
+            cache_file (str): Path of the cache file, or None.
+
+        Returns:
+            dict: Barycentric velocity correction keyed by the rounded Julian Date. Empty if the file is missing or
+            cannot be read, and without the rows of a partially written file, so those time points are recomputed.
+
+        """
+        if cache_file is None or not os.path.isfile(cache_file):
+            return {}
+        try:
+            df = pd.read_csv(cache_file)
+            jds = pd.to_numeric(df['jd'], errors='coerce').values
+            bcs = pd.to_numeric(df['bc'], errors='coerce').values
+        except Exception:
+            return {}
+        valid = np.isfinite(jds) & np.isfinite(bcs)
+        return dict(zip(np.round(jds[valid], BarycentricCorrectionAlg.BC_CACHE_JD_DECIMALS), bcs[valid]))
+
+    @staticmethod
+    def write_bc_cache_file(cache_file, cache):
+        """ Write the barycentric correction cache of a target to its cache file.
+
+        The time points in the file, which may have been added by another process, are merged into `cache` first.
+        The file is written to a temporary file and then renamed, so a reader never sees a partial file.
+
+        Args:
+            cache_file (str): Path of the cache file, or None for no file.
+            cache (dict): Barycentric velocity correction keyed by the rounded Julian Date.
+
+        """
+        if cache_file is None:
+            return
+        for jd, bc in BarycentricCorrectionAlg.read_bc_cache_file(cache_file).items():
+            cache.setdefault(jd, bc)
+        cache_jds = np.array(sorted(cache.keys()))
+        df = pd.DataFrame({'jd': cache_jds, 'bc': [cache[jd] for jd in cache_jds]})
+        tmp_file = cache_file + '.' + str(os.getpid()) + '.tmp'
+        df.to_csv(tmp_file, index=False, float_format='%.10f')
+        os.replace(tmp_file, cache_file)
 
     @staticmethod
     def get_bc_corr(obs_config, jd):
@@ -286,10 +412,25 @@ class BarycentricCorrectionAlg(ModuleAlgBase):
             float: Barycentric velocity [m/s] correction from barycorrpy.get_BC_vel.
 
         """
+        return BarycentricCorrectionAlg.get_bc_corr_jds(obs_config, jd)[0]
+
+    @staticmethod
+    def get_bc_corr_jds(obs_config, jds):
+        """Compute Barycentric correction on a list of time points in one call to barycorrpy.get_BC_vel.
+
+        Args:
+            obs_config (dict): A dict instance containing observation configuration.
+            jds (float|numpy.ndarray): Time points in Julian Date format.
+
+        Returns:
+            numpy.ndarray: Barycentric velocity [m/s] correction from barycorrpy.get_BC_vel at each time point.
+
+        """
+        jds = np.atleast_1d(np.asarray(jds, dtype=float))
         star = obs_config[BarycentricCorrectionAlg.STARNAME].lower()
         if star == 'sun':
             # epoch, SolSystemTarget, predictive
-            bc_obj = get_BC_vel(JDUTC=jd,
+            bc_obj = get_BC_vel(JDUTC=jds,
                                 ra=None,
                                 dec=None,
                                 epoch=None,
@@ -304,9 +445,9 @@ class BarycentricCorrectionAlg(ModuleAlgBase):
                                 rv=None,
                                 #rv=obs_config[BarycentricCorrectionAlg.RV]
                                 )
-            return -bc_obj[0][0]
+            return -np.asarray(bc_obj[0], dtype=float)
         else:
-            bc_obj = get_BC_vel(JDUTC=jd,
+            bc_obj = get_BC_vel(JDUTC=jds,
                             ra=obs_config[BarycentricCorrectionAlg.RA],
                             dec=obs_config[BarycentricCorrectionAlg.DEC],
                             epoch=obs_config[BarycentricCorrectionAlg.EPOCH],
@@ -317,4 +458,4 @@ class BarycentricCorrectionAlg(ModuleAlgBase):
                             longi=obs_config[BarycentricCorrectionAlg.LON],
                             alt=obs_config[BarycentricCorrectionAlg.ALT],
                             rv=obs_config[BarycentricCorrectionAlg.RV])
-            return bc_obj[0][0]
+            return np.asarray(bc_obj[0], dtype=float)
@@ -4,6 +4,7 @@ from os.path import exists
 from configparser import ConfigParser
 from modules.Utils.config_parser import ConfigHandler
 from modules.Utils.alg_base import ModuleAlgBase
+from kpfpipe.tools.reference_cache import load_reference
 
 
 class CaHKAlg(ModuleAlgBase):
@@ -182,7 +183,7 @@ class CaHKAlg(ModuleAlgBase):
         if not exists(trace_path):
             return None
 
-        loc_result = pd.read_csv(trace_path, sep=' ')
+        loc_result = load_reference(trace_path, lambda f: pd.read_csv(f, sep=' '), kind='hk_trace_csv')
         loc_vals = np.array(loc_result.values)
         loc_cols = np.array(loc_result.columns)
 
@@ -352,7 +353,9 @@ class CaHKAlg(ModuleAlgBase):
         if not exists(wave_table_file):
             return None
 
-        wave_result = pd.read_csv(wave_table_file, header=None, sep=' ', comment='#', engine='python')
+        wave_result = load_reference(wave_table_file,
+                                     lambda f: pd.read_csv(f, header=None, sep=' ', comment='#', engine='python'),
+                                     kind='hk_wave_csv')
         wave_vals = np.array(wave_result.values)
         if fiber in self.trace_location and self.trace_location[fiber] is not None:
             total_order = len(self.trace_location[fiber].keys())
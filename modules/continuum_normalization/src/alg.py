@@ -33,7 +33,7 @@ class ContNormAlgg:
         Args:
             mask_array_provided (boolean): Whether or not mask array is provided.
             method (str): Method of continuum normalization within the following:
-                'Spline','AFS','Polynomial','Pyreduce'.
+                'Spline','AFS','FastAFS','Polynomial','Pyreduce'.
             continuum_guess_provided (boolean): If initial guess of continuum normalization
                 is provided.
             plot_results (boolean): Whether to plot results
@@ -42,6 +42,7 @@ class ContNormAlgg:
             ffrac (float): Percentile above which is considered as continuum
             a (int): Radius of AFS circle (1/a)
             d (float): Window width in AFS
+            lowess_block (int): Number of points smoothed at a time in lowess_ag
             config (configparser.ConfigParser, optional): Config context. Defaults to None.
             logger (logging.Lobber, optional): Instance of logging.Logger. Defaults to None.
         """
@@ -57,6 +58,7 @@ class ContNormAlgg:
         self.std_window=configpull.get_config_value('std_window',15)
         self.a=configpull.get_config_value('a',6)
         self.d=configpull.get_config_value('d',.25)
+        self.lowess_block=configpull.get_config_value('lowess_block',256)
         self.edge_clip=configpull.get_config_value('edge_clip',1000)
         self.output_dir=configpull.get_config_value('output_dir','/Users/paminabby/Desktop/cn_test')
         self.config=config
@@ -77,6 +79,22 @@ class ContNormAlgg:
         ss = inter.LSQUnivariateSpline(x,y,breakpoint[1:-1])
         return ss
 
+    def running_window(self,flux,window):
+        """Generates a view of the running window of each pixel of flux input.
+
+        The window of pixel i covers pixels i-window to i+window-1, cut at the edges of the array.
+        Pixels outside of the array are padded with NaN.
+
+        Args:
+            flux (np.array): Array of flux data.
+            window (int): Half width of the window.
+
+        Returns:
+            flux_window (np.array): Read-only (len(flux) x 2*window) view of the running windows.
+        """
+        padded = np.concatenate((np.full(window, np.nan), np.asarray(flux, dtype=float), np.full(max(window-1, 0), np.nan)))
+        return np.lib.stride_tricks.sliding_window_view(padded, 2*window)
+
     def RunningMedian(self,flux):
         """Generates running median array of flux input.
 
@@ -86,10 +104,14 @@ class ContNormAlgg:
         Returns:
             flux_median (np.array): Array of running median fluxes.
         """
-        flux_median = np.ones_like(flux)
-        for i in range(len(flux)):
-            flux_median[i] = np.nanmedian(flux[np.max([0,i-self.med_window]):np.min([len(flux),i+self.med_window])])
-        return flux_median
+        # NaN sort to the end of each window, the median is taken over the valid pixels in front of them
+        flux_window = np.sort(self.running_window(flux,self.med_window),axis=1)
+        n_valid = np.sum(~np.isnan(flux_window),axis=1)
+        rows = np.arange(len(flux_window))
+        lower = flux_window[rows,np.maximum((n_valid-1)//2,0)]
+        upper = flux_window[rows,np.maximum(n_valid//2,0)]
+        flux_median = np.where(n_valid > 0, (lower+upper)/2., np.nan)
+        return flux_median.astype(np.asarray(flux).dtype, copy=False)
 
     def RunningSTD(self,flux):
         """Generates running standard deviation array of flux input.
@@ -100,10 +122,8 @@ class ContNormAlgg:
         Returns:
             flux_std (np.array): Array of running standard deviations.
         """
-        flux_std = np.ones_like(flux)
-        for i in range(len(flux)):
-            flux_std[i] = np.nanstd(flux[np.max([0,i-self.std_window]):np.min([len(flux),i+self.std_window])])
-        return flux_std
+        flux_std = np.nanstd(self.running_window(flux,self.std_window),axis=1)
+        return flux_std.astype(np.asarray(flux).dtype, copy=False)
 
     def flatspec(self,x,rawspec,weight):
         """Performs polynomial fitting for specified number of iterations.
@@ -177,6 +197,8 @@ class ContNormAlgg:
         the estimated (smooth) values of y.The smoothing span is given by f. A larger 
         value for f will result in a smoother curve. The number of robustifying 
         iterations is given by iter. The function will run faster with a smaller number of iterations.
+        Only the r+1 nearest neighbours of a point have weight in its local fit, so the fits are computed on
+        a band of neighbours of the points sorted by x, lowess_block points at a time.
 
         Args:
             x (np.array): X-data points.
@@ -188,25 +210,44 @@ class ContNormAlgg:
         """
         n = len(x)
         r = int(ceil(self.d * n))
-        h = [np.sort(np.abs(x - x[i]))[r] for i in range(n)]#identify nearest neighbours
-        w = np.clip(np.abs((x[:, None] - x[None, :]) / h), 0.0, 1.0)
-        w = (1 - w ** 3) ** 3
+        # work on the points sorted by x, so that the neighbours of each point are a band of k points around it
+        order = np.argsort(x, kind='stable')
+        x = np.asarray(x, dtype=float)[order]
+        y = np.asarray(y, dtype=float)[order]
+        pixels = np.arange(n)
+        # h is the distance to the r-th nearest neighbour, the largest distance within the best window of r+1 points;
+        # with duplicate x the best window may hold a point equal to x[i] rather than x[i] itself, so all windows count
+        lo = np.minimum(np.searchsorted(x[:n-r] + x[r:], 2 * x), n - 1 - r)
+        lo_left = np.maximum(lo - 1, 0)
+        h = np.minimum(np.maximum(x - x[lo], x[lo + r] - x), np.maximum(x - x[lo_left], x[lo_left + r] - x))
+        # points outside of the band are at least h away and get no weight; the band holds the points closer than h,
+        # which are more than r+1 where duplicates tie at distance h, and one extra point on each side against rounding
+        inner = np.searchsorted(x, x - h, side='right')
+        k = min(n, int(np.max(np.searchsorted(x, x + h, side='left') - inner)) + 2)
+        first = np.clip(inner - 1, 0, n - k)
         yest = np.zeros(n)
         delta = np.ones(n)
         for iteration in range(self.n_iter):
-            for i in range(n):
-                weights = delta * w[:, i]
-                b = np.array([np.sum(weights * y), np.sum(weights * y * x)])
-                A = np.array([[np.sum(weights), np.sum(weights * x)],
-                            [np.sum(weights * x), np.sum(weights * x * x)]])
-                beta = linalg.solve(A, b)
-                yest[i] = beta[0] + beta[1] * x[i]
+            for block in range(0, n, self.lowess_block):
+                rows = pixels[block:block + self.lowess_block]
+                band = first[rows, None] + np.arange(k)
+                w = np.clip(np.abs((x[band] - x[rows, None]) / h[rows, None]), 0.0, 1.0)
+                weights = delta[band] * (1 - w ** 3) ** 3
+                wx = weights * x[band]
+                b = np.stack([np.sum(weights * y[band], axis=1), np.sum(wx * y[band], axis=1)], axis=-1)
+                A = np.empty((len(rows), 2, 2))
+                A[:, 0, 0] = np.sum(weights, axis=1)
+                A[:, 0, 1] = A[:, 1, 0] = np.sum(wx, axis=1)
+                A[:, 1, 1] = np.sum(wx * x[band], axis=1)
+                beta = np.linalg.solve(A, b[:, :, None])[:, :, 0]
+                yest[rows] = beta[:, 0] + beta[:, 1] * x[rows]
 
             residuals = y - yest
             s = np.median(np.abs(residuals))
             delta = np.clip(residuals / (6.0 * s), -1, 1)
             delta = (1 - delta ** 2) ** 2
 
+        yest[order] = yest.copy()
         return yest
 
     # Define AFS function
@@ -249,9 +290,9 @@ class ContNormAlgg:
         # polygon: shapely polygon object
         # return Variable:
         # variable indices is a list recording the indices of the vertices in the polygon
+        ref_sorter=np.argsort(ref.values,kind='stable')
         def find_vertices(polygon):
-            coordinates=list(polygon.exterior.coords)
-            return [ref[ref==coordinates[i][0]].index[0] for i in range(len(coordinates))]
+            return self.find_vertices(ref.values,np.asarray(polygon.exterior.coords)[:,0],ref_sorter)
 
         # if alpha_shape is just a polygon, there is only one loop
         # if alpha_shape is a multi-polygon, we interate it and find all the loops.
@@ -334,6 +375,102 @@ class ContNormAlgg:
         return order["intens"].values/y_final,y_final
 
 
+    def find_vertices(self, ref, vertex_wv, ref_sorter=None):
+        """Finds the pixel indices of the vertices of an alpha shape polygon from their wavelengths.
+
+        Each vertex is matched to the first pixel with the same wavelength, as ref[ref==wv].index[0] does
+        on the wavelength series of AFS(), by a binary search on the stably sorted wavelengths.
+
+        Args:
+            ref (np.array): Wavelength data of the order.
+            vertex_wv (np.array): Wavelengths of the vertices.
+            ref_sorter (np.array, optional): Stable argsort of ref. Defaults to None.
+
+        Returns:
+            indices (list): Pixel indices of the vertices.
+        """
+        if ref_sorter is None:
+            ref_sorter = np.argsort(ref, kind='stable')
+        return list(ref_sorter[np.searchsorted(ref, vertex_wv, sorter=ref_sorter)])
+
+    def alpha_hull_upper(self, x, y, radius):
+        """Finds the vertices of the upper boundary of the alpha shape of a spectrum.
+
+        A disc of the given radius is rolled over the top of the points, from the first to the last point.
+        The points it touches are the vertices of the upper boundary of the alpha shape. Where the gap to
+        the next point is larger than the diameter of the disc, the disc drops onto the next point.
+
+        Args:
+            x (np.array): Wavelength data, sorted in increasing order.
+            y (np.array): Scaled intensity data.
+            radius (float): Radius of the disc (alpha).
+
+        Returns:
+            vertices (np.array): Indices of the vertices, in increasing order.
+        """
+        n = len(x)
+        vertices = [0]
+        i = 0
+        while i < n-1:
+            last = np.searchsorted(x, x[i]+2*radius, side='left')
+            dx = x[i+1:last]-x[i]
+            dy = y[i+1:last]-y[i]
+            d = np.hypot(dx, dy)
+            reach = np.flatnonzero((d < 2*radius) & (d > 0))
+            if len(reach) == 0:
+                i += 1
+            else:
+                # angle of the centre of the disc, seen from the current vertex, when the disc touches each
+                # point; rolling clockwise, the disc first touches the point with the largest angle
+                angle = np.arctan2(dy[reach], dx[reach])+np.arccos(d[reach]/(2*radius))
+                i += 1+reach[len(reach)-1-np.argmax(angle[::-1])]
+            vertices.append(i)
+        return np.array(vertices)
+
+    def fast_AFS(self, wv, intens, q=0.95):
+        """Alpha-shape fitting to spectrum without building the alpha shape polygon.
+
+        Same steps as AFS(), but the upper boundary of the alpha shape is found by alpha_hull_upper() on
+        the wavelength-sorted arrays, and the interpolation and the selection of the upper q quantile in
+        each window between the vertices work on numpy arrays.
+
+        Args:
+            wv (np.array): Wavelength data of the order.
+            intens (np.array): Flux data of the order.
+            q (float, optional): Refers to upper q quantile within each window to be used
+                to fit a local polynomial model. Defaults to 0.95.
+
+        Returns:
+            intens/y_final (np.array): Normalized flux data.
+            y_final (np.array): Smoothed/alpha-shape-fitted flux data, in the scaled units of AFS().
+        """
+        sorter = np.argsort(wv, kind='stable')
+        x = np.asarray(wv, dtype=float)[sorter]
+        y = np.asarray(intens, dtype=float)[sorter]
+
+        # Scale the intensity and set alpha as in AFS()
+        y = y*(x[-1]-x[0])/10/np.max(y)
+        alpha = (x[-1]-x[0])/self.a
+
+        Wa = self.alpha_hull_upper(x, y, alpha)
+
+        # tilde(AS_alpha) and the local polynomial on it
+        B1 = self.lowess_ag(x, np.interp(x, x[Wa], y[Wa]))
+        select = y/B1
+
+        # upper q quantile of each window between neighbouring vertices
+        index = [select[a:b+1] >= np.quantile(select[a:b+1], q) for a, b in zip(Wa[:-1], Wa[1:])]
+        index = np.unique(np.concatenate([np.flatnonzero(keep)+a for keep, a in zip(index, Wa[:-1])]))
+
+        y_final = self.lowess_ag(x[index], y[index])
+        y_final = InterpolatedUnivariateSpline(x[index], y_final, k=2)(x)
+
+        fit = np.empty_like(y_final)
+        fit[sorter] = y_final
+        scaled = np.empty_like(y)
+        scaled[sorter] = y
+        return scaled/fit, fit
+
     def continuum_combined(self, wav, data, normalized, weight = None, mask_array = None, continuum_guess = None):
         """Runs continuum normalization according to specified method.
 
@@ -376,9 +513,12 @@ class ContNormAlgg:
                 weight[i,bad[0]] = np.nan
                 normalized[i,:],trend = self.flatspec(wav[i,:],data[i,:],weight[i,:])
 
-            if self.method == 'AFS':
-                dataframe = pd.DataFrame({'wav': np.array(wav[i,good],'d'), 'flux': np.array(data[i,good],'d')}, columns=['wav','flux'])
-                normalized[i,good],trend_= self.AFS(dataframe)
+            if self.method == 'AFS' or self.method == 'FastAFS':
+                if self.method == 'FastAFS':
+                    normalized[i,good],trend_= self.fast_AFS(wav[i,good],data[i,good])
+                else:
+                    dataframe = pd.DataFrame({'wav': np.array(wav[i,good],'d'), 'flux': np.array(data[i,good],'d')}, columns=['wav','flux'])
+                    normalized[i,good],trend_= self.AFS(dataframe)
                 trend_ =trend_ /np.max(trend_)*np.percentile(data[i,good],self.ffrac*100)
                 trend = np.zeros_like(normalized[i,:])
                 trend[good] = trend_
@@ -164,7 +164,7 @@ class MasterArclampFramework(KPF0_Primitive):
         exp_time_list = []
         arclamp_object_list = []
         for arclamp_file_path in (all_arclamp_files):
-            arclamp_file = KPF0.from_fits(arclamp_file_path,self.data_type)
+            arclamp_file = KPF0.from_fits(arclamp_file_path,self.data_type,lazy=True)
             mjd_obs = float(arclamp_file.header['PRIMARY']['MJD-OBS'])
             mjd_obs_list.append(mjd_obs)
             exp_time = float(arclamp_file.header['PRIMARY']['ELAPSED'])
@@ -209,7 +209,7 @@ class MasterArclampFramework(KPF0_Primitive):
                     continue
 
                 path = all_arclamp_files[i]
-                obj = KPF0.from_fits(path)
+                obj = KPF0.from_fits(path,lazy=True)
                 np_obj_ffi = np.array(obj[ffi])
                 np_obj_ffi_shape = np.shape(np_obj_ffi)
                 n_dims = len(np_obj_ffi_shape)
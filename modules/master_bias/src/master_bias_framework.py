@@ -1,4 +1,6 @@
 import numpy as np
+import configparser as cp
+from astropy.io import fits
 from datetime import datetime, timezone
 
 from modules.Utils.kpf_fits import FitsHeaders
@@ -43,6 +45,7 @@ class MasterBiasFramework(KPF0_Primitive):
         imtype_values_str (str): Values of FITS keyword (fixed as ['Bias','autocal-bias']).
         config_path (str): Location of default config file (modules/master_bias/configs/default.cfg)
         logger (object): Log messages written to log_path specified in default config file.
+        max_stack_ram_mb (float): Approximate peak RAM in MB for frame stacking (default = None for no limit).
     """
 
     def __init__(self, action, context):
@@ -78,6 +81,19 @@ class MasterBiasFramework(KPF0_Primitive):
         self.logger.info('Started {}'.format(self.__class__.__name__))
         self.logger.debug('config_path = {}'.format(self.config_path))
 
+        module_config_obj = cp.ConfigParser()
+        res = module_config_obj.read(self.config_path)
+        if res == []:
+            raise IOError('failed to read {}'.format(self.config_path))
+
+        self.max_stack_ram_mb = None
+        if module_config_obj.has_section('PARAM'):
+            max_stack_ram_mb = float(module_config_obj['PARAM'].get('max_stack_ram_mb', 0.0))
+            if max_stack_ram_mb > 0.0:
+                self.max_stack_ram_mb = max_stack_ram_mb
+
+        self.logger.info('self.max_stack_ram_mb = {}'.format(self.max_stack_ram_mb))
+
 
     def _perform(self):
 
@@ -98,7 +114,7 @@ class MasterBiasFramework(KPF0_Primitive):
         mjd_obs_list = []
         bias_object_list = []
         for bias_file_path in (all_bias_files):
-            bias_file = KPF0.from_fits(bias_file_path,self.data_type)
+            bias_file = KPF0.from_fits(bias_file_path,self.data_type,lazy=True)
             mjd_obs = float(bias_file.header['PRIMARY']['MJD-OBS'])
             mjd_obs_list.append(mjd_obs)
             header_object = bias_file.header['PRIMARY']['OBJECT']
@@ -119,6 +135,7 @@ class MasterBiasFramework(KPF0_Primitive):
             keep_ffi = 0
 
             frames_data = []
+            frames_data_hdul = []
             frames_data_mjdobs = []
             frames_data_path = []
             n_all_bias_files = len(all_bias_files)
@@ -131,30 +148,38 @@ class MasterBiasFramework(KPF0_Primitive):
                     #self.logger.debug('---->ffi,header_object,self.bias_object = {},{},{}'.format(ffi,header_object,self.bias_object))
                     continue
 
+                # Open the FITS file memory-mapped and keep only a section of the extension,
+                # so that FrameStacker reads the image rows it needs band by band.
+
                 path = all_bias_files[i]
-                obj = KPF0.from_fits(path)
-                np_obj_ffi = np.array(obj[ffi])
-                np_obj_ffi_shape = np.shape(np_obj_ffi)
-                n_dims = len(np_obj_ffi_shape)
+                hdul = fits.open(path,memmap=True)
+                n_dims = 0
+                if ffi in hdul and hdul[ffi].is_image:
+                    n_dims = hdul[ffi].header['NAXIS']
                 self.logger.debug('path,ffi,n_dims = {},{},{}'.format(path,ffi,n_dims))
                 if n_dims == 2:       # Check if valid data extension
                     keep_ffi = 1
-                    frames_data.append(obj[ffi])
+                    frames_data.append(hdul[ffi].section)
+                    frames_data_hdul.append(hdul)
                     frames_data_mjdobs.append(mjd_obs)
                     frames_data_path.append(path)
+                else:
+                    hdul.close()
 
             if keep_ffi == 0:
                 self.logger.debug('ffi,keep_ffi = {},{}'.format(ffi,keep_ffi))
                 del_ext_list.append(ffi)
                 break
 
-            n_frames = (np.shape(frames_data))[0]
+            n_frames = len(frames_data)
             self.logger.debug('Number of frames in stack = {}'.format(n_frames))
 
             # Exit without making product if headers of FITS files in input list do not contain specified OBJECT,
             # or the number of frames to stack is less than 2.  In either case, exit_code=7 is returned.
 
             if n_frames < 2:
+                for hdul in frames_data_hdul:
+                    hdul.close()
                 master_bias_exit_code = 7
                 exit_list = [master_bias_exit_code,master_bias_infobits]
                 return Arguments(exit_list)
@@ -167,10 +192,13 @@ class MasterBiasFramework(KPF0_Primitive):
             # Stack the frames.
             #
 
-            frames_data = np.array(frames_data)
-            fs = FrameStacker(frames_data,self.n_sigma)
+            fs = FrameStacker(frames_data,self.n_sigma,max_ram_mb=self.max_stack_ram_mb)
             avg,var,cnt,unc = fs.compute()
 
+            del frames_data
+            for hdul in frames_data_hdul:
+                hdul.close()
+
             ### kpf master file creation ###
             master_holder[ffi] = avg
 
@@ -87,6 +87,7 @@ class MasterDarkFramework(KPF0_Primitive):
         module_config_path (str): Location of default config file (modules/master_dark/configs/default.cfg)
         logger (object): Log messages written to log_path specified in default config file.
         exptime_minimum (float): Minimum EXPTIME of darks to use in computing master dark (default = 300.0 seconds)
+        max_stack_ram_mb (float): Approximate peak RAM in MB for frame stacking (default = None for no limit)
 
     """
 
@@ -133,7 +134,11 @@ class MasterDarkFramework(KPF0_Primitive):
 
         self.exptime_minimum = float(module_param_cfg.get('exptime_minimum', 300.0))
 
+        max_stack_ram_mb = float(module_param_cfg.get('max_stack_ram_mb', 0.0))
+        self.max_stack_ram_mb = max_stack_ram_mb if max_stack_ram_mb > 0.0 else None
+
         self.logger.info('self.exptime_minimum = {}'.format(self.exptime_minimum))
+        self.logger.info('self.max_stack_ram_mb = {}'.format(self.max_stack_ram_mb))
 
     def _perform(self):
 
@@ -163,7 +168,7 @@ class MasterDarkFramework(KPF0_Primitive):
         exp_time_list = []
         dark_object_list = []
         for dark_file_path in (all_dark_files):
-            dark_file = KPF0.from_fits(dark_file_path,self.data_type)
+            dark_file = KPF0.from_fits(dark_file_path,self.data_type,lazy=True)
             mjd_obs = float(dark_file.header['PRIMARY']['MJD-OBS'])
             mjd_obs_list.append(mjd_obs)
             exp_time = float(dark_file.header['PRIMARY']['ELAPSED'])
@@ -206,7 +211,7 @@ class MasterDarkFramework(KPF0_Primitive):
                     continue
 
                 path = all_dark_files[i]
-                obj = KPF0.from_fits(path)
+                obj = KPF0.from_fits(path,lazy=True)
                 np_obj_ffi = np.array(obj[ffi])
                 np_obj_ffi_shape = np.shape(np_obj_ffi)
                 n_dims = len(np_obj_ffi_shape)
@@ -268,7 +273,7 @@ class MasterDarkFramework(KPF0_Primitive):
 
             normalized_frames_data = np.array(normalized_frames_data)
 
-            fs = FrameStacker(normalized_frames_data,self.n_sigma,self.logger)
+            fs = FrameStacker(normalized_frames_data,self.n_sigma,self.logger,max_ram_mb=self.max_stack_ram_mb)
             stack_avg,stack_var,cnt,stack_unc = fs.compute()
 
             # Already normalized by exposure time.
@@ -89,6 +89,7 @@ class MasterFlatFramework(KPF0_Primitive):
         logger (object): Log messages written to log_path specified in default config file.
         gaussian_filter_sigma (float): 2-D Gaussian-blur sigma for smooth lamp pattern calculation (default = 2.0 pixels)
         low_light_limit = Low-light limit where flat is set to unity (default = 500.0 DN/sec)
+        max_stack_ram_mb (float): Approximate peak RAM in MB for frame stacking (default = None for no limit)
 
     Outputs:
         Full-frame-image FITS extensions in output master flat:
@@ -152,12 +153,15 @@ class MasterFlatFramework(KPF0_Primitive):
         self.green_ccd_flat_exptime_maximum = float(module_param_cfg.get('green_ccd_flat_exptime_maximum', 2.0))
         self.red_ccd_flat_exptime_maximum = float(module_param_cfg.get('red_ccd_flat_exptime_maximum', 1.0))
         self.ca_hk_flat_exptime_maximum = float(module_param_cfg.get('ca_hk_flat_exptime_maximum', 1.0))
+        max_stack_ram_mb = float(module_param_cfg.get('max_stack_ram_mb', 0.0))
+        self.max_stack_ram_mb = max_stack_ram_mb if max_stack_ram_mb > 0.0 else None
 
         self.logger.info('self.gaussian_filter_sigma = {}'.format(self.gaussian_filter_sigma))
         self.logger.info('self.low_light_limit = {}'.format(self.low_light_limit))
         self.logger.info('self.green_ccd_flat_exptime_maximum = {}'.format(self.green_ccd_flat_exptime_maximum))
         self.logger.info('self.red_ccd_flat_exptime_maximum = {}'.format(self.red_ccd_flat_exptime_maximum))
         self.logger.info('self.ca_hk_flat_exptime_maximum = {}'.format(self.ca_hk_flat_exptime_maximum))
+        self.logger.info('self.max_stack_ram_mb = {}'.format(self.max_stack_ram_mb))
 
     def _perform(self):
 
@@ -168,9 +172,9 @@ class MasterFlatFramework(KPF0_Primitive):
 
         # smooth_lamp_pattern_path = "/code/KPF-Pipeline/static/kpf_smooth_lamp.fits"
         smooth_lamp_pattern_path = "/data/reference_fits/kpf_20230628_smooth_lamp_made20230720_float32.fits"
-        smooth_lamp_pattern_data = KPF0.from_fits(smooth_lamp_pattern_path,self.data_type)
+        smooth_lamp_pattern_data = KPF0.from_fits(smooth_lamp_pattern_path,self.data_type,cache=True)
 
-        order_mask_data = KPF0.from_fits(self.ordermask_path,self.data_type)
+        order_mask_data = KPF0.from_fits(self.ordermask_path,self.data_type,cache=True)
         self.logger.debug('Finished loading order-mask data from FITS file = {}'.format(self.ordermask_path))
 
         masterbias_path_exists = exists(self.masterbias_path)
@@ -185,8 +189,8 @@ class MasterFlatFramework(KPF0_Primitive):
         self.logger.info('self.masterdark_path = {}'.format(self.masterdark_path))
         self.logger.info('masterdark_path_exists = {}'.format(masterdark_path_exists))
 
-        master_bias_data = KPF0.from_fits(self.masterbias_path,self.data_type)
-        master_dark_data = KPF0.from_fits(self.masterdark_path,self.data_type)
+        master_bias_data = KPF0.from_fits(self.masterbias_path,self.data_type,cache=True)
+        master_dark_data = KPF0.from_fits(self.masterdark_path,self.data_type,cache=True)
 
         master_flat_exit_code = 0
         master_flat_infobits = 0
@@ -199,7 +203,7 @@ class MasterFlatFramework(KPF0_Primitive):
         mjd_obs_list = []
         exp_time_list = []
         for flat_file_path in (all_flat_files):
-            flat_file = KPF0.from_fits(flat_file_path,self.data_type)
+            flat_file = KPF0.from_fits(flat_file_path,self.data_type,lazy=True)
             mjd_obs = float(flat_file.header['PRIMARY']['MJD-OBS'])
             mjd_obs_list.append(mjd_obs)
             exp_time = float(flat_file.header['PRIMARY']['EXPTIME'])
@@ -245,7 +249,7 @@ class MasterFlatFramework(KPF0_Primitive):
                     continue
 
                 path = all_flat_files[i]
-                obj = KPF0.from_fits(path)
+                obj = KPF0.from_fits(path,lazy=True)
                 np_obj_ffi = np.array(obj[ffi])
                 np_obj_ffi_shape = np.shape(np_obj_ffi)
                 n_dims = len(np_obj_ffi_shape)
@@ -302,7 +306,7 @@ class MasterFlatFramework(KPF0_Primitive):
 
             normalized_frames_data = np.array(normalized_frames_data)
 
-            fs = FrameStacker(normalized_frames_data,self.n_sigma,self.logger)
+            fs = FrameStacker(normalized_frames_data,self.n_sigma,self.logger,max_ram_mb=self.max_stack_ram_mb)
             stack_avg,stack_var,cnt,stack_unc = fs.compute()
 
             # Divide by the smoothed Flatlamp pattern.
@@ -90,7 +90,7 @@ class MasterLFCFramework(KPF0_Primitive):
 
         mjd_obs_list = []
         for lfc_file_path in (all_lfc_files):
-            lfc_file = KPF0.from_fits(lfc_file_path,self.data_type)
+            lfc_file = KPF0.from_fits(lfc_file_path,self.data_type,lazy=True)
             mjd_obs = lfc_file.header['PRIMARY']['MJD-OBS']
             mjd_obs_list.append(mjd_obs)
 
@@ -103,7 +103,7 @@ class MasterLFCFramework(KPF0_Primitive):
         for ffi in self.lev0_ffi_exts:
             frames_data=[]
             for path in all_lfc_files:
-                obj = KPF0.from_fits(path)
+                obj = KPF0.from_fits(path,lazy=True)
                 exp = obj.header['PRIMARY']['ELAPSED']
                 frames_data.append(obj[ffi] / exp)
             frames_data = np.array(frames_data)
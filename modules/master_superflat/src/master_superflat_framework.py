@@ -188,7 +188,7 @@ class MasterSuperFlatFramework(KPF0_Primitive):
         mjd_obs_list = []
         exp_time_list = []
         for flat_file_path in (all_flat_files):
-            flat_file = KPF0.from_fits(flat_file_path,self.data_type)
+            flat_file = KPF0.from_fits(flat_file_path,self.data_type,lazy=True)
             mjd_obs = float(flat_file.header['PRIMARY']['MJD-OBS'])
             mjd_obs_list.append(mjd_obs)
             exp_time = float(flat_file.header['PRIMARY']['ELAPSED'])
@@ -234,7 +234,7 @@ class MasterSuperFlatFramework(KPF0_Primitive):
                     continue
 
                 path = all_flat_files[i]
-                obj = KPF0.from_fits(path)
+                obj = KPF0.from_fits(path,lazy=True)
                 np_obj_ffi = np.array(obj[ffi])
                 np_obj_ffi_shape = np.shape(np_obj_ffi)
                 n_dims = len(np_obj_ffi_shape)
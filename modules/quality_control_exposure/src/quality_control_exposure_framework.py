@@ -4,11 +4,12 @@ import configparser as cp
 from datetime import datetime, timezone
 import psycopg2
 import re
-import hashlib
 import ast
 
 # Pipeline dependencies
 from kpfpipe.logger import *
+from kpfpipe.tools.checksum_tools import md5_file
+from kpfpipe.tools.db_tools import db_connection, get_db_version, get_l0_infobit_params, queue_db_insert
 from kpfpipe.models.level0 import KPF0
 from kpfpipe.primitives.level0 import KPF0_Primitive
 from kpfpipe.pipelines.fits_primitives import to_fits
@@ -18,13 +19,8 @@ from keckdrpframework.models.arguments import Arguments
 DEFAULT_CFG_PATH = 'modules/quality_control_exposure/configs/default.cfg'
 
 def md5(fname):
-    hash_md5 = hashlib.md5()
-
     try:
-        with open(fname, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        return md5_file(fname)
     except:
         print("*** Error: Cannot open file =",fname,"; quitting...")
         exit(65)
@@ -98,6 +94,8 @@ class QualityControlExposureFramework(KPF0_Primitive):
         product_level_cfg_str = module_param_cfg.get('product_level')
         self.product_level_cfg = ast.literal_eval(product_level_cfg_str)
 
+        self.insert_batch_size = int(module_param_cfg.get('insert_batch_size', 1))
+
         self.logger.info('self.data_type = {}'.format(self.data_type))
         self.logger.info('self.l0_filename = {}'.format(self.l0_filename))
 
@@ -105,13 +103,14 @@ class QualityControlExposureFramework(KPF0_Primitive):
 
         self.logger.info('Type of self.product_level_cfg = {}'.format(type(self.product_level_cfg)))
 
+        self.logger.info('self.insert_batch_size = {}'.format(self.insert_batch_size))
+
 
     def _perform(self):
 
         """
         Returns exitcode:
             0 = Normal
-            2 = Exception raised closing database connection
            64 = Cannot connect to database
            65 = Input file does not exist
            66 = Could not insert database record
@@ -140,65 +139,19 @@ class QualityControlExposureFramework(KPF0_Primitive):
         #self.logger.info('filename_date_num = {}'.format(filename_date_num))
 
 
-        # Get database connection parameters from environment.
-
-        dbport = os.getenv('DBPORT')
-        dbname = os.getenv('DBNAME')
-        dbuser = os.getenv('DBUSER')
-        dbpass = os.getenv('DBPASS')
-        dbserver = os.getenv('DBSERVER')
-
-
-        # Connect to database
+        # Get parameters for infobits, with a pooled database connection.
+        # The parameters are read in one query and cached by the process for the next L0 files.
 
         try:
-            conn = psycopg2.connect(host=dbserver,database=dbname,port=dbport,user=dbuser,password=dbpass)
-        except:
+            with db_connection() as conn:
+                db_version = get_db_version(conn)
+                #self.logger.info('PostgreSQL database version = {}'.format(db_version))
+                p1_bits, p2_bits = get_l0_infobit_params(conn)
+        except psycopg2.OperationalError:
             self.logger.info('Could not connect to database...')
             quality_control_exposure_exit_code = 64
             return Arguments(quality_control_exposure_exit_code)
 
-        # Open database cursor.
-
-        cur = conn.cursor()
-
-
-        # Select database version.
-
-        q1 = 'SELECT version();'
-        #self.logger.info('q1 = {}'.format(q1))
-        cur.execute(q1)
-        db_version = cur.fetchone()
-        #self.logger.info('PostgreSQL database version = {}'.format(db_version))
-
-
-        # Check database current_user.
-
-        q2 = 'SELECT current_user;'
-        #self.logger.info('q2 = {}'.format(q2))
-        cur.execute(q2)
-        for record in cur:
-            #self.logger.info('record = {}'.format(record))
-            pass
-
-
-        # Get parameters for infobits.
-
-        p1_bits = []
-        p2_bits = []
-
-        for i in range(0, 14):
-            bit = i
-
-            q_bit = 'SELECT param1, param2 from l0infobits where bit = ' + str(bit) + ' order by created desc limit 1;'
-            #self.logger.info('q_bit = {}'.format(q_bit))
-            cur.execute(q_bit)
-            record = cur.fetchone()
-
-            if record is not None:
-                p1_bits.append(record[0])
-                p2_bits.append(record[1])
-
 
         # Read image data object from FITS file.
 
@@ -628,32 +581,25 @@ class QualityControlExposureFramework(KPF0_Primitive):
 
         self.logger.info('query = {}'.format(query))
 
+        # Insert the record now, or queue it with the next ones when batched inserts are configured.
+        # Queued records are inserted once insert_batch_size of them are pending, or when the recipe finishes.
+
         try:
-            cur.execute(query)
-            rid = cur.fetchone()
-            self.logger.info('PostgreSQL database L0Image ID: rid = {}'.format(rid))
+            if self.insert_batch_size > 1:
+                n_inserted = queue_db_insert(query, self.insert_batch_size, self.logger)
+                self.logger.info('Queued record; number of records inserted = {}'.format(n_inserted))
+            else:
+                with db_connection() as conn:
+                    with conn.cursor() as cur:
+                        cur.execute(query)
+                        rid = cur.fetchone()
+                self.logger.info('PostgreSQL database L0Image ID: rid = {}'.format(rid))
 
         except (Exception, psycopg2.DatabaseError) as error:
             self.logger.info('*** Error inserting record ({}); skipping...'.format(error))
             quality_control_exposure_exit_code = 66
 
 
-        # Commit transaction.
-
-        conn.commit()
-
-
-        # Close database cursor and then connection.
-
-        try:
-            cur.close()
-        except (Exception, psycopg2.DatabaseError) as error:
-            self.logger.info('*** Error closing database connection ({}); skipping...'.format(error))
-            quality_control_exposure_exit_code = 2
-        finally:
-            if conn is not None:
-                conn.close()
-
         self.logger.info('Finished {}'.format(self.__class__.__name__))
 
         return Arguments(quality_control_exposure_exit_code)
@@ -33,7 +33,7 @@ class RadialVelocityAlg(RadialVelocityBase):
         wave_cal (numpy.ndarray): Wavelength calibration for each order of `spectrum_data`.
         config (configparser.ConfigParser): Config context.
         logger (logging.Logger): Instance of logging.Logger.
-        ccf_engine (string): CCF engine to use, 'c' or 'python'. Defaults to None,
+        ccf_engine (string): CCF engine to use, 'c', 'python' or 'numpy'. Defaults to None,
         reweighting_method (string): reweighting method, ccf_max or ccf_mean, of ccf_steps. Defaults to None.
         segment_limits (pandas.DataFrame): Table containing segment list containing segment index, start wavelength,
             and end wavelength. Defaults to None.
@@ -83,6 +83,7 @@ class RadialVelocityAlg(RadialVelocityBase):
     SEGMENT_W2 = 4
     SEGMENT_ORD = 5
     CCF_Methods = ['ccf_max', 'ccf_mean', 'ccf_static', 'ccf_steps']
+    CCF_Engines = ['c', 'python', 'numpy']
     s_range = abs(RadialVelocityAlgInit.non_espresso_vel_range[0])/2.0
     vel_range_per_mask = {'lfc': s_range, 'thar': s_range, 'etalon': s_range}
 
@@ -132,7 +133,7 @@ class RadialVelocityAlg(RadialVelocityBase):
         self.reweighting_ccf_method = init_data[RadialVelocityAlgInit.REWEIGHTING_CCF] \
             if reweighting_method is None or not self.is_good_reweighting_method(reweighting_method) \
             else reweighting_method
-        self.ccf_code = ccf_engine if (ccf_engine and ccf_engine in ['c', 'python']) else \
+        self.ccf_code = ccf_engine if (ccf_engine and ccf_engine in self.CCF_Engines) else \
             init_data[RadialVelocityAlgInit.CCF_CODE]
 
         if self.spectrum_data is not None and self.spectrum_data.size != 0:
@@ -542,6 +543,33 @@ class RadialVelocityAlg(RadialVelocityBase):
 
         """
 
+        pending_ccf, msg = self.submit_rv_on_spectrum(start_seg=start_seg, end_seg=end_seg)
+        if pending_ccf is None:
+            return None, msg
+
+        return self.collect_rv_on_spectrum(pending_ccf), ''
+
+    def submit_rv_on_spectrum(self, start_seg=None, end_seg=None, ccf_pool=None):
+        """Start the cross correlation of all segments.
+
+        The cross correlation of each segment is computed right away, or is submitted to `ccf_pool` to be computed
+        by a worker process. The result is collected by :func:`~alg.RadialVelocityAlg.collect_rv_on_spectrum()`.
+
+        Args:
+            start_seg (int, optional): First segment of the data to be processed. Defaults to None.
+            end_seg (int, optional): Last segment of the data to be processed. Defaults to None.
+            ccf_pool (RadialVelocityParallelCCF, optional): Process pool computing the cross correlation of
+                the segments. Defaults to None for computing in the current process.
+
+        Returns:
+            tuple: Pending cross correlation result and the error message,
+
+                * (*dict*): Pending result containing the cross correlation array, the futures of the segments
+                  submitted to `ccf_pool` and the redshift of all segments, or None in case of error.
+                * (*str*): Error message.
+
+        """
+
         obs_jd = self.get_obs_time()
         if obs_jd is None or not obs_jd:
             return None, 'observation jd time error'
@@ -576,6 +604,10 @@ class RadialVelocityAlg(RadialVelocityBase):
         result_ccf = np.zeros([total_seg + self.ROWS_FOR_ANALYSIS, self.velocity_steps])
         # result_ccf = np.zeros([(e_seg_idx - s_seg_idx + 1) + self.ROWS_FOR_ANALYSIS, self.velocity_steps])
         wavecal_all_orders = self.wavelength_calibration(spectrum_x)     # from s_order to e_order, s_x to e_x
+        futures = {}
+        if ccf_pool is not None:
+            shared_spectrum = ccf_pool.share_array(new_spectrum)
+            shared_wavecal = ccf_pool.share_array(wavecal_all_orders)
 
         seg_ary = np.arange(total_seg)[s_seg_idx:e_seg_idx+1]
         for idx, seg_idx in np.ndenumerate(seg_ary):
@@ -590,19 +622,62 @@ class RadialVelocityAlg(RadialVelocityBase):
             right_x = int(seg_limits[self.SEGMENT_X2])
 
             if np.any(wavecal != 0.0):
-                if wavecal[-1] < wavecal[0]:
-                    ordered_spec = self.fix_nan_spectrum(np.flip(new_spectrum[ord_idx][left_x:right_x]))   # check??
-                    ordered_wavecal = np.flip(wavecal[left_x:right_x])
-                else:
-                    ordered_spec = self.fix_nan_spectrum(new_spectrum[ord_idx][left_x:right_x])
-                    ordered_wavecal = wavecal[left_x:right_x]
                 zb = self.get_redshift(seg=seg_idx)
-                result_ccf[seg_idx, :] = \
+                if ccf_pool is not None:
+                    futures[seg_idx] = ccf_pool.submit(self.orderletname, shared_spectrum, shared_wavecal,
+                                                       ord_idx, left_x, right_x, zb)
+                else:
+                    ordered_spec, ordered_wavecal = \
+                        self.order_segment_data(new_spectrum[ord_idx], wavecal, left_x, right_x)
+                    result_ccf[seg_idx, :] = \
                         self.cross_correlate_by_mask_shift(ordered_wavecal, ordered_spec, zb)
             else:
                 self.d_print("RadialVelocityAlg: all wavelength zero")
+
+        return {'ccf': result_ccf, 'futures': futures, 'zb': self.zb}, ''
+
+    def collect_rv_on_spectrum(self, pending_ccf):
+        """Collect the cross correlation of all segments started by
+        :func:`~alg.RadialVelocityAlg.submit_rv_on_spectrum()`.
+
+        Args:
+            pending_ccf (dict): Pending result from :func:`~alg.RadialVelocityAlg.submit_rv_on_spectrum()`.
+
+        Returns:
+            numpy.ndarray: 2D array containing the cross correlation result of all orders at each velocity step.
+            Please refer to `Returns` of :func:`~alg.RadialVelocityAlg.get_rv_on_spectrum()`.
+
+        """
+
+        result_ccf = pending_ccf['ccf']
+        for seg_idx, future in pending_ccf['futures'].items():
+            result_ccf[seg_idx, :] = future.result()
+        self.zb = pending_ccf['zb']
         result_ccf[~np.isfinite(result_ccf)] = 0.
-        return result_ccf, ''
+        return result_ccf
+
+    @staticmethod
+    def order_segment_data(spectrum, wavecal, left_x, right_x):
+        """Get the spectrum and wavelength calibration of one segment in the order of increasing wavelength.
+
+        Args:
+            spectrum (numpy.ndarray): Spectrum of the order containing the segment.
+            wavecal (numpy.ndarray): Wavelength calibration of the order containing the segment.
+            left_x (int): Left limit of the segment.
+            right_x (int): Right limit of the segment.
+
+        Returns:
+            tuple: Spectrum with fixed NaN values and wavelength calibration of the segment.
+
+        """
+
+        if wavecal[-1] < wavecal[0]:
+            ordered_spec = RadialVelocityAlg.fix_nan_spectrum(np.flip(spectrum[left_x:right_x]))   # check??
+            ordered_wavecal = np.flip(wavecal[left_x:right_x])
+        else:
+            ordered_spec = RadialVelocityAlg.fix_nan_spectrum(spectrum[left_x:right_x])
+            ordered_wavecal = wavecal[left_x:right_x]
+        return ordered_spec, ordered_wavecal
 
     @staticmethod
     def fix_nan_spectrum(spec_vals):
@@ -768,23 +843,29 @@ class RadialVelocityAlg(RadialVelocityBase):
 
         # shift_lines_by = (1.0 + (self.velocity_loop / LIGHT_SPEED)) / (1.0 + zb)  # Shifting mask in redshift space
         if self.ccf_code == 'c':
-            # ccf_pixels_c = np.zeros([v_steps, n_pixel])
-
-            for c in range(v_steps):
-                # add one pixel before and after the original array in order to uniform the calculation between c code
-                # and python code
-                new_wave_cal = np.pad(wave_cal, (1, 1), 'constant')
-                new_wave_cal[0] = 2 * wave_cal[0] - wave_cal[1]     # w[0] - (w[1]-w[0])
-                new_wave_cal[-1] = 2 * wave_cal[-1] - wave_cal[-2]  # w[n-1] + (w[n-1] - w[n-2])
-
-                new_spec = np.pad(spectrum, (1, 1), 'constant')
-                new_spec[1:n_pixel+1] = spectrum
-                sn = np.ones(n_pixel+2)
-
-                ccf[c] = CCF_3d_cpython.calc_ccf(new_line_start.astype('float64'), new_line_end.astype('float64'),
-                                                 new_wave_cal.astype('float64'), new_spec.astype('float64'),
-                                                 new_line_weight.astype('float64'), sn.astype('float64'),
-                                                 self.velocity_loop[c], -v_b)
+            # add one pixel before and after the original array in order to uniform the calculation between c code
+            # and python code
+            new_wave_cal = np.pad(wave_cal, (1, 1), 'constant').astype('float64')
+            new_wave_cal[0] = 2 * wave_cal[0] - wave_cal[1]     # w[0] - (w[1]-w[0])
+            new_wave_cal[-1] = 2 * wave_cal[-1] - wave_cal[-2]  # w[n-1] + (w[n-1] - w[n-2])
+
+            new_spec = np.pad(spectrum, (1, 1), 'constant').astype('float64')
+            sn = np.ones(n_pixel+2)
+
+            # all velocity steps in one call to the c code
+            ccf = CCF_3d_cpython.calc_ccf_steps(np.ascontiguousarray(new_line_start, dtype='float64'),
+                                                np.ascontiguousarray(new_line_end, dtype='float64'),
+                                                new_wave_cal, new_spec,
+                                                np.ascontiguousarray(new_line_weight, dtype='float64'), sn,
+                                                self.velocity_loop, -v_b)
+        elif self.ccf_code == 'numpy':
+            sn_p = np.ones(n_pixel)
+            ccf, ccf_pixels_numpy = self.calc_ccf_vectorized(v_steps, new_line_start.astype('float64'),
+                                                             new_line_end.astype('float64'),
+                                                             x_pixel_wave.astype('float64'),
+                                                             spectrum.astype('float64'),
+                                                             new_line_weight.astype('float64'),
+                                                             sn_p, -z_b)
         else:
             sn_p = np.ones(n_pixel)
             ccf, ccf_pixels_python = self.calc_ccf(v_steps, new_line_start.astype('float64'),
@@ -889,6 +970,78 @@ class RadialVelocityAlg(RadialVelocityBase):
             ccf[c] = np.nansum(ccf_pixels[c, :])
         return ccf, ccf_pixels
 
+    def calc_ccf_vectorized(self, v_steps, new_line_start, new_line_end, x_pixel_wave, spectrum, new_line_weight,
+                            sn, zb):
+        """ Cross correlation by the shifted mask line and the spectrum data of one order for all velocity steps.
+
+        This is the vectorized version of :func:`~alg.RadialVelocityAlg.calc_ccf()`. The mask lines shifted to all
+        velocity steps are located on the sorted pixel edges by `numpy.searchsorted` and the overlap fraction of
+        every (velocity step, mask line, pixel) triple is computed in one batch, so the result is the same as that of
+        `calc_ccf` up to float round-off.
+
+        Args:
+            v_steps (int): Total velocity steps.
+            new_line_start (numpy.ndarray): Start of the mask line.
+            new_line_end (numpy.ndarray): End of the mask line.
+            x_pixel_wave (numpy.ndarray): Wavelength calibration of the pixel edges, in ascending order.
+            spectrum (numpy.ndarray): 1D Spectrum data.
+            new_line_weight (numpy.ndarray): Mask weight
+            sn (numpy.ndarray): Additional SNR scaling factor (comply with the implementation of CCF of C version)
+            zb (float): Redshift at the observation time.
+
+        Returns:
+            numpy.ndarray: ccf at velocity steps.
+            numpy.ndarray: Intermediate CCF numbers at pixels.
+        """
+
+        shift_lines_by = (1.0 + (self.velocity_loop / LIGHT_SPEED)) / (1.0 + zb)
+
+        n_pixel = np.shape(x_pixel_wave)[0] - 1
+        n_line_index = np.shape(new_line_start)[0]
+        x_pixel_wave_end = x_pixel_wave[1: n_pixel+1]
+        x_pixel_wave_start = x_pixel_wave[0: n_pixel]
+        ccf_pixels = np.zeros([v_steps, n_pixel])
+
+        # shifted mask lines for all velocity steps, [v_steps, n_line_index], in the same order as calc_ccf loops
+        line_doppler_shifted_start = (shift_lines_by[:, np.newaxis] * new_line_start[np.newaxis, :]).ravel()
+        line_doppler_shifted_end = (shift_lines_by[:, np.newaxis] * new_line_end[np.newaxis, :]).ravel()
+
+        # first pixel ending at or after line start, and first pixel starting after line end
+        closest_match = np.searchsorted(x_pixel_wave_end, line_doppler_shifted_start, side='left')
+        closest_match_next = np.searchsorted(x_pixel_wave_start, line_doppler_shifted_end, side='right')
+
+        # same line selection as calc_ccf, pix1 = 0, pix2 = n_pixel - 1
+        sel = np.where((closest_match_next > 0) & (closest_match < n_pixel - 1) &
+                       (closest_match_next > closest_match))[0]
+        n_covered = closest_match_next[sel] - closest_match[sel]
+        if np.size(sel) == 0:
+            return np.nansum(ccf_pixels, axis=1), ccf_pixels
+
+        # expand each (velocity step, line) to the pixels it covers
+        line_flat = np.repeat(sel, n_covered)
+        first_flat = np.cumsum(n_covered) - n_covered
+        pixel_idx = np.repeat(closest_match[sel], n_covered) + \
+            (np.arange(np.sum(n_covered)) - np.repeat(first_flat, n_covered))
+        v_idx = line_flat // n_line_index
+        line_idx = line_flat % n_line_index
+
+        wave_start = np.maximum(x_pixel_wave_start[pixel_idx], line_doppler_shifted_start[line_flat])
+        wave_end = np.minimum(x_pixel_wave_end[pixel_idx], line_doppler_shifted_end[line_flat])
+        mask_vals = new_line_weight[line_idx] * (wave_end - wave_start) / \
+            (x_pixel_wave_end[pixel_idx] - x_pixel_wave_start[pixel_idx])
+
+        # a later mask line overwrites the pixel value set by an earlier one as calc_ccf does
+        flat_pos = v_idx * n_pixel + pixel_idx
+        _, last_idx = np.unique(flat_pos[::-1], return_index=True)
+        last_idx = np.size(flat_pos) - 1 - last_idx
+        mask_spectra_doppler_shifted = np.zeros(v_steps * n_pixel)
+        mask_spectra_doppler_shifted[flat_pos[last_idx]] = mask_vals[last_idx]
+        mask_spectra_doppler_shifted = mask_spectra_doppler_shifted.reshape(v_steps, n_pixel)
+
+        ccf_pixels[:, :] = spectrum * mask_spectra_doppler_shifted * sn
+        ccf = np.nansum(ccf_pixels, axis=1)
+        return ccf, ccf_pixels
+
     def analyze_ccf(self, ccf, row_for_analysis=None):
         """Analyze cross correlation results.
 
@@ -1174,7 +1327,7 @@ class RadialVelocityAlg(RadialVelocityBase):
 
         return is_none
 
-    def compute_rv_by_cc(self, start_seg=None, end_seg=None, ref_ccf=None, print_progress=None):
+    def compute_rv_by_cc(self, start_seg=None, end_seg=None, ref_ccf=None, print_progress=None, pending_ccf=None):
         """Compute radial velocity by using cross correlation method.
 
         Compute and analyze radial velocity on level 1 data based on the specified pixel positions and the order range
@@ -1192,6 +1345,9 @@ class RadialVelocityAlg(RadialVelocityBase):
             print_progress (str, optional):  Print debug information to stdout if it is provided as empty string
                 or to a file path, `print_progress`,  if it is non empty string, or no print is made if it is None.
                 Defaults to None.
+            pending_ccf (dict, optional): Pending cross correlation result from
+                :func:`~alg.RadialVelocityAlg.submit_rv_on_spectrum()` on the same spectrum. Defaults to None,
+                meaning the cross correlation is computed by :func:`~alg.RadialVelocityAlg.get_rv_on_spectrum()`.
 
         Returns:
             dict: Instance containing cross correction results in type of numpy.ndarray and Pandas DataFrame, like::
@@ -1222,7 +1378,10 @@ class RadialVelocityAlg(RadialVelocityBase):
 
         self.get_segment_limits()
 
-        ccf, msg = self.get_rv_on_spectrum(start_seg=start_seg, end_seg=end_seg)
+        if pending_ccf is not None:
+            ccf, msg = self.collect_rv_on_spectrum(pending_ccf), ''
+        else:
+            ccf, msg = self.get_rv_on_spectrum(start_seg=start_seg, end_seg=end_seg)
         if ccf is None:
             return {'ccf_df': None, 'ccf_ary': None, 'jd': self.obs_jd, 'msg': msg}
 
@@ -499,7 +499,7 @@ class RadialVelocityAlgInit(RadialVelocityBase):
         """ Get the ccf code language
 
         Args:
-            default_code (str): Default ccf code language, 'python' or 'c'
+            default_code (str): Default ccf code language, 'python', 'numpy' or 'c'
 
         Returns:
             str: ccf code language
@@ -1,4 +1,5 @@
 import numpy as np
+from kpfpipe.tools.reference_cache import load_reference
 
 LIGHT_SPEED = 299792.458  # light speed in km/s
 
@@ -73,7 +74,9 @@ class RadialVelocityMaskLine:
 
         """
 
-        line_center, line_weight = np.loadtxt(mask_path, dtype=float, unpack=True)  # load mask file
+        line_center, line_weight = load_reference(mask_path,
+                                                  lambda f: np.loadtxt(f, dtype=float, unpack=True),
+                                                  kind='mask_line')  # load mask file
         if air_to_vacuum:
             line_center = RadialVelocityMaskLine.air_to_vac(line_center)
         line_mask_width = line_center * (mask_width / LIGHT_SPEED)
@@ -0,0 +1,188 @@
+import atexit
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, util
+import numpy as np
+
+from modules.radial_velocity.src.alg import RadialVelocityAlg
+
+# RadialVelocityAlg instance, attached shared memory blocks of each worker process and the generation of the
+# shared data they belong to
+_worker_alg = None
+_worker_shm = {}
+_worker_generation = None
+
+# Process pool kept by the process for the next calls, see RadialVelocityParallelCCF.get_pool()
+_ccf_pool = None
+
+
+def _close_attachments():
+    for name in list(_worker_shm):
+        try:
+            _worker_shm[name].close()
+        except BufferError:
+            # an array on the block is still alive, the block is closed when the process exits
+            continue
+        del _worker_shm[name]
+
+
+def _init_worker(init_rv, ccf_engine):
+    global _worker_alg, _worker_generation
+    _worker_alg = RadialVelocityAlg(None, {}, init_rv, ccf_engine=ccf_engine)
+    _worker_shm.clear()
+    _worker_generation = None
+    # pool workers run the multiprocessing finalizers at exit, not the atexit handlers
+    util.Finalize(None, _close_attachments, exitpriority=10)
+
+
+def _attach_array(shared):
+    name, shape, dtype = shared
+    if name not in _worker_shm:
+        if sys.version_info >= (3, 13):
+            _worker_shm[name] = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            _worker_shm[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=_worker_shm[name].buf)
+
+
+def _ccf_segment(generation, orderlet, shared_spectrum, shared_wavecal, ord_idx, left_x, right_x, zb):
+    global _worker_generation
+    if generation != _worker_generation:
+        # the blocks of the earlier generations are released by the parent process
+        _close_attachments()
+        _worker_generation = generation
+    spectrum = _attach_array(shared_spectrum)
+    wavecal = _attach_array(shared_wavecal)
+    _worker_alg.reset_spectrum(None, {}, None, orderlet=orderlet)
+    ordered_spec, ordered_wavecal = \
+        RadialVelocityAlg.order_segment_data(spectrum[ord_idx], wavecal[ord_idx], left_x, right_x)
+    return _worker_alg.cross_correlate_by_mask_shift(ordered_wavecal, ordered_spec, zb)
+
+
+def _close_ccf_pool():
+    if _ccf_pool is not None:
+        _ccf_pool.close()
+
+
+atexit.register(_close_ccf_pool)
+
+
+class RadialVelocityParallelCCF:
+    """Process pool for computing the cross correlation of segments and orderlets in parallel.
+
+    This module defines class 'RadialVelocityParallelCCF' which starts a pool of worker processes, each holding an
+    instance of `RadialVelocityAlg` built from the radial velocity init data. The spectrum and wavelength
+    calibration of each orderlet are copied to shared memory once, and the cross correlation of each segment is
+    submitted to the pool by :func:`~alg.RadialVelocityAlg.submit_rv_on_spectrum()`.
+
+    The shared memory of a call is released by :func:`release()`. The workers close their attachments to it when
+    they get the first segment of the next call, and when they exit.
+
+    Args:
+        init_rv (dict): A dict instance, created by ``RadialVelocityAlgInit``, containing the init values for
+            radial velocity computation.
+        n_workers (int): Total worker processes.
+        ccf_engine (str, optional): CCF engine to use, 'c', 'python' or 'numpy'. Defaults to None for the engine
+            defined in `init_rv`.
+
+    Attributes:
+        executor (concurrent.futures.ProcessPoolExecutor): Pool of worker processes.
+        init_rv (dict): Init values the workers are built from.
+        n_workers (int): Total worker processes.
+        ccf_engine (str): CCF engine of the workers.
+        shm_blocks (list): Shared memory blocks created for the spectrum data.
+        generation (int): Number of releases of the shared memory, sent with each segment.
+    """
+
+    def __init__(self, init_rv, n_workers, ccf_engine=None):
+        self.executor = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                            initargs=(init_rv, ccf_engine))
+        self.init_rv = init_rv
+        self.n_workers = n_workers
+        self.ccf_engine = ccf_engine
+        self.shm_blocks = []
+        self.generation = 0
+
+    @classmethod
+    def get_pool(cls, init_rv, n_workers, ccf_engine=None):
+        """Get the process pool of this process for the radial velocity init data.
+
+        The pool of the previous call is reused if it was started for the same init data object, number of
+        workers and CCF engine, e.g. for the CCDs of one L1 file. Otherwise it is shut down and a new pool is
+        started, since the workers hold a `RadialVelocityAlg` built from the init data. The pool is shut down
+        when the process exits.
+
+        Args:
+            init_rv (dict): A dict instance, created by ``RadialVelocityAlgInit``, containing the init values for
+                radial velocity computation.
+            n_workers (int): Total worker processes.
+            ccf_engine (str, optional): CCF engine to use. Defaults to None.
+
+        Returns:
+            RadialVelocityParallelCCF: Process pool, to be released by :func:`release()` after each call.
+
+        """
+        global _ccf_pool
+        if _ccf_pool is not None and _ccf_pool.init_rv is init_rv and _ccf_pool.n_workers == n_workers \
+                and _ccf_pool.ccf_engine == ccf_engine:
+            return _ccf_pool
+        _close_ccf_pool()
+        _ccf_pool = cls(init_rv, n_workers, ccf_engine=ccf_engine)
+        return _ccf_pool
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def share_array(self, data):
+        """Copy an array to shared memory.
+
+        Args:
+            data (numpy.ndarray): Array to be shared with the worker processes.
+
+        Returns:
+            tuple: Name of the shared memory block, shape and dtype of the array.
+
+        """
+        data = np.ascontiguousarray(data)
+        shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[...] = data
+        self.shm_blocks.append(shm)
+        return shm.name, data.shape, data.dtype.str
+
+    def submit(self, orderlet, shared_spectrum, shared_wavecal, ord_idx, left_x, right_x, zb):
+        """Submit the cross correlation of one segment.
+
+        Args:
+            orderlet (str): Name of the orderlet, used to select the mask line.
+            shared_spectrum (tuple): Shared spectrum of all orders from :func:`share_array()`.
+            shared_wavecal (tuple): Shared wavelength calibration of all orders from :func:`share_array()`.
+            ord_idx (int): Order index of the segment.
+            left_x (int): Left limit of the segment.
+            right_x (int): Right limit of the segment.
+            zb (float): BC velocity (m/sec) at the observation time.
+
+        Returns:
+            concurrent.futures.Future: Future of the cross correlation of the segment at all velocity steps.
+
+        """
+        return self.executor.submit(_ccf_segment, self.generation, orderlet, shared_spectrum, shared_wavecal,
+                                    ord_idx, left_x, right_x, zb)
+
+    def release(self):
+        """Release the shared memory of the submitted segments, once their results are collected."""
+        for shm in self.shm_blocks:
+            shm.close()
+            shm.unlink()
+        self.shm_blocks = []
+        self.generation += 1
+
+    def close(self):
+        """Shut down the worker processes and release the shared memory."""
+        global _ccf_pool
+        self.executor.shutdown(wait=True)
+        self.release()
+        if _ccf_pool is self:
+            _ccf_pool = None
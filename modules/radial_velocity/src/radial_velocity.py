@@ -40,7 +40,8 @@
                       Defaults to 0.
                     - `action.args['rv_correction_by_cal'] (bool)`: if using CAL fiber CCF to correct RV of SCI fiber.
                       Defaults to False.
-                    - `action.args['ccf_engine'] (str)`: using Python ('python') or C ('c') version CCF engine.
+                    - `action.args['ccf_engine'] (str)`: using Python ('python'), vectorized NumPy ('numpy') or C ('c')
+                      version CCF engine.
                       Defaults to 'c'.
                     - `action.args['rv_set'] (int)`: the index of ccd per ccd list that L1 data is associated with.
                       ex. 0 for 'GREEN_CCD' and 1 for 'RED_CCD' in terms of KPF. Defaults to 0.
@@ -85,7 +86,10 @@
                 - `is_solar_data (bool):` if the observation is for target solar.
                 - `ref_ccf (numpy.ndarray)`: Reference or ratio of cross correlation values for scaling the computation
                   of cross correlation, associated with `action.args['input_ref']`.
-                - `ccf_engine (str)`: ccf engine, 'python' or 'c', associated with `action.args['ccf_engine']`.
+                - `ccf_engine (str)`: ccf engine, 'python', 'numpy' or 'c', associated with `action.args['ccf_engine']`.
+                - `ccf_workers (int)`: total worker processes computing the ccf of all segments and orderlets in
+                  parallel, associated with `ccf_workers` in the config file. The ccf is computed serially if it is
+                  not greater than 1.
                 - `reweighted (dict)`: containing key/value as orderlet_name/'T' or 'F' to indicate if the orderlet is
                   CCF reweighted.
                 - `config_path (str)`: Path of config file for radial velocity.
@@ -150,6 +154,7 @@ from keckdrpframework.models.processing_context import ProcessingContext
 
 from modules.radial_velocity.src.alg import RadialVelocityAlg
 from modules.radial_velocity.src.alg_rv_init import RadialVelocityAlgInit
+from modules.radial_velocity.src.alg_rv_parallel import RadialVelocityParallelCCF
 from astropy.time import Time
 
 DEFAULT_CFG_PATH = 'modules/radial_velocity/configs/default.cfg'
@@ -167,7 +172,8 @@ class RadialVelocity(KPF1_Primitive):
         'obstime': None,
         'exptime': None,
         'bary_corr': 'BARY_CORR',
-        'start_bary_index': 0
+        'start_bary_index': 0,
+        'ccf_workers': 1
     }
 
     RV_COL_ORDERLET = 'orderlet'
@@ -278,6 +284,8 @@ class RadialVelocity(KPF1_Primitive):
             self.config_path = DEFAULT_CFG_PATH
 
         self.config.read(self.config_path)
+        self.ccf_workers = int(RadialVelocityAlg.get_config_value(self.config, self.ins, 'ccf_workers',
+                                                                  self.default_args_val['ccf_workers']))
 
         # start a logger
         self.logger = None
@@ -460,22 +468,32 @@ class RadialVelocity(KPF1_Primitive):
         output_df = {}
 
         if all( [s is not None and s.size != 0 for s in self.spectrum_data_set]):
-            for i in range(self.total_orderlet):
-                if i > 0:
-                    self.alg.reset_spectrum(self.spectrum_data_set[i], self.header_set[i], self.wave_cal_set[i],
-                                            orderlet=self.od_names[i])
-                if self.logger:
-                    self.logger.info('RadialVelocity: computing radial velocity on orderlet '+ self.od_names[i] + '...')
-
-                ratio_ccf = self.get_ratio_ccf(self.od_names[i])
-                self.reweighted[self.od_names[i]] = 'T' if ratio_ccf is not None else 'F'
-                rv_results = self.alg.compute_rv_by_cc(start_seg=self.start_seg, end_seg=self.end_seg, ref_ccf=ratio_ccf)
-                one_df = rv_results['ccf_df']
-                if one_df is None or one_df.empty or not one_df.values.any():
+            # the pool is kept for the next call with the same rv init data, e.g. on the other CCD
+            ccf_pool = RadialVelocityParallelCCF.get_pool(self.rv_init, self.ccf_workers, ccf_engine=self.ccf_engine) \
+                if self.ccf_workers > 1 else None
+            try:
+                pending_ccfs = self.submit_orderlets_ccf(ccf_pool) if ccf_pool is not None else {}
+                for i in range(self.total_orderlet):
+                    if i > 0 or ccf_pool is not None:
+                        self.alg.reset_spectrum(self.spectrum_data_set[i], self.header_set[i], self.wave_cal_set[i],
+                                                orderlet=self.od_names[i])
                     if self.logger:
-                        self.logger.info('RadialVelocity: orderlet ' + self.od_names[i] + ' message => ' +
-                                rv_results['msg'])
-                output_df[self.od_names[i]] = one_df
+                        self.logger.info('RadialVelocity: computing radial velocity on orderlet '+ self.od_names[i] + '...')
+
+                    ratio_ccf = self.get_ratio_ccf(self.od_names[i])
+                    self.reweighted[self.od_names[i]] = 'T' if ratio_ccf is not None else 'F'
+                    rv_results = self.alg.compute_rv_by_cc(start_seg=self.start_seg, end_seg=self.end_seg,
+                                                           ref_ccf=ratio_ccf,
+                                                           pending_ccf=pending_ccfs.get(self.od_names[i]))
+                    one_df = rv_results['ccf_df']
+                    if one_df is None or one_df.empty or not one_df.values.any():
+                        if self.logger:
+                            self.logger.info('RadialVelocity: orderlet ' + self.od_names[i] + ' message => ' +
+                                    rv_results['msg'])
+                    output_df[self.od_names[i]] = one_df
+            finally:
+                if ccf_pool is not None:
+                    ccf_pool.release()
 
         # do rv on CAL ccfs
         all_none = [output_df[k] is None for k in output_df.keys()]
@@ -494,6 +512,32 @@ class RadialVelocity(KPF1_Primitive):
 
         return Arguments(self.output_level2)
 
+    def submit_orderlets_ccf(self, ccf_pool):
+        """Submit the cross correlation of all segments of all orderlets to the process pool.
+
+        Args:
+            ccf_pool (RadialVelocityParallelCCF): Process pool computing the cross correlation.
+
+        Returns:
+            dict: Pending cross correlation result from `RadialVelocityAlg.submit_rv_on_spectrum` for each orderlet
+            with the cross correlation to be computed.
+        """
+        pending_ccfs = {}
+        for i in range(self.total_orderlet):
+            self.alg.reset_spectrum(self.spectrum_data_set[i], self.header_set[i], self.wave_cal_set[i],
+                                    orderlet=self.od_names[i])
+            if self.alg.is_none_fiberobject(self.alg.get_fiber_object_in_header(self.alg.spectro, self.od_names[i])):
+                continue
+            self.alg.get_segment_limits()
+            pending_ccf, _ = self.alg.submit_rv_on_spectrum(start_seg=self.start_seg, end_seg=self.end_seg,
+                                                            ccf_pool=ccf_pool)
+            if pending_ccf is not None:
+                pending_ccfs[self.od_names[i]] = pending_ccf
+        if self.logger:
+            self.logger.info('RadialVelocity: cross correlation of ' + str(len(pending_ccfs)) +
+                             ' orderlets submitted to ' + str(self.ccf_workers) + ' workers')
+        return pending_ccfs
+
     def get_map_key(self, od_name):
         for k in self.orderlet_key_map[self.ins].keys():
             if k in od_name.lower():
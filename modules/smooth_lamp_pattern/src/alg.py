@@ -0,0 +1,146 @@
+import numpy as np
+
+# Approximate number of float64 copies of the windows of a row band held at once by compute_band()
+# (sorted windows, clipping masks and temporaries).
+SMOOTH_WORK_COPIES = 5
+
+
+class SmoothLampPattern:
+
+    """
+    Description:
+        This class computes the smooth lamp pattern of a stacked flat-lamp image,
+        which is the sliding-window clipped mean of the image data.  The kernel,
+        x_window pixels wide (along dispersion dimension) by y_window pixels
+        high (along cross-dispersion dimension), is centered on the pixel of
+        interest and cut at the image edges.  Within the kernel, NaN pixels
+        are ignored and data outside median +/- n_sigma * sigma are rejected,
+        where sigma = 0.5 * (p84 - p16).  Pixels that are NaN in the input stay
+        NaN, and values less than or equal to zero are set to unity.
+        The image is processed in bands of rows, each as an array of windows
+        made from a sliding-window view, so that the peak RAM is bounded.
+
+    Arguments:
+        data (numpy array): 2-D stacked-image average.
+        x_window (int): Kernel size along dispersion dimension, odd (default = 15).
+        y_window (int): Kernel size along cross-dispersion dimension, odd (default = 3).
+        n_sigma (float): Number of sigmas for data clipping (default = 3).
+        max_ram_mb (float): Approximate peak RAM in MB for the windows of a row band (default = None for no limit).
+
+    Attributes:
+        data (numpy array): 2-D stacked-image average.
+        x_window (int): Kernel size along dispersion dimension.
+        y_window (int): Kernel size along cross-dispersion dimension.
+        n_sigma (float): Number of sigmas for data clipping.
+        max_ram_mb (float): Approximate peak RAM in MB for the windows of a row band.
+    """
+
+    def __init__(self,data,x_window=15,y_window=3,n_sigma=3,logger=None,max_ram_mb=None):
+        self.data = data
+        self.x_window = x_window
+        self.y_window = y_window
+        self.n_sigma = n_sigma
+        self.max_ram_mb = max_ram_mb
+        if logger:
+            self.logger = logger
+        else:
+            self.logger = None
+
+        if self.logger:
+            self.logger.info('Started {}'.format(self.__class__.__name__))
+
+    def get_rows_per_band(self):
+
+        """
+        Return the number of image rows smoothed at once, as limited by max_ram_mb.
+        """
+
+        n_rows,n_cols = np.shape(self.data)
+
+        if self.max_ram_mb is None:
+            return n_rows
+
+        bytes_per_row = SMOOTH_WORK_COPIES * 8 * n_cols * self.x_window * self.y_window
+        rows_per_band = int(self.max_ram_mb * 1024 * 1024 / bytes_per_row)
+
+        return min(max(rows_per_band,1),n_rows)
+
+    @staticmethod
+    def percentile(a,n_valid,q):
+
+        """
+        Return the q-th percentile of the first n_valid values of each row of the row-sorted array a,
+        with the linear interpolation of numpy.percentile().
+        """
+
+        q = q / 100
+        virtual_index = n_valid * q + (1 - q) - 1
+        previous_index = np.floor(virtual_index).astype(int)
+        next_index = np.minimum(previous_index + 1,np.maximum(n_valid - 1,0))
+        gamma = virtual_index - previous_index
+        rows = np.arange(len(a))
+        previous = a[rows,previous_index]
+        diff = a[rows,next_index] - previous
+        return np.where(gamma >= 0.5,a[rows,next_index] - diff * (1 - gamma),previous + diff * gamma)
+
+    def compute_band(self,row_start,row_end):
+
+        """
+        Return the smooth lamp pattern of rows row_start to row_end-1 of the image.
+        """
+
+        n_rows,n_cols = np.shape(self.data)
+        x_hwin = int((self.x_window - 1) / 2)
+        y_hwin = int((self.y_window - 1) / 2)
+
+        # Rows of the band and their neighbors, padded with NaN beyond the image edges.
+        padded = np.full((row_end - row_start + 2 * y_hwin,n_cols + 2 * x_hwin),np.nan)
+        first = max(row_start - y_hwin,0)
+        last = min(row_end + y_hwin,n_rows)
+        padded[first - (row_start - y_hwin):last - (row_start - y_hwin),x_hwin:x_hwin + n_cols] = self.data[first:last]
+
+        windows = np.lib.stride_tricks.sliding_window_view(padded,(self.y_window,self.x_window))
+        windows = windows.reshape(-1,self.y_window * self.x_window)
+
+        # NaN sort to the end of each window.
+        a = np.sort(windows,axis=1)
+        n_valid = np.sum(~np.isnan(a),axis=1)
+        rows = np.arange(len(a))
+
+        med = (a[rows,np.maximum((n_valid - 1) // 2,0)] + a[rows,n_valid // 2]) / 2
+        p16 = self.percentile(a,n_valid,16)
+        p84 = self.percentile(a,n_valid,84)
+        sigma = 0.5 * (p84 - p16)
+        mdmsg = med - self.n_sigma * sigma
+        mdpsg = med + self.n_sigma * sigma
+
+        keep = (a >= mdmsg[:,np.newaxis]) & (a <= mdpsg[:,np.newaxis])
+        n_keep = np.sum(keep,axis=1)
+        total = np.sum(np.where(keep,a,0.0),axis=1)
+        avg = np.divide(total,n_keep,out=np.zeros_like(total),where=n_keep > 0)
+
+        avg[avg <= 0.0] = 1.0                          # Avoid division by zero and no negative values.
+        center = self.data[row_start:row_end].reshape(-1)
+        avg[np.isnan(center)] = np.nan
+
+        return avg.reshape(row_end - row_start,n_cols)
+
+    def compute(self):
+
+        """
+        Return the smooth lamp pattern of the image, computed in bands of rows.
+        """
+
+        n_rows,n_cols = np.shape(self.data)
+        rows_per_band = self.get_rows_per_band()
+
+        if self.logger:
+            self.logger.debug('{}.compute(): x_window,y_window,n_sigma,rows_per_band = {},{},{},{}'.\
+                format(self.__class__.__name__,self.x_window,self.y_window,self.n_sigma,rows_per_band))
+
+        smooth_image = np.full((n_rows,n_cols),np.nan)
+        for row_start in range(0,n_rows,rows_per_band):
+            row_end = min(row_start + rows_per_band,n_rows)
+            smooth_image[row_start:row_end] = self.compute_band(row_start,row_end)
+
+        return smooth_image
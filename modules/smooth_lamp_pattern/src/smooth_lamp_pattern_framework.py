@@ -0,0 +1,139 @@
+import numpy as np
+import configparser as cp
+from astropy.io import fits
+
+from modules.smooth_lamp_pattern.src.alg import SmoothLampPattern
+
+# Pipeline dependencies
+from kpfpipe.logger import *
+from kpfpipe.models.level0 import KPF0
+from kpfpipe.primitives.level0 import KPF0_Primitive
+from keckdrpframework.models.arguments import Arguments
+
+# Global read-only variables
+DEFAULT_CFG_PATH = 'modules/smooth_lamp_pattern/configs/default.cfg'
+
+class SmoothLampPatternFramework(KPF0_Primitive):
+
+    """
+    Description:
+        This class works within the Keck pipeline framework to compute the fixed smooth
+        lamp pattern used by MasterFlatFramework, from the stacked-image averages of a
+        master flat made from many Flatlamp frames of a specific observation date
+        (e.g., 100 Flatlamp frames, 30-second exposures each, acquired on 20230628).
+        The fixed smooth lamp pattern enables the flat-field correction to remove
+        time-evolving dust and debris signatures on the optics of the instrument and
+        telescope.
+
+        Algorithm:
+        For each FITS extension, compute the sliding-window clipped mean of the
+        <ffi>_STACK extension of the input master flat with SmoothLampPattern
+        (kernel 15 pixels wide along dispersion dimension by 3 pixels high along
+        cross-dispersion dimension, 3-sigma, double-sided outlier rejection).
+        Write the float32 smooth lamp patterns to the output FITS file, one image
+        extension per FITS extension.
+
+    Arguments:
+        data_type (str): Type of data (e.g., KPF).
+        masterflat_path (str): Pathname of input master flat (e.g., /testdata/kpf_20230628_master_flat.fits).
+        lev0_ffi_exts (list of str): FITS extensions to smooth (e.g., ['GREEN_CCD','RED_CCD']).
+        smooth_lamp_path (str): Pathname of output smooth lamp pattern
+            (e.g., /testdata/kpf_20230628_smooth_lamp.fits).
+
+    Attributes:
+        data_type (str): Type of data (e.g., KPF).
+        masterflat_path (str): Pathname of input master flat.
+        lev0_ffi_exts (list of str): FITS extensions to smooth.
+        smooth_lamp_path (str): Pathname of output smooth lamp pattern.
+        module_config_path (str): Location of default config file (modules/smooth_lamp_pattern/configs/default.cfg)
+        logger (object): Log messages written to log_path specified in default config file.
+        x_window (int): Kernel size along dispersion dimension (default = 15 pixels)
+        y_window (int): Kernel size along cross-dispersion dimension (default = 3 pixels)
+        n_sigma (float): Number of sigmas for data-clipping (default = 3)
+        max_ram_mb (float): Approximate peak RAM in MB for smoothing a band of image rows (default = 4000)
+
+    Outputs:
+        Full-frame-image FITS extensions in output smooth lamp pattern:
+        EXTNAME = 'GREEN_CCD'          / GREEN smooth flat-lamp pattern
+        EXTNAME = 'RED_CCD '           / RED smooth flat-lamp pattern
+
+    """
+
+    def __init__(self, action, context):
+
+        KPF0_Primitive.__init__(self, action, context)
+
+        self.data_type = self.action.args[0]
+        self.masterflat_path = self.action.args[1]
+        self.lev0_ffi_exts = self.action.args[2]
+        self.smooth_lamp_path = self.action.args[3]
+
+        try:
+            self.module_config_path = context.config_path['smooth_lamp_pattern']
+        except:
+            self.module_config_path = DEFAULT_CFG_PATH
+
+        print("{} class: self.module_config_path = {}".format(self.__class__.__name__,self.module_config_path))
+
+        self.logger = start_logger(self.__class__.__name__, self.module_config_path)
+
+        self.logger.info('Started {}'.format(self.__class__.__name__))
+        self.logger.debug('module_config_path = {}'.format(self.module_config_path))
+
+        module_config_obj = cp.ConfigParser()
+        res = module_config_obj.read(self.module_config_path)
+        if res == []:
+            raise IOError('failed to read {}'.format(self.module_config_path))
+
+        module_param_cfg = module_config_obj['PARAM']
+
+        self.x_window = int(module_param_cfg.get('x_window', 15))
+        self.y_window = int(module_param_cfg.get('y_window', 3))
+        self.n_sigma = float(module_param_cfg.get('n_sigma', 3))
+        self.max_ram_mb = float(module_param_cfg.get('max_ram_mb', 4000))
+        if self.max_ram_mb <= 0:
+            self.max_ram_mb = None
+
+        self.logger.info('self.x_window = {}'.format(self.x_window))
+        self.logger.info('self.y_window = {}'.format(self.y_window))
+        self.logger.info('self.n_sigma = {}'.format(self.n_sigma))
+        self.logger.info('self.max_ram_mb = {}'.format(self.max_ram_mb))
+
+    def _perform(self):
+
+        """
+        Returns [exitcode] after computing and writing smooth-lamp-pattern FITS file.
+
+        """
+
+        master_flat_data = KPF0.from_fits(self.masterflat_path,self.data_type)
+        self.logger.debug('Finished loading master-flat data from FITS file = {}'.format(self.masterflat_path))
+
+        hdu_list = []
+        empty_data = None
+        hdu_list.append(fits.PrimaryHDU(empty_data))
+
+        for ffi in self.lev0_ffi_exts:
+            ffi_stack = ffi + "_STACK"
+            data = np.array(master_flat_data[ffi_stack])
+
+            smooth_lamp = SmoothLampPattern(data,self.x_window,self.y_window,self.n_sigma,
+                                            self.logger,self.max_ram_mb)
+            smooth_image = smooth_lamp.compute()
+            self.logger.debug('Finished smooth lamp pattern for ffi = {}'.format(ffi))
+
+            hdu = fits.ImageHDU(smooth_image.astype(np.float32))
+            hdu.header['EXTNAME'] = ffi
+            hdu.header['XWINDOW'] = (self.x_window, "X clipped-mean kernel size (pix)")
+            hdu.header['YWINDOW'] = (self.y_window, "Y clipped-mean kernel size (pix)")
+            hdu.header['NSIGMA'] = (self.n_sigma, "Number of sigmas for data-clipping")
+            hdu_list.append(hdu)
+
+        hdu = fits.HDUList(hdu_list)
+        hdu.writeto(self.smooth_lamp_path,overwrite=True,checksum=True)
+
+        self.logger.info('Finished {}'.format(self.__class__.__name__))
+
+        exit_list = [0]
+
+        return Arguments(exit_list)
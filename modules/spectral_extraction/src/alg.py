@@ -7,6 +7,9 @@ from modules.Utils.config_parser import ConfigHandler
 from modules.Utils.alg_base import ModuleAlgBase
 import os
 import json
+import hashlib
+from collections import OrderedDict
+from scipy import sparse
 
 # Pipeline dependencies
 # from kpfpipe.logger import start_logger
@@ -75,7 +78,9 @@ class SpectralExtractionAlg(ModuleAlgBase):
                 - SpectralExtractionAlg.NOEXTRACT (i.e. 'rectonly'): no reduction on rectified
                   (including VERTICAL, NORMAL or NoRECT rectification method) order trace.
         clip_file (str, optional): Prefix of clip file path. Defaults to None. Clip file is used to store the
-            polygon clip data for the rectification method which is not NoRECT.
+            polygon clip data for the rectification method which is not NoRECT. The clip data of each order is
+            stored in binary format, see :func:`~alg.SpectralExtractionAlg.write_clip_cache()`. Clip file in json
+            format made by :func:`~alg.SpectralExtractionAlg.write_clip_file()` is still accepted.
         logger_name (str, optional): Name of the logger defined for the SpectralExtractionAlg instance.
 
     Note:
@@ -139,8 +144,16 @@ class SpectralExtractionAlg(ModuleAlgBase):
     FDATA = 1
     RECTIFYKEY = 'RECTIFYM'
     RAWSIZEKEY = 'RAWSIZE'
+    CLIP_CACHE_VERSION = 1
+    CLIP_CACHE_EXT = '.clip'
+    CLIP_JSON_EXT = '.json'
+    CLIP_MEMORY_CACHE_MB = 2048
     name = 'SpectralExtraction'
 
+    # polygon clipping information of the orders shared by the instances in the process, keyed by the checksum
+    # of the order trace, see get_order_trace_checksum().
+    clip_memory_cache = OrderedDict()
+
     rectifying_method = ['normal', 'vertical', 'norect']
     extracting_method = ['optimal', 'summ', 'rectonly']
 
@@ -395,7 +408,28 @@ class SpectralExtractionAlg(ModuleAlgBase):
         # data_group should contain only the data set to be rectified.
         return {'extraction': out_data[data_group[0]['idx']][0:height]}
 
-    def compute_order_area(self, c_order, rectified_group,  output_x_dim, output_y_dim, s_rate, w_border=False):
+    def extraction_handler_columns(self, out_data, data_group):
+        """Perform the spectral extraction on all columns of the collected order data based on the extraction method.
+
+        Args:
+            out_data (np.ndarray) : The collected data of all columns. `out_data[idx]` is a 2D array with one row
+                per column of the order, i.e. the transpose of the order strip.
+            data_group (list): Container contains the data set for the process.
+
+        Returns:
+            numpy.ndarray: Spectral extraction result (1 x columns) or rectification result (height x columns).
+        """
+
+        if self.extraction_method == SpectralExtractionAlg.OPTIMAL:
+            return self.optimal_extraction_columns(out_data[self.SDATA], out_data[self.FDATA])
+        elif self.extraction_method == SpectralExtractionAlg.SUM:
+            return np.sum(out_data[self.SDATA], axis=1).reshape(1, -1)
+
+        # data_group should contain only the data set to be rectified.
+        return out_data[data_group[0]['idx']].T
+
+    def compute_order_area(self, c_order, rectified_group,  output_x_dim, output_y_dim, s_rate, w_border=False,
+                           clip_checksum=None):
         """
             Compute the order center y location, upper edge and lower edge, x coverage at input and output domain,
             y position of fitting polynomial of the order, and the polygon clipping data from the clip file
@@ -409,6 +443,9 @@ class SpectralExtractionAlg(ModuleAlgBase):
             s_rate (list): Sampling rate.
             w_border (bool): Flag to indicate if the pixel specified as the right end of xrange is included for the
                             computation.
+            clip_checksum (str, optional): Checksum of the order trace to look up the polygon clipping information
+                of the order, see :func:`~alg.SpectralExtractionAlg.get_order_trace_checksum()`. Defaults to None
+                for no lookup.
 
         Returns:
             tuple: dimension for rectification computation,
@@ -419,7 +456,8 @@ class SpectralExtractionAlg(ModuleAlgBase):
                 * **y_mid** (*numpy.ndarray*): y position of the polynomial fitting for the order.
                 * **x_step** (*numpy.ndarray*): x coordinate of pixels in input domain along the order.
                 * **x_output_step** (*numpy.ndarray*): x coordinate of pixels in output domain along the order.
-                * **clip_areas** (*numpy.ndarray*): polygon clipping information read from the clip file for the order.
+                * **clip_areas** (*dict*): polygon clipping information read from the clip file for the order,
+                  see :func:`~alg.SpectralExtractionAlg.make_clip_areas()`.
 
         """
         border = 1 if w_border else 0
@@ -437,12 +475,14 @@ class SpectralExtractionAlg(ModuleAlgBase):
         # prepare for order area calculation
         y_mid = None               # order trace
         clip_areas = None          # clip data for rectification method
-        poly_file = self.get_clip_file(c_order)
+        if self.rectification_method != self.NoRECT and clip_checksum is not None:
+            clip_areas = self.load_clip_areas(c_order, x_output_step, clip_checksum)
 
         gap = 2
         # get order information from poly clip file
-        if self.rectification_method != self.NoRECT and poly_file and os.path.exists(poly_file):
-            y_output_mid, lower_width, upper_width, clip_areas = self.read_clip_file(poly_file)
+        if clip_areas is not None:
+            y_output_mid = clip_areas['y_center']
+            lower_width, upper_width = clip_areas['edges']
         else:
             # get order information from rectified lev0 fits
             order_key = 'ORD_' + str(c_order)
@@ -523,9 +563,6 @@ class SpectralExtractionAlg(ModuleAlgBase):
         y_size = upper_width + lower_width
         total_data_group = 2  # No. of data set for out_data
 
-        # memory allocated to hold data for one columnn
-        out_data = self.allocate_memory_flux(np.array([]), total_data_group, sampling_rate[self.Y])
-
         # x_output_step aligned with input_x,
         # input_widths, y_input, y_output_widths aligned with [-lower_width, ..., upper_width]
         input_widths = np.array([self.get_input_pos(y_o, sampling_rate[self.Y])
@@ -536,22 +573,23 @@ class SpectralExtractionAlg(ModuleAlgBase):
         extracted_data = np.zeros((y_size if self.extraction_method == self.NOEXTRACT else 1, output_x_dim))
         y_output_widths = np.arange(-lower_width, upper_width)      # in parallel to input_widths
 
-        for s_x, o_x in enumerate(x_output_step):               # ox: 0...x_dim-1, out_data: 0...x_dim-1, corners: 0...
-            # if o_x % 1000 == 0:
-            #    self.d_print(o_x, end=" ")
+        # collect the pixels of all columns of the order at once, out_data[idx][s_x, :] is the column of
+        # output x position x_output_step[s_x], aligned with y_output_widths.
+        out_data = np.zeros((total_data_group, x_output_step.size, y_size))
+        y_input = np.floor(input_widths[np.newaxis, :] + y_mid[:, np.newaxis]).astype(int)
+        y_input_valid = (y_input <= (input_y_dim - 1)) & (y_input >= 0)
 
-            x_i = input_x[s_x]
-            y_input = np.floor(input_widths + y_mid[s_x]).astype(int)
-            y_input_idx = np.where((y_input <= (input_y_dim - 1)) & (y_input >= 0))[0]
-
-            out_data.fill(0.0)
+        if raw_group:
+            x_input = np.broadcast_to(input_x[:, np.newaxis], y_input.shape)[y_input_valid]
             for dt in raw_group:
-                out_data[dt['idx']][y_input_idx, 0] = dt['data'][y_input[y_input_idx], x_i]
+                out_data[dt['idx']][y_input_valid] = dt['data'][y_input[y_input_valid], x_input]
+        if rectified_group:
+            y_rectified = np.broadcast_to(y_output_widths + y_output_mid, y_input.shape)[y_input_valid]
+            x_rectified = np.broadcast_to(x_output_step[:, np.newaxis], y_input.shape)[y_input_valid]
             for dt in rectified_group:
-                out_data[dt['idx']][y_input_idx, 0] = dt['data'][y_output_widths[y_input_idx] + y_output_mid, o_x]
+                out_data[dt['idx']][y_input_valid] = dt['data'][y_rectified, x_rectified]
 
-            extracted_result = self.extraction_handler(out_data, y_size, data_group)
-            extracted_data[:, o_x:o_x+1] = extracted_result['extraction']
+        extracted_data[:, x_output_step] = self.extraction_handler_columns(out_data, data_group)
 
         # out data starting from origin [0, 0] contains the reduced flux associated with the data range
         result_data = {'y_center': y_output_mid,
@@ -597,127 +635,126 @@ class SpectralExtractionAlg(ModuleAlgBase):
         output_x_dim = input_x_dim * sampling_rate[self.X]
         output_y_dim = input_y_dim * sampling_rate[self.Y]
 
+        clip_checksum = self.get_order_trace_checksum(order_idx, sampling_rate)
         y_output_mid, lower_width, upper_width, y_mid, x_step, x_output_step, clip_areas = \
-            self.compute_order_area(order_idx, rectified_group, output_x_dim, output_y_dim, sampling_rate, True)
+            self.compute_order_area(order_idx, rectified_group, output_x_dim, output_y_dim, sampling_rate, True,
+                                    clip_checksum=clip_checksum)
 
-        read_poly_file = False
-        all_input_corners = None
-        poly_file = self.get_clip_file(order_idx)
-
-        if len(raw_group) > 0 and clip_areas is not None:
-            read_poly_file = True
-        else:
-            if len(raw_group) > 0 and poly_file:
-                p_dir = os.path.dirname(poly_file)
-                if not p_dir:
-                    p_dir = '.'
-                self.output_clip_area = os.access(p_dir, os.W_OK)
-
-            # prepare corners for clipping computation
-
-        if len(raw_group) > 0 and (not read_poly_file):
-            x_o = self.origin[self.X]
-            coeffs = self.order_coeffs[order_idx]
-            # y step in vertical or normal direction along the order
-            if self.rectification_method == self.NORMAL:
-                # curve norm along x in input domain
-                y_norm_step = self.poly_normal(x_step - x_o, coeffs, sampling_rate[self.Y])
-            else:  # vertical direction
-                # vertical norm along x in input domain
-                y_norm_step = self.vertical_normal(x_step - x_o, sampling_rate[self.Y])
-
-            corners_at_mid = np.vstack((x_step, y_mid)).T  # for x and y in data range, relative to 2D origin [0, 0]
-
-            # corners along the order at output domain
-            all_input_corners = np.zeros((upper_width + lower_width + 1, x_step.size, 2))  # for x & y
-            all_input_corners[lower_width] = corners_at_mid.copy()
-
-            for o_y in range(1, upper_width + 1):
-                next_upper_corners = self.go_vertical(all_input_corners[lower_width + o_y - 1], y_norm_step, 1)
-                all_input_corners[lower_width + o_y] = next_upper_corners
-
-            for o_y in range(1, lower_width + 1):
-                next_lower_corners = self.go_vertical(all_input_corners[lower_width - o_y + 1], y_norm_step, -1)
-                all_input_corners[lower_width - o_y] = next_lower_corners
-
-            if self.output_clip_area:
-                clip_areas = dict()
+        # the rectification operator depends on the order trace only, build it if it is not cached yet.
+        if len(raw_group) > 0 and clip_areas is None:
+            clip_areas = self.compute_clip_areas(order_idx, y_mid, x_step, x_output_step, y_output_mid,
+                                                 lower_width, upper_width, sampling_rate)
+            self.save_clip_areas(order_idx, clip_areas, clip_checksum)
 
         y_size = upper_width + lower_width
-        v2_borders = None
-        v1_borders = None
-        h_borders = None
-
-        upper_pixels = list(range(lower_width, upper_width + lower_width))  # [0, 1,...,lower_width-1, ..., y_size-1]
-        lower_pixels = list(range(lower_width - 1, -1, -1))
         y_output_widths = np.arange(-lower_width, upper_width)
-        out_data = self.allocate_memory_flux(np.array([]), 2, sampling_rate[self.Y])
+        x_output = clip_areas['x_output'] if clip_areas is not None else x_output_step[0:-1]
         extracted_data = np.zeros((y_size if self.extraction_method == self.NOEXTRACT else 1, output_x_dim))
 
-        flux_v = np.zeros(len(raw_group)) if len(raw_group) > 0 else None
-        raw_data_group = [dt['data'] for dt in raw_group] if len(raw_group) > 0 else None
-        for i, o_x in enumerate(x_output_step[0:-1]):  # for x output associated with the data range
-            # if i % 100 == 0:
-            #    print(i, end=" ")
-            if len(raw_group) > 0:
-                # if not read from clip file
-                if not read_poly_file:
-                    if i == 0:
-                        v1_borders = self.collect_v_borders(all_input_corners, i)
-                    else:
-                        v1_borders = v2_borders
-
-                    v2_borders = self.collect_v_borders(all_input_corners, i + 1)
-                    h_borders = self.collect_h_borders(v1_borders, v2_borders)
-
-                # each border: vertex_1, vertex_2, direction, intersect_with_borders={direction, pos, loc}
-                for pixel_list in [upper_pixels, lower_pixels]:
-                    for o_y in pixel_list:
-                        # if read from clip file
-                        if read_poly_file:
-                            input_pixels = clip_areas[str(o_y)][str(o_x)]
-                            flux_v.fill(0.0)
-                            total_area = 0
-                            for i_p in input_pixels:
-                                total_area += i_p[2]
-                                for n in range(len(raw_group)):
-                                    flux_v[n] += raw_group[n]['data'][i_p[1], i_p[0]] * i_p[2]
-
-                            flux = flux_v/total_area if total_area != 0.0 else flux_v
-                        else:
-                            borders = [
-                                v1_borders[o_y].copy(), h_borders[o_y + 1].copy(),
-                                v2_borders[o_y].copy(), h_borders[o_y].copy()
-                            ]
-                            # adjust v1 and v2 in clockwise direction
-                            for n in [self.V_DOWN, self.H_LEFT]:
-                                borders[n][self.V1], borders[n][self.V2] = borders[n][self.V2], borders[n][self.V1]
-
-                            flux, area = self.compute_flux_for_output_pixel(borders, raw_data_group,
-                                                                            len(raw_data_group))
-                            if self.output_clip_area:
-                                if o_y not in clip_areas:
-                                    clip_areas[int(o_y)] = dict()
-                                clip_areas[int(o_y)][int(o_x)] = area
-
-                        for n in range(len(raw_group)):
-                            out_data[raw_group[n]['idx']][o_y, 0] = flux[n]
-
-            for dt in rectified_group:
-                out_data[dt['idx']][0:y_size, 0] = dt['data'][y_output_widths + y_output_mid, o_x]
-            extracted_result = self.extraction_handler(out_data, y_size, data_group)
-            extracted_data[:, o_x:o_x + 1] = extracted_result['extraction']
-
-        if self.output_clip_area:
-            self.poly_clip_update = True
-            self.write_clip_file(poly_file, int(y_output_mid), [int(lower_width), int(upper_width)], clip_areas,
-                                 order_idx)
+        # rectify each raw data set of the order by one sparse product
+        out_data = np.zeros((2, x_output.size, y_size))
+        for dt in raw_group:
+            out_data[dt['idx']] = self.rectify_order_data(clip_areas, dt['data'])
+        for dt in rectified_group:
+            out_data[dt['idx']] = dt['data'][(y_output_widths + y_output_mid)[np.newaxis, :], x_output[:, np.newaxis]]
+        extracted_data[:, x_output] = self.extraction_handler_columns(out_data, data_group)
 
         result_data = {'y_center': y_output_mid,
                        'widths': [lower_width, upper_width],
                        'extracted_data': extracted_data}
         return result_data
 
+    def compute_clip_areas(self, order_idx, y_mid, x_step, x_output_step, y_output_mid, lower_width, upper_width,
+                           s_rate):
+        """ Compute the polygon clipping between the output pixels and the input pixels of the order.
+
+        Args:
+            order_idx (int): Index of the order.
+            y_mid (numpy.ndarray): y location of the order trace along `x_step`.
+            x_step (numpy.ndarray): x coordinate of pixels in input domain along the order.
+            x_output_step (numpy.ndarray): x coordinate of pixels in output domain along the order including border.
+            y_output_mid (int): y position to locate the center of the rectified order.
+            lower_width (int): lower edge of the rectified order.
+            upper_width (int): upper edge of the rectified order.
+            s_rate (list): Sampling rate.
+
+        Returns:
+            dict: Polygon clipping information as :func:`~alg.SpectralExtractionAlg.make_clip_areas()`.
+
+        """
+        x_o = self.origin[self.X]
+        coeffs = self.order_coeffs[order_idx]
+        # y step in vertical or normal direction along the order
+        if self.rectification_method == self.NORMAL:
+            # curve norm along x in input domain
+            y_norm_step = self.poly_normal(x_step - x_o, coeffs, s_rate[self.Y])
+        else:  # vertical direction
+            # vertical norm along x in input domain
+            y_norm_step = self.vertical_normal(x_step - x_o, s_rate[self.Y])
+
+        corners_at_mid = np.vstack((x_step, y_mid)).T  # for x and y in data range, relative to 2D origin [0, 0]
+
+        # corners along the order at output domain
+        all_input_corners = np.zeros((upper_width + lower_width + 1, x_step.size, 2))  # for x & y
+        all_input_corners[lower_width] = corners_at_mid.copy()
+
+        for o_y in range(1, upper_width + 1):
+            next_upper_corners = self.go_vertical(all_input_corners[lower_width + o_y - 1], y_norm_step, 1)
+            all_input_corners[lower_width + o_y] = next_upper_corners
+
+        for o_y in range(1, lower_width + 1):
+            next_lower_corners = self.go_vertical(all_input_corners[lower_width - o_y + 1], y_norm_step, -1)
+            all_input_corners[lower_width - o_y] = next_lower_corners
+
+        y_size = upper_width + lower_width
+        clip_pixels = [[None] * (x_output_step.size - 1) for _ in range(y_size)]
+        v2_borders = None
+
+        for i in range(x_output_step.size - 1):  # for x output associated with the data range
+            if i == 0:
+                v1_borders = self.collect_v_borders(all_input_corners, i)
+            else:
+                v1_borders = v2_borders
+
+            v2_borders = self.collect_v_borders(all_input_corners, i + 1)
+            h_borders = self.collect_h_borders(v1_borders, v2_borders)
+
+            # each border: vertex_1, vertex_2, direction, intersect_with_borders={direction, pos, loc}
+            for o_y in range(y_size):
+                borders = [
+                    v1_borders[o_y].copy(), h_borders[o_y + 1].copy(),
+                    v2_borders[o_y].copy(), h_borders[o_y].copy()
+                ]
+                # adjust v1 and v2 in clockwise direction
+                for n in [self.V_DOWN, self.H_LEFT]:
+                    borders[n][self.V1], borders[n][self.V2] = borders[n][self.V2], borders[n][self.V1]
+
+                clip_pixels[o_y][i] = self.compute_clip_areas_for_output_pixel(borders)
+
+        return self.make_clip_areas(y_output_mid, [lower_width, upper_width], x_output_step[0:-1], clip_pixels,
+                                    self.get_spectrum_size())
+
+    def save_clip_areas(self, order_idx, clip_areas, clip_checksum):
+        """ Keep the polygon clipping information of the order in memory and write it to the clip file if there is.
+
+        Args:
+            order_idx (int): Index of the order.
+            clip_areas (dict): Polygon clipping information of the order.
+            clip_checksum (str): Checksum of the order trace the clip data is computed from.
+
+        """
+        self.cache_clip_areas(clip_checksum, clip_areas)
+
+        poly_file = self.get_clip_file(order_idx)
+        if poly_file:
+            p_dir = os.path.dirname(poly_file)
+            if not p_dir:
+                p_dir = '.'
+            self.output_clip_area = os.access(p_dir, os.W_OK)
+            if self.output_clip_area:
+                self.poly_clip_update = True
+                self.write_clip_cache(poly_file, clip_areas, clip_checksum)
+
     def intersect_cell_borders(self, vertex_1, vertex_2):
         """Find out the intersection of a line segment with the horizontal and vertical grid lines.
 
@@ -1080,6 +1117,43 @@ class SpectralExtractionAlg(ModuleAlgBase):
 
         return {'extraction': w_data}
 
+    @staticmethod
+    def optimal_extraction_columns(s_data, f_data):
+        """ Do optimal extraction on the collected pixels of all columns along the order.
+
+        Same as :func:`~alg.SpectralExtractionAlg.optimal_extraction()` with the data of each column stored in
+        one row, so that the weighted summation of all columns is done in one pass.
+
+        Args:
+            s_data (numpy.ndarray): Spectral data collected for one order, one row per column.
+            f_data (numpy.ndarray): Flat data collected for one order, one row per column.
+
+        Returns:
+            numpy.ndarray: Optimal extraction result of all columns, 1 x columns.
+
+        Raises:
+            Exception: If there is unmatched size between collected order data and associated flat data.
+
+        """
+
+        if np.shape(s_data) != np.shape(f_data):
+            raise Exception("unmatched size between collected order data and associated flat data")
+
+        data_width, data_height = np.shape(s_data)
+        w_data = np.zeros((1, data_width))
+
+        # formula: sum((f/sum(f)) * s/variance)/sum((f/sum(f))^2)/variance) ref. Horne 1986
+        d_var = np.full((1, data_height), 1.0)  # set the variance to be 1.0
+        w_sum = np.sum(f_data, axis=1)
+        nz_idx = np.where(w_sum != 0.0)[0]
+        if nz_idx.size > 0:
+            p_data = f_data[nz_idx, :]/w_sum[nz_idx, np.newaxis]
+            num = p_data * s_data[nz_idx, :]/d_var
+            dem = np.power(p_data, 2)/d_var
+            w_data[0, nz_idx] = np.sum(num, axis=1)/np.sum(dem, axis=1)
+
+        return w_data
+
     @staticmethod
     def summation_extraction(s_data):
         """ Spectrum extraction by summation on collected pixels (rectified or non-rectified)
@@ -1240,6 +1314,31 @@ class SpectralExtractionAlg(ModuleAlgBase):
                                                         [x_1, x_2, y_1, y_2],input_data, total_data_group)
         return flux_polygon, clipped_areas
 
+    def compute_clip_areas_for_output_pixel(self, borders):
+        """ Collect the input pixels overlapping with one output pixel and the overlapping areas.
+
+        Args:
+            borders(list): Borders of the coverage of one output pxiel.
+
+        Returns:
+            list: List of input pixels overlapping with the output pixel and the overlapping areas, i.e.
+            (x, y, area) of each input pixel.
+
+        """
+        x_1 = min([border['intersect_with_borders']['min_cell_x'] for border in borders])
+        x_2 = max([border['intersect_with_borders']['max_cell_x'] for border in borders])
+        y_1 = min([border['intersect_with_borders']['min_cell_y'] for border in borders])
+        y_2 = max([border['intersect_with_borders']['max_cell_y'] for border in borders])
+
+        clipped_areas = list()
+        for x in range(x_1, x_2):
+            for y in range(y_1, y_2):
+                new_corners = self.polygon_clipping2(borders, [[x, y], [x, y+1], [x+1, y+1], [x+1, y]], 4)
+                area = self.polygon_area(new_corners)
+                if area > 0.0:
+                    clipped_areas.append((int(x), int(y), float(area)))
+        return clipped_areas
+
     def compute_flux_from_polygon_clipping2(self, borders, clipper_borders, input_data, total_data_group):
         """ Compute flux on pixels covered by one polygon formed in the normal or vertical direction of the order.
 
@@ -1738,16 +1837,263 @@ class SpectralExtractionAlg(ModuleAlgBase):
 
         return y_center, widths[0], widths[1], clip_areas
 
+    @staticmethod
+    def make_clip_areas(y_center, edges, x_output, clip_pixels, input_size):
+        """Convert polygon clipping information of one order into compressed sparse row (CSR) arrays.
+
+        The output pixels are ordered row by row, i.e. the output pixel at vertical position `o_y` (counted from
+        the lower edge) and horizontal position `x_output[s_x]` is the row of `o_y * x_output.size + s_x`.
+        The weight of each overlapping input pixel is the overlapping area normalized by the total overlapping
+        area of the output pixel.
+
+        Args:
+            y_center (int): Y center location.
+            edges (list): Lower edge and upper edge of the order.
+            x_output (numpy.ndarray): X position of the output pixels in output domain.
+            clip_pixels (list): Overlapping input pixels of each output pixel, `clip_pixels[o_y][s_x]` is a list
+                of (x, y, area) or None.
+            input_size (list): Horizontal and vertical dimension of the input image.
+
+        Returns:
+            dict: Polygon clipping information of the order, like::
+
+                {
+                    'y_center': int,
+                    'edges': list,                  # [<lower edge>, <upper edge>]
+                    'x_output': numpy.ndarray,      # x position of the output pixels
+                    'indptr': numpy.ndarray,        # start of the input pixels of each output pixel
+                    'pixels': numpy.ndarray,        # input pixel index, i.e. y * <input width> + x
+                    'weights': numpy.ndarray,       # normalized overlapping area
+                    'input_size': list              # [<input width>, <input height>]
+                }
+
+        """
+        input_x_dim = int(input_size[0])
+        indptr = [0]
+        pixels = list()
+        weights = list()
+        for row_pixels in clip_pixels:
+            for input_pixels in row_pixels:
+                input_pixels = input_pixels or []
+                total_area = sum([i_p[2] for i_p in input_pixels])
+                for i_p in input_pixels:
+                    pixels.append(int(i_p[1]) * input_x_dim + int(i_p[0]))
+                    weights.append(i_p[2]/total_area if total_area != 0.0 else i_p[2])
+                indptr.append(len(pixels))
+
+        return {'y_center': int(y_center),
+                'edges': [int(edges[0]), int(edges[1])],
+                'x_output': np.asarray(x_output, dtype=np.int32),
+                'indptr': np.array(indptr, dtype=np.int32),
+                'pixels': np.array(pixels, dtype=np.int32),
+                'weights': np.array(weights, dtype=np.float64),
+                'input_size': [int(input_size[0]), int(input_size[1])]}
+
+    @staticmethod
+    def get_clip_matrix(clip_areas):
+        """Make the sparse matrix mapping the flattened input image to the rectified pixels of the order.
+
+        Args:
+            clip_areas (dict): Polygon clipping information of the order from
+                :func:`~alg.SpectralExtractionAlg.make_clip_areas()`.
+
+        Returns:
+            scipy.sparse.csr_matrix: Matrix of (output pixels x input pixels). Its product with the flattened input
+            image is the rectified order in the row order of `clip_areas`. The matrix is kept in `clip_areas`.
+
+        """
+        if 'matrix' not in clip_areas:
+            total_rows = clip_areas['indptr'].size - 1
+            total_cols = clip_areas['input_size'][0] * clip_areas['input_size'][1]
+            clip_areas['matrix'] = sparse.csr_matrix((clip_areas['weights'], clip_areas['pixels'],
+                                                      clip_areas['indptr']), shape=(total_rows, total_cols))
+        return clip_areas['matrix']
+
+    @staticmethod
+    def rectify_order_data(clip_areas, data):
+        """Rectify the order of one image by the polygon clipping information of the order.
+
+        Args:
+            clip_areas (dict): Polygon clipping information of the order.
+            data (numpy.ndarray): 2D raw image of the size the clipping information is computed for, like spectrum
+                or flat data.
+
+        Returns:
+            numpy.ndarray: Rectified order, one row per output column, i.e. of size (columns x height).
+
+        """
+        x_total = clip_areas['x_output'].size
+        rectified = SpectralExtractionAlg.get_clip_matrix(clip_areas) @ np.ravel(data)
+        return rectified.reshape((-1, x_total)).T
+
+    @classmethod
+    def cache_clip_areas(cls, clip_checksum, clip_areas):
+        """Keep the polygon clipping information of one order for the instances made later in the process.
+
+        The least recently used entries are dropped once the total size is over CLIP_MEMORY_CACHE_MB.
+
+        Args:
+            clip_checksum (str): Checksum of the order trace the clip data is computed from.
+            clip_areas (dict): Polygon clipping information of the order.
+
+        """
+        def cache_size(areas):
+            return areas['indptr'].nbytes + areas['pixels'].nbytes + areas['weights'].nbytes
+
+        cls.clip_memory_cache[clip_checksum] = clip_areas
+        cls.clip_memory_cache.move_to_end(clip_checksum)
+        total_size = sum([cache_size(areas) for areas in cls.clip_memory_cache.values()])
+        while len(cls.clip_memory_cache) > 1 and total_size > cls.CLIP_MEMORY_CACHE_MB * 1024 * 1024:
+            _, dropped = cls.clip_memory_cache.popitem(last=False)
+            total_size -= cache_size(dropped)
+
+    @staticmethod
+    def write_clip_cache(clip_file, clip_areas, checksum):
+        """Write polygon clipping information of one order to a binary clip file.
+
+        The file is a sequence of .npy records: the header values (version, y center, edges and input size),
+        the checksum of the order trace, the output x positions and the CSR arrays. The file is written to a
+        temporary file first and then renamed, so a reader never sees a partial file.
+
+        Args:
+            clip_file (str): File name of the clip file.
+            clip_areas (dict): Polygon clipping information from :func:`~alg.SpectralExtractionAlg.make_clip_areas()`.
+            checksum (str): Checksum of the order trace the clip data is computed from,
+                see :func:`~alg.SpectralExtractionAlg.get_order_trace_checksum()`.
+
+        """
+        if clip_file is None:
+            return
+
+        header = np.array([SpectralExtractionAlg.CLIP_CACHE_VERSION, clip_areas['y_center'],
+                           clip_areas['edges'][0], clip_areas['edges'][1]] + clip_areas['input_size'], dtype=np.int64)
+        records = [header, np.frombuffer(checksum.encode('ascii'), dtype=np.uint8),
+                   clip_areas['x_output'], clip_areas['indptr'], clip_areas['pixels'], clip_areas['weights']]
+        tmp_file = clip_file + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp_file, 'wb') as outfile:
+            for record in records:
+                np.lib.format.write_array(outfile, np.ascontiguousarray(record), allow_pickle=False)
+        os.replace(tmp_file, clip_file)
+
+    @staticmethod
+    def read_clip_cache(clip_file, checksum=None):
+        """Read polygon clipping information of one order from a binary clip file.
+
+        The CSR arrays are memory-mapped from the file.
+
+        Args:
+            clip_file (str): File name of the clip file.
+            checksum (str, optional): Checksum of the current order trace. Defaults to None for no check.
+
+        Returns:
+            dict: Polygon clipping information as :func:`~alg.SpectralExtractionAlg.make_clip_areas()`, or None if
+            the file is made by another version or from a different order trace.
+
+        """
+        records = list()
+        with open(clip_file, 'rb') as infile:
+            for _ in range(6):
+                version = np.lib.format.read_magic(infile)
+                if version == (1, 0):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(infile)
+                else:
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(infile)
+                offset = infile.tell()
+                size = int(np.prod(shape)) * dtype.itemsize
+                if size == 0:
+                    records.append(np.zeros(shape, dtype=dtype))
+                else:
+                    records.append(np.memmap(clip_file, dtype=dtype, mode='r', offset=offset, shape=shape,
+                                             order='F' if fortran_order else 'C'))
+                infile.seek(offset + size)
+
+        header, file_checksum, x_output, indptr, pixels, weights = records
+        if header[0] != SpectralExtractionAlg.CLIP_CACHE_VERSION:
+            return None
+        if checksum is not None and bytes(file_checksum).decode('ascii') != checksum:
+            return None
+
+        return {'y_center': int(header[1]),
+                'edges': [int(header[2]), int(header[3])],
+                'x_output': np.array(x_output),
+                'indptr': indptr,
+                'pixels': pixels,
+                'weights': weights,
+                'input_size': [int(header[4]), int(header[5])]}
+
+    def get_order_trace_checksum(self, c_order, s_rate):
+        """Compute the checksum of everything the polygon clipping of the order depends on.
+
+        Args:
+            c_order (int): Order index.
+            s_rate (list): Sampling rate.
+
+        Returns:
+            str: MD5 hex digest of the order trace, edges and x range of the order, the image origin and size,
+            the sampling rate, the rectification method and the location of the previous rectified order which
+            the location of the order is adjusted to.
+
+        """
+        pre_area = [self.output_area_info[-1].get('y_center'), self.output_area_info[-1].get('upper_width')] \
+            if self.output_area_info else []
+        hash_md5 = hashlib.md5()
+        for values in [self.order_coeffs[c_order], self.get_order_edges(c_order), self.get_order_xrange(c_order),
+                       self.origin, self.get_spectrum_size(), s_rate, [self.rectification_method], pre_area]:
+            hash_md5.update(np.asarray(values, dtype=np.float64).tobytes())
+        return hash_md5.hexdigest()
+
+    def load_clip_areas(self, c_order, x_output_step, clip_checksum):
+        """Load the polygon clipping information of the order computed before.
+
+        The clipping information kept in memory is used first, then the binary clip file if it is made from the
+        same order trace, otherwise the clip file in json format is converted if there is.
+
+        Args:
+            c_order (int): Order index.
+            x_output_step (numpy.ndarray): x coordinate of pixels in output domain along the order including border.
+            clip_checksum (str): Checksum of the order trace.
+
+        Returns:
+            dict: Polygon clipping information as :func:`~alg.SpectralExtractionAlg.make_clip_areas()` or None.
+
+        """
+        if clip_checksum in self.clip_memory_cache:
+            self.clip_memory_cache.move_to_end(clip_checksum)
+            return self.clip_memory_cache[clip_checksum]
+
+        clip_file = self.get_clip_file(c_order)
+        if clip_file and os.path.exists(clip_file):
+            clip_areas = self.read_clip_cache(clip_file, clip_checksum)
+            if clip_areas is not None:
+                self.cache_clip_areas(clip_checksum, clip_areas)
+                return clip_areas
+            self.d_print('SpectralExtractionAlg: outdated clip file ', clip_file)
+
+        json_file = self.get_clip_file(c_order, self.CLIP_JSON_EXT)
+        if json_file and os.path.exists(json_file):
+            y_center, lower_width, upper_width, clip_dict = self.read_clip_file(json_file)
+            if clip_dict is not None:
+                x_output = x_output_step[0:-1]
+                clip_pixels = [[clip_dict.get(str(o_y), {}).get(str(o_x)) for o_x in x_output]
+                               for o_y in range(lower_width + upper_width)]
+                clip_areas = self.make_clip_areas(y_center, [lower_width, upper_width], x_output, clip_pixels,
+                                                  self.get_spectrum_size())
+                self.cache_clip_areas(clip_checksum, clip_areas)
+                return clip_areas
+
+        return None
+
     def reset_clip_file(self):
         """Reset the flag to output the clip information.
         """
         self.output_clip_area = False
 
-    def get_clip_file(self, order_idx=None):
+    def get_clip_file(self, order_idx=None, file_ext=CLIP_CACHE_EXT):
         """Compute the full path of the clip file for the specified order per clip file prefix.
 
         Args:
             order_idx: Index of the order.
+            file_ext (str, optional): Extension of the clip file. Defaults to CLIP_CACHE_EXT for the binary clip file.
 
         Returns:
             str: full path of the clip file.
@@ -1758,7 +2104,7 @@ class SpectralExtractionAlg(ModuleAlgBase):
         if order_idx is None:
             return self.clip_file_prefix + '_order_' if self.clip_file_prefix else None
         else:
-            crt_order_clip_file = self.clip_file_prefix + '_order_' + str(order_idx) + '.json' \
+            crt_order_clip_file = self.clip_file_prefix + '_order_' + str(order_idx) + file_ext \
                 if self.clip_file_prefix else None
 
         return crt_order_clip_file
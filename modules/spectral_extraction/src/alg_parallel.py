@@ -0,0 +1,114 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+from modules.spectral_extraction.src.alg import SpectralExtractionAlg
+
+# SpectralExtractionAlg instance and attached shared memory blocks of each worker process
+_worker_alg = None
+_worker_shm = {}
+
+
+def _attach_array(shared):
+    if shared is None:
+        return None
+    name, shape, dtype = shared
+    if name not in _worker_shm:
+        _worker_shm[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=_worker_shm[name].buf)
+
+
+def _init_worker(shared_flat, flat_header, shared_spectrum, spectrum_header, order_trace_data, order_trace_header,
+                 alg_args):
+    global _worker_alg
+    _worker_shm.clear()
+    _worker_alg = SpectralExtractionAlg(_attach_array(shared_flat), flat_header,
+                                        _attach_array(shared_spectrum), spectrum_header,
+                                        order_trace_data, order_trace_header, **alg_args)
+
+
+def _extract_orderlet(order_set, first_index):
+    return _worker_alg.extract_spectrum(order_set=order_set, first_index=first_index)
+
+
+class SpectralExtractionParallel:
+    """Process pool for extracting the orderlets of one image in parallel.
+
+    This module defines class 'SpectralExtractionParallel' which copies the flat and spectrum data of the image
+    to shared memory once and starts a pool of worker processes, each holding an instance of `SpectralExtractionAlg`
+    built on the shared data. The extraction of each orderlet is submitted to the pool and results in the same
+    output as :func:`~alg.SpectralExtractionAlg.extract_spectrum()`.
+
+    Args:
+        alg (SpectralExtractionAlg): Instance of SpectralExtractionAlg with the spectrum flux updated by
+            :func:`~alg.SpectralExtractionAlg.update_spectrum_flux()`, the workers are made of the same data and
+            settings.
+        order_trace_data (Union[numpy.ndarray, pandas.DataFrame]): Order trace data the instance is made from.
+        order_trace_header (dict): fits header of order trace extension.
+        config (configparser.ConfigParser): config context.
+        n_workers (int): Total worker processes.
+
+    Attributes:
+        executor (concurrent.futures.ProcessPoolExecutor): Pool of worker processes.
+        shm_blocks (list): Shared memory blocks created for the flat and spectrum data.
+    """
+
+    def __init__(self, alg, order_trace_data, order_trace_header, config, n_workers):
+        self.shm_blocks = []
+        shared_flat = self.share_array(alg.flat_flux)
+        shared_spectrum = self.share_array(alg.spectrum_flux) if alg.spectrum_flux is not None else None
+        alg_args = {'config': config,
+                    'rectification_method': alg.rectification_method,
+                    'extraction_method': alg.extraction_method,
+                    'ccd_index': alg.ccd_index,
+                    'orderlet_names': alg.orderlet_names,
+                    'total_order_per_ccd': alg.total_order_per_ccd,
+                    'clip_file': alg.clip_file_prefix}
+        self.executor = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                            initargs=(shared_flat, alg.flat_header, shared_spectrum,
+                                                      alg.spectrum_header, order_trace_data, order_trace_header,
+                                                      alg_args))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def share_array(self, data):
+        """Copy an array to shared memory.
+
+        Args:
+            data (numpy.ndarray): Array to be shared with the worker processes.
+
+        Returns:
+            tuple: Name of the shared memory block, shape and dtype of the array.
+
+        """
+        data = np.ascontiguousarray(data)
+        shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[...] = data
+        self.shm_blocks.append(shm)
+        return shm.name, data.shape, data.dtype.str
+
+    def submit(self, order_set, first_index):
+        """Submit the extraction of one orderlet.
+
+        Args:
+            order_set (numpy.ndarray): Set of orders to extract.
+            first_index (int): Row index of the first order in the result.
+
+        Returns:
+            concurrent.futures.Future: Future of the result of
+            :func:`~alg.SpectralExtractionAlg.extract_spectrum()` on the orderlet.
+
+        """
+        return self.executor.submit(_extract_orderlet, order_set, first_index)
+
+    def close(self):
+        """Shut down the worker processes and release the shared memory."""
+        self.executor.shutdown(wait=True)
+        for shm in self.shm_blocks:
+            shm.close()
+            shm.unlink()
+        self.shm_blocks = []
@@ -80,6 +80,9 @@
                 - `logger (logging.Logger)`: Instance of logging.Logger.
                 - `alg (modules.order_trace.src.alg.SpectralExtractionAlg)`: Instance of `SpectralExtractionAlg` which
                   has operation codes for the computation of spectral extraction.
+                - `extraction_workers (int)`: total worker processes extracting the orderlets in parallel, associated
+                  with `extraction_workers` in the config file. The orderlets are extracted serially if it is not
+                  greater than 1.
 
 
         * Method `__perform`:
@@ -112,6 +115,7 @@ import numpy as np
 from kpfpipe.primitives.level0 import KPF0_Primitive
 from kpfpipe.models.level0 import KPF0
 from kpfpipe.models.level1 import KPF1
+from kpfpipe.tools.reference_cache import load_reference
 
 # External dependencies
 from keckdrpframework.models.action import Action
@@ -120,6 +124,7 @@ from keckdrpframework.models.processing_context import ProcessingContext
 
 # Local dependencies
 from modules.spectral_extraction.src.alg import SpectralExtractionAlg
+from modules.spectral_extraction.src.alg_parallel import SpectralExtractionParallel
 
 # Global read-only variables
 DEFAULT_CFG_PATH = 'modules/spectral_extraction/configs/default.cfg'
@@ -143,7 +148,8 @@ class SpectralExtraction(KPF0_Primitive):
                     'ccd_index': None,
                     'first_orderlet_idx': None,
                     'total_order_per_ccd': None,
-                    'orderlets_on_image': None
+                    'orderlets_on_image': None,
+                    'extraction_workers': 1
                 }
 
     NORMAL = 0
@@ -195,14 +201,17 @@ class SpectralExtraction(KPF0_Primitive):
         self.logger.info('Loading config from: {}'.format(self.config_path))
 
         self.order_trace_data = None
+        self.order_trace_header = None
         if order_trace_file:
-            self.order_trace_data = pd.read_csv(order_trace_file, header=0, index_col=0)
+            self.order_trace_data = load_reference(order_trace_file,
+                                                   lambda f: pd.read_csv(f, header=0, index_col=0),
+                                                   kind='order_trace_csv')
             poly_degree = self.get_args_value('poly_degree', action.args, args_keys)
             origin = self.get_args_value('origin', action.args, args_keys)
-            order_trace_header = {'STARTCOL': origin[0], 'STARTROW': origin[1], 'POLY_DEG': poly_degree}
+            self.order_trace_header = {'STARTCOL': origin[0], 'STARTROW': origin[1], 'POLY_DEG': poly_degree}
         elif order_trace_ext:
             self.order_trace_data = self.input_flat[order_trace_ext]
-            order_trace_header = self.input_flat.header[order_trace_ext]
+            self.order_trace_header = self.input_flat.header[order_trace_ext]
 
         # Order trace algorithm setup
         self.spec_header = self.input_spectrum.header[data_ext] \
@@ -215,7 +224,7 @@ class SpectralExtraction(KPF0_Primitive):
                                         self.spec_flux,
                                         self.spec_header,
                                         self.order_trace_data,
-                                        order_trace_header,
+                                        self.order_trace_header,
                                         config=self.config, logger=self.logger,
                                         rectification_method=self.rectification_method,
                                         extraction_method=self.extraction_method,
@@ -226,6 +235,10 @@ class SpectralExtraction(KPF0_Primitive):
         except Exception as e:
             self.alg = None
 
+        self.extraction_workers = int(self.alg.get_config_value('extraction_workers',
+                                                                self.default_args_val['extraction_workers'])) \
+            if self.alg is not None else 1
+
     def _pre_condition(self) -> bool:
         """
         Check for some necessary pre conditions
@@ -268,7 +281,7 @@ class SpectralExtraction(KPF0_Primitive):
         kpf0_sample = None
         if self.wavecal_fits is not None:     # get the header and wavecal from this fits
             if isinstance(self.wavecal_fits, str):
-                kpf1_sample = KPF1.from_fits(self.wavecal_fits, ins)
+                kpf1_sample = KPF1.from_fits(self.wavecal_fits, ins, cache=True)
             elif isinstance(self.wavecal_fits, KPF1):
                 kpf1_sample = self.wavecal_fits
             elif isinstance(self.wavecal_fits, KPF0):
@@ -288,6 +301,59 @@ class SpectralExtraction(KPF0_Primitive):
         good_result = True
         # order_to_process = min([len(a_set) for a_set in all_o_sets])
 
+        extraction_pool = None
+        pending_results = dict()
+        to_extract = [idx for idx in range(len(all_order_names))
+                      if all_o_sets[idx].size > 0 and first_trace_at[idx] >= 0]
+        if self.extraction_workers > 1 and len(to_extract) > 1 and \
+                self.spec_flux is not None and self.spec_flux.size > 0:
+            self.alg.update_spectrum_flux()
+            extraction_pool = SpectralExtractionParallel(self.alg, self.order_trace_data, self.order_trace_header,
+                                                         self.config, min(self.extraction_workers, len(to_extract)))
+            for idx in to_extract:
+                pending_results[idx] = extraction_pool.submit(all_o_sets[idx], first_trace_at[idx])
+            if self.logger:
+                self.logger.info("SpectralExtraction: extraction of " + str(len(to_extract)) +
+                                 " orderlets submitted to " + str(self.extraction_workers) + " workers")
+
+        try:
+            good_result = self.collect_orderlets_result(all_order_names, all_o_sets, first_trace_at, pending_results,
+                                                        ins, kpf1_sample, kpf0_sample)
+        finally:
+            if extraction_pool is not None:
+                extraction_pool.close()
+
+        if good_result and self.output_level1 is not None:
+            self.output_level1.receipt_add_entry('SpectralExtraction', self.__module__,
+                                                 f'orderlets={" ".join(all_order_names)}', 'PASS')
+
+        if not good_result and self.logger:
+            self.logger.info("SpectralExtraction: no spectrum extracted")
+        elif good_result and self.logger:
+            self.logger.info("SpectralExtraction: Receipt written")
+            self.logger.info("SpectralExtraction: Done for orders " + " ".join(all_order_names) + "!")
+
+        return Arguments(self.output_level1) if good_result else Arguments(None)
+
+    def collect_orderlets_result(self, all_order_names, all_o_sets, first_trace_at, pending_results,
+                                 ins, kpf1_sample, kpf0_sample):
+        """Extract the orderlets, or collect the extraction submitted to the process pool, into level 1 data.
+
+        Args:
+            all_order_names (list): Names of the orderlets.
+            all_o_sets (list): Set of orders to extract for each orderlet.
+            first_trace_at (list): Row index of the first order in the result for each orderlet.
+            pending_results (dict): Future of the extraction result of the orderlets submitted to the process pool,
+                keyed by the orderlet index. The orderlets not in it are extracted serially.
+            ins (str): Instrument.
+            kpf1_sample (KPF1): Level 1 data with wavelength calibration if there is.
+            kpf0_sample (KPF0): Level 0 data with wavelength calibration if there is.
+
+        Returns:
+            bool: True if all orderlets get the extraction result, or False once an empty result is made.
+
+        """
+        good_result = True
         for idx, order_name in enumerate(all_order_names):
             if not good_result:       # process stops once an empty result is made
                 continue
@@ -314,7 +380,10 @@ class SpectralExtraction(KPF0_Primitive):
                                      " rectification and " +
                                      SpectralExtractionAlg.extracting_method[self.extraction_method] +
                                      " extraction on " + order_name + " of " + str(o_set.size) + " orders")
-                opt_ext_result = self.alg.extract_spectrum(order_set=o_set, first_index=first_index)
+                if idx in pending_results:
+                    opt_ext_result = pending_results[idx].result()
+                else:
+                    opt_ext_result = self.alg.extract_spectrum(order_set=o_set, first_index=first_index)
 
                 assert('spectral_extraction_result' in opt_ext_result and
                        isinstance(opt_ext_result['spectral_extraction_result'], pd.DataFrame))
@@ -327,17 +396,7 @@ class SpectralExtraction(KPF0_Primitive):
                                                             order_name, self.output_level1)
                 self.add_wavecal_to_level1_data(self.output_level1, order_name, kpf1_sample, kpf0_sample)
 
-        if good_result and self.output_level1 is not None:
-            self.output_level1.receipt_add_entry('SpectralExtraction', self.__module__,
-                                                 f'orderlets={" ".join(all_order_names)}', 'PASS')
-
-        if not good_result and self.logger:
-            self.logger.info("SpectralExtraction: no spectrum extracted")
-        elif good_result and self.logger:
-            self.logger.info("SpectralExtraction: Receipt written")
-            self.logger.info("SpectralExtraction: Done for orders " + " ".join(all_order_names) + "!")
-
-        return Arguments(self.output_level1) if good_result else Arguments(None)
+        return good_result
 
     def get_order_set(self, order_name, s_order, orderlet_index):
         o_set = self.alg.get_order_set(order_name)
@@ -10,6 +10,7 @@ from scipy.special import erf
 from scipy.interpolate import InterpolatedUnivariateSpline, UnivariateSpline
 from scipy.optimize.minpack import curve_fit
 from modules.Utils.config_parser import ConfigHandler
+from modules.wavelength_cal.src.alg_parallel import WaveCalibrationParallel
 
 class WaveCalibration:
     """
@@ -64,6 +65,7 @@ class WaveCalibration:
         self.peak_height_threshold = configpull.get_config_value('peak_height_threshold',1.5)
         self.sigma_clip = configpull.get_config_value('sigma_clip',2.1)
         self.fit_iterations = configpull.get_config_value('fit_iterations',5)
+        self.wls_workers = int(configpull.get_config_value('wls_workers',1))
         self.logger = logger
  
     def run_wavelength_cal(
@@ -238,212 +240,248 @@ class WaveCalibration:
 
         poly_soln_final_array = np.zeros(np.shape(cal_flux))
 
-        for order_num in order_list:
-            if print_update:
-                print('\nRunning order # {}'.format(order_num))
-
-            if plt_path is not None:
-                order_plt_path = '{}/order_diagnostics/order{}'.format(
-                    plt_path, order_num
-                )
-                if not os.path.isdir(order_plt_path):
-                    os.makedirs(order_plt_path)
-
-                plt.figure(figsize=(20,10))
-                plt.plot(cal_flux[order_num,:], color='k', alpha=0.5)
-                plt.title('Order # {}'.format(order_num))
-                plt.xlabel('pixel')
-                plt.ylabel('flux')
-                plt.savefig(
-                    '{}/order_spectrum.png'.format(order_plt_path), dpi=250
-                )
-                plt.close()
-            else:
-                order_plt_path = None
+        order_args = (cal_flux, order_list, rough_wls, comb_lines_angstrom, expected_peak_locs)
+        if self.wls_workers > 1 and plt_path is None and len(order_list) > 1:
+            # plots are only made by the serial fit
+            with WaveCalibrationParallel(self, order_args, self.wls_workers, print_update=print_update) as wls_pool:
+                pending_orders = [wls_pool.submit(order_num) for order_num in order_list]
+                order_results = [pending.result() for pending in pending_orders]
+        else:
+            order_results = [
+                self.fit_one_order(order_num, *order_args, plt_path=plt_path, print_update=print_update)
+                for order_num in order_list
+            ]
+
+        for order_num, (poly_soln_order, order_wls_and_pixels, order_precision) in zip(order_list, order_results):
+            if poly_soln_order is not None:
+                poly_soln_final_array[order_num,:] = poly_soln_order
+            if order_precision is not None:
+                order_precisions.append(order_precision[0])
+                num_detected_peaks.append(order_precision[1])
+            wavelengths_and_pixels[order_num] = order_wls_and_pixels
 
-            order_flux = cal_flux[order_num,:]
-            rough_wls_order = rough_wls[order_num,:]
-            n_pixels = len(order_flux)
+        # for lamps and LFC, we can compute absolute precision across all orders
+        if self.cal_type != 'Etalon':
 
-            # find, clip, and compute precise wavelengths for peaks.
-            # this code snippet will only execute for Etalon and LFC frames.
-            if expected_peak_locs is None:
-                skip_orders_wls = None
-                if self.red_skip_orders and max(order_list) == 31:  # KPF max order for red chip (update if changed in KPF.cfg)
-                    skip_orders_wls = np.fromstring(self.red_skip_orders, dtype=int, sep=',')
-                elif self.green_skip_orders and max(order_list) == 34:  # KPF max order for green chip (update if changed in KPF.cfg)
-                    skip_orders_wls = np.fromstring(self.green_skip_orders, dtype=int, sep=',')
-
-                if skip_orders_wls is not None:
-                    try:
-                        if order_num in skip_orders_wls:
-                            raise Exception(f'Order {order_num} is skipped in the config, defaulting to rough WLS')
-                    except Exception as e:
-                        print(e)
-                        poly_soln_final_array[order_num, :] = rough_wls_order
-                        wavelengths_and_pixels[order_num] = {
-                            'known_wavelengths_vac': rough_wls_order,
-                            'line_positions': []
-                        }
-                        continue
+            squared_resids = (np.array(order_precisions) * num_detected_peaks)**2
+            sum_of_squared_resids = np.sum(squared_resids)
+            overall_std_error = (
+                np.sqrt(sum_of_squared_resids) / 
+                np.sum(num_detected_peaks)
+            )
 
-                try:
-                    fitted_peak_pixels, detected_peak_pixels, \
-                        detected_peak_heights, gauss_coeffs = self.find_peaks_in_order(
-                        order_flux, plot_path=order_plt_path
-                    )
-                except TypeError:
-                    self.logger.warn('Not enough peaks found in order, defaulting to rough WLS')
-                    poly_soln_final_array[order_num,:] = rough_wls_order
-                    wavelengths_and_pixels[order_num] = {
-                        'known_wavelengths_vac': rough_wls_order, 
-                        'line_positions':[]
-                    }
-                    continue
+            print('\n\n\nOverall absolute precision (all orders): {:2.2f} cm/s\n\n\n'.format(
+                    overall_std_error
+                )
+            )
 
+        return poly_soln_final_array, wavelengths_and_pixels
 
-                if self.clip_peaks_toggle:
-                    good_peak_idx = self.clip_peaks(
-                        order_flux, fitted_peak_pixels, detected_peak_pixels,
-                        gauss_coeffs, detected_peak_heights, 
-                        clip_below_median=self.clip_below_median,
-                        plot_path=order_plt_path, print_update=print_update
-                    )
-                else:
-                    good_peak_idx = np.arange(len(detected_peak_pixels))
+    def fit_one_order(
+        self, order_num, cal_flux, order_list, rough_wls=None, comb_lines_angstrom=None,
+        expected_peak_locs=None, plt_path=None, print_update=False):
+        """
+        Performs wavelength calibration for one order. Orders are independent, 
+        so fit_many_orders() can run this in worker processes.
+        Args:
+            order_num (int): order to compute wls for
+            cal_flux, order_list, rough_wls, comb_lines_angstrom, expected_peak_locs, 
+            plt_path, print_update: see fit_many_orders().
+        Returns:
+            tuple of:
+                np.array of float: (N_pixels) derived wavelength solution of 
+                    the order, or None if not computed (Etalon frames)
+                dict: the peaks and wavelengths used for wavelength cal of the
+                    order, see fit_many_orders().
+                tuple: absolute precision of the order and number of peaks used,
+                    or None if not computed
+        """
+        if print_update:
+            print('\nRunning order # {}'.format(order_num))
 
-                if self.cal_type == 'LFC':
-                    wls, _ = self.mode_match(
-                        order_flux, fitted_peak_pixels, good_peak_idx, 
-                        rough_wls_order, comb_lines_angstrom, 
-                        print_update=print_update, plot_path=order_plt_path
-                    )
-                elif self.cal_type == 'Etalon':
+        if plt_path is not None:
+            order_plt_path = '{}/order_diagnostics/order{}'.format(
+                plt_path, order_num
+            )
+            if not os.path.isdir(order_plt_path):
+                os.makedirs(order_plt_path)
 
-                    assert comb_lines_angstrom is None, '`comb_lines_angstrom` \
-                        should not be set for Etalon frames.'
+            plt.figure(figsize=(20,10))
+            plt.plot(cal_flux[order_num,:], color='k', alpha=0.5)
+            plt.title('Order # {}'.format(order_num))
+            plt.xlabel('pixel')
+            plt.ylabel('flux')
+            plt.savefig(
+                '{}/order_spectrum.png'.format(order_plt_path), dpi=250
+            )
+            plt.close()
+        else:
+            order_plt_path = None
 
-                    wls = np.interp(
-                        fitted_peak_pixels[good_peak_idx], np.arange(n_pixels)[rough_wls_order>0], 
-                        rough_wls_order[rough_wls_order>0]
-                    )
+        order_flux = cal_flux[order_num,:]
+        rough_wls_order = rough_wls[order_num,:]
+        n_pixels = len(order_flux)
+        poly_soln_order = None
+        order_precision = None
+
+        # find, clip, and compute precise wavelengths for peaks.
+        # this code snippet will only execute for Etalon and LFC frames.
+        if expected_peak_locs is None:
+            skip_orders_wls = None
+            if self.red_skip_orders and max(order_list) == 31:  # KPF max order for red chip (update if changed in KPF.cfg)
+                skip_orders_wls = np.fromstring(self.red_skip_orders, dtype=int, sep=',')
+            elif self.green_skip_orders and max(order_list) == 34:  # KPF max order for green chip (update if changed in KPF.cfg)
+                skip_orders_wls = np.fromstring(self.green_skip_orders, dtype=int, sep=',')
+
+            if skip_orders_wls is not None:
+                try:
+                    if order_num in skip_orders_wls:
+                        raise Exception(f'Order {order_num} is skipped in the config, defaulting to rough WLS')
+                except Exception as e:
+                    print(e)
+                    return rough_wls_order, {
+                        'known_wavelengths_vac': rough_wls_order,
+                        'line_positions': []
+                    }, None
+
+            try:
+                fitted_peak_pixels, detected_peak_pixels, \
+                    detected_peak_heights, gauss_coeffs = self.find_peaks_in_order(
+                    order_flux, plot_path=order_plt_path
+                )
+            except TypeError:
+                self.logger.warn('Not enough peaks found in order, defaulting to rough WLS')
+                return rough_wls_order, {
+                    'known_wavelengths_vac': rough_wls_order, 
+                    'line_positions':[]
+                }, None
+
+
+            if self.clip_peaks_toggle:
+                good_peak_idx = self.clip_peaks(
+                    order_flux, fitted_peak_pixels, detected_peak_pixels,
+                    gauss_coeffs, detected_peak_heights, 
+                    clip_below_median=self.clip_below_median,
+                    plot_path=order_plt_path, print_update=print_update
+                )
+            else:
+                good_peak_idx = np.arange(len(detected_peak_pixels))
 
-                fitted_peak_pixels = fitted_peak_pixels[good_peak_idx]
+            if self.cal_type == 'LFC':
+                wls, _ = self.mode_match(
+                    order_flux, fitted_peak_pixels, good_peak_idx, 
+                    rough_wls_order, comb_lines_angstrom, 
+                    print_update=print_update, plot_path=order_plt_path
+                )
+            elif self.cal_type == 'Etalon':
 
-            # use expected peak locations to compute updated precise wavelengths
-            # for each pixel
-            else:
+                assert comb_lines_angstrom is None, '`comb_lines_angstrom` \
+                    should not be set for Etalon frames.'
 
-                if order_plt_path is not None:
-                    plot_toggle = True
-                else:
-                    plot_toggle = False
-
-                line_wavelengths = expected_peak_locs[order_num]['known_wavelengths_vac']
-                line_pixels_expected = expected_peak_locs[order_num]['line_positions']
-
-                sorted_indices = np.argsort(line_pixels_expected)
-                line_wavelengths = line_wavelengths[sorted_indices]
-                line_pixels_expected = line_pixels_expected[sorted_indices]
-
-                line_wavelengths = np.array([
-                    line_wavelengths[i] for i in 
-                    np.arange(1, len(line_pixels_expected)) if 
-                    line_pixels_expected[i] != line_pixels_expected[i-1]
-                ])
-                line_pixels_expected = np.array([
-                    line_pixels_expected[i] for i in 
-                    np.arange(1, len(line_pixels_expected)) if 
-                    line_pixels_expected[i] != line_pixels_expected[i-1]
-                ])
-                wls, gauss_coeffs = self.line_match(
-                    order_flux, line_wavelengths, line_pixels_expected, 
-                    plot_toggle, order_plt_path
+                wls = np.interp(
+                    fitted_peak_pixels[good_peak_idx], np.arange(n_pixels)[rough_wls_order>0], 
+                    rough_wls_order[rough_wls_order>0]
                 )
 
-                fitted_peak_pixels = gauss_coeffs[1,:]
+            fitted_peak_pixels = fitted_peak_pixels[good_peak_idx]
 
-            # if we don't have an etalon frame, we won't use drift to 
-            # calculate the wls
-            if self.cal_type != 'Etalon':
+        # use expected peak locations to compute updated precise wavelengths
+        # for each pixel
+        else:
 
-                if expected_peak_locs is None:
-                    peak_heights = detected_peak_heights[good_peak_idx]
-                else:
-                    peak_heights = fitted_peak_pixels
+            if order_plt_path is not None:
+                plot_toggle = True
+            else:
+                plot_toggle = False
+
+            line_wavelengths = expected_peak_locs[order_num]['known_wavelengths_vac']
+            line_pixels_expected = expected_peak_locs[order_num]['line_positions']
+
+            sorted_indices = np.argsort(line_pixels_expected)
+            line_wavelengths = line_wavelengths[sorted_indices]
+            line_pixels_expected = line_pixels_expected[sorted_indices]
+
+            line_wavelengths = np.array([
+                line_wavelengths[i] for i in 
+                np.arange(1, len(line_pixels_expected)) if 
+                line_pixels_expected[i] != line_pixels_expected[i-1]
+            ])
+            line_pixels_expected = np.array([
+                line_pixels_expected[i] for i in 
+                np.arange(1, len(line_pixels_expected)) if 
+                line_pixels_expected[i] != line_pixels_expected[i-1]
+            ])
+            wls, gauss_coeffs = self.line_match(
+                order_flux, line_wavelengths, line_pixels_expected, 
+                plot_toggle, order_plt_path
+            )
 
-                # calculate the wavelength solution for the order
-                polynomial_wls, leg_out = self.fit_polynomial(
-                    wls, n_pixels, fitted_peak_pixels, peak_heights=peak_heights,
-                    plot_path=order_plt_path, fit_iterations=self.fit_iterations,
-                    sigma_clip=self.sigma_clip
-                )
+            fitted_peak_pixels = gauss_coeffs[1,:]
 
-                poly_soln_final_array[order_num,:] = polynomial_wls
+        # if we don't have an etalon frame, we won't use drift to 
+        # calculate the wls
+        if self.cal_type != 'Etalon':
 
-                if plt_path is not None:
-                    fig, ax = plt.subplots(2, 1, figsize=(12,5))
+            if expected_peak_locs is None:
+                peak_heights = detected_peak_heights[good_peak_idx]
+            else:
+                peak_heights = fitted_peak_pixels
 
-                    ax[0].set_title('Precise WLS - Rough WLS')
-                    ax[0].plot(
-                        np.arange(n_pixels), 
-                        leg_out(np.arange(n_pixels)) - rough_wls_order, 
-                        color='k'
-                    )
-                    ax[0].set_ylabel('[$\\rm \AA$]')
+            # calculate the wavelength solution for the order
+            polynomial_wls, leg_out = self.fit_polynomial(
+                wls, n_pixels, fitted_peak_pixels, peak_heights=peak_heights,
+                plot_path=order_plt_path, fit_iterations=self.fit_iterations,
+                sigma_clip=self.sigma_clip
+            )
 
-                    pixel_sizes = rough_wls_order[1:] - rough_wls_order[:-1]
-                    ax[1].plot(
-                        np.arange(n_pixels - 1), 
-                        (leg_out(np.arange(n_pixels - 1)) - rough_wls_order[:-1]) / 
-                            pixel_sizes, 
-                        color='k'
-                    )
+            poly_soln_order = polynomial_wls
 
-                    ax[1].set_ylabel('[pixels]')
-                    ax[1].set_xlabel('pixel')
-                    plt.tight_layout()
-                    plt.savefig(
-                        '{}/precise_vs_rough.png'.format(order_plt_path),
-                        dpi=250
-                    )
-                    plt.close()
+            if plt_path is not None:
+                fig, ax = plt.subplots(2, 1, figsize=(12,5))
 
-                # compute various RV precision values for order
-                rel_precision, abs_precision = self.calculate_rv_precision(
-                    fitted_peak_pixels, wls, leg_out, rough_wls_order, plot_path=order_plt_path, 
-                    print_update=print_update
+                ax[0].set_title('Precise WLS - Rough WLS')
+                ax[0].plot(
+                    np.arange(n_pixels), 
+                    leg_out(np.arange(n_pixels)) - rough_wls_order, 
+                    color='k'
                 )
+                ax[0].set_ylabel('[$\\rm \AA$]')
 
-                order_precisions.append(abs_precision)
-                num_detected_peaks.append(len(fitted_peak_pixels))
+                pixel_sizes = rough_wls_order[1:] - rough_wls_order[:-1]
+                ax[1].plot(
+                    np.arange(n_pixels - 1), 
+                    (leg_out(np.arange(n_pixels - 1)) - rough_wls_order[:-1]) / 
+                        pixel_sizes, 
+                    color='k'
+                )
 
-        
-            # compute drift, and use this to update the wavelength solution
-            else:
-                pass
+                ax[1].set_ylabel('[pixels]')
+                ax[1].set_xlabel('pixel')
+                plt.tight_layout()
+                plt.savefig(
+                    '{}/precise_vs_rough.png'.format(order_plt_path),
+                    dpi=250
+                )
+                plt.close()
 
-            wavelengths_and_pixels[order_num] = {
-                'known_wavelengths_vac':wls, 
-                'line_positions':fitted_peak_pixels
-            }
+            # compute various RV precision values for order
+            rel_precision, abs_precision = self.calculate_rv_precision(
+                fitted_peak_pixels, wls, leg_out, rough_wls_order, plot_path=order_plt_path, 
+                print_update=print_update
+            )
 
-        # for lamps and LFC, we can compute absolute precision across all orders
-        if self.cal_type != 'Etalon':
+            order_precision = (abs_precision, len(fitted_peak_pixels))
 
-            squared_resids = (np.array(order_precisions) * num_detected_peaks)**2
-            sum_of_squared_resids = np.sum(squared_resids)
-            overall_std_error = (
-                np.sqrt(sum_of_squared_resids) / 
-                np.sum(num_detected_peaks)
-            )
+    
+        # compute drift, and use this to update the wavelength solution
+        else:
+            pass
 
-            print('\n\n\nOverall absolute precision (all orders): {:2.2f} cm/s\n\n\n'.format(
-                    overall_std_error
-                )
-            )
+        return poly_soln_order, {
+            'known_wavelengths_vac':wls, 
+            'line_positions':fitted_peak_pixels
+        }, order_precision
 
-        return poly_soln_final_array, wavelengths_and_pixels
 
     def remove_orders(self,step=1):
         """Removes bad orders from order list if between min and max orders to test.
@@ -594,15 +632,19 @@ class WaveCalibration:
 
         # fit peaks with Gaussian to get accurate position
         fitted_peaks = detected_peaks.astype(float)
-        gauss_coeffs = np.empty((4, len(detected_peaks)))
+        if len(detected_peaks) == 0:
+            return fitted_peaks, detected_peaks, peak_heights, np.empty((4, 0))
         width = np.mean(np.diff(detected_peaks)) // 2
 
-        for j, p in enumerate(detected_peaks):
-            idx = p + np.arange(-width, width + 1, 1)
-            idx = np.clip(idx, 0, len(c) - 1).astype(int)
-            coef = self.fit_gaussian(np.arange(len(idx)), c[idx])
-            gauss_coeffs[:,j] = coef
-            fitted_peaks[j] = coef[1] + p - width
+        # fit all peaks at once, each over the pixels within width of the peak
+        idx = detected_peaks[:, np.newaxis] + np.arange(-width, width + 1, 1)
+        idx = np.clip(idx, 0, len(c) - 1).astype(int)
+        peak_flux = c[idx]
+        gauss_coeffs = self.fit_gaussians(
+            np.broadcast_to(np.arange(idx.shape[1]), idx.shape),
+            np.ma.getdata(peak_flux), ~np.ma.getmaskarray(peak_flux)
+        )
+        fitted_peaks = gauss_coeffs[1] + detected_peaks - width
 
         return fitted_peaks, detected_peaks, peak_heights, gauss_coeffs
         
@@ -826,37 +868,27 @@ class WaveCalibration:
         num_input_lines = len(linelist)  
         num_pixels = len(flux)
 
-        missed_lines = 0
-        coefs = np.zeros((4,num_input_lines))
-        for i in np.arange(num_input_lines):
-            line_location = line_pixels_expected[i]
-            peak_pixel = np.floor(line_location).astype(int)
+        coefs = np.full((4,num_input_lines), np.nan)
+        peak_pixel = np.floor(np.asarray(line_pixels_expected, dtype=float)).astype(int)
 
-            # don't fit saturated lines
-            if peak_pixel < len(flux) and flux[peak_pixel] <= 1e6:
-                if peak_pixel < gaussian_fit_width:
-                    first_fit_pixel = 0
-                else:
-                    first_fit_pixel = peak_pixel - gaussian_fit_width
-                
-                if peak_pixel + gaussian_fit_width > num_pixels:
-                    last_fit_pixel = num_pixels
-                else:
-                    last_fit_pixel = peak_pixel + gaussian_fit_width
+        # don't fit saturated lines
+        to_fit = peak_pixel < num_pixels
+        to_fit[to_fit] = np.ma.filled(flux[peak_pixel[to_fit]] <= 1e6, False)
 
-                # fit gaussian to matched peak location
-                coefs[:,i] = self.fit_gaussian(
-                    np.arange(first_fit_pixel,last_fit_pixel),
-                    flux[first_fit_pixel:last_fit_pixel]
-                )
+        # fit gaussians to all matched peak locations at once, over the pixels
+        # from peak_pixel - gaussian_fit_width to peak_pixel + gaussian_fit_width - 1
+        first_fit_pixel = np.maximum(peak_pixel[to_fit] - gaussian_fit_width, 0)
+        last_fit_pixel = np.minimum(peak_pixel[to_fit] + gaussian_fit_width, num_pixels)
+        fit_pixels = first_fit_pixel[:, np.newaxis] + np.arange(2 * gaussian_fit_width)
+        fit_valid = fit_pixels < last_fit_pixel[:, np.newaxis]
+        fit_pixels = np.minimum(fit_pixels, num_pixels - 1)
+        fit_flux = flux[fit_pixels]
+        fit_valid &= ~np.ma.getmaskarray(fit_flux)
+        coefs[:, to_fit] = self.fit_gaussians(fit_pixels, np.ma.getdata(fit_flux), fit_valid)
 
-                amp = coefs[0,i]
-                if amp < 0:
-                    missed_lines += 1
-                    coefs[:,i] = np.nan
-            else:
-                coefs[:,i] = np.nan
-                missed_lines += 1
+        # lines with a negative amplitude are not fit
+        coefs[:, ~(coefs[0,:] >= 0)] = np.nan
+        missed_lines = np.count_nonzero(~np.isfinite(coefs[0,:]))
 
         linelist = linelist[np.isfinite(coefs[0,:])]
         coefs = coefs[:, np.isfinite(coefs[0,:])]
@@ -1186,6 +1218,116 @@ class WaveCalibration:
 
         return popt  
           
+    def fit_gaussians(self, x, y, valid=None, max_iter=1000, tol=1.49012e-08, min_points=4):
+        """
+        Fits continuous Gaussians (see integrate_gaussian()) to many peaks at once. 
+        All peaks are solved simultaneously by a Levenberg-Marquardt least-squares 
+        fit vectorized over the peaks, using the analytic Jacobian of the integrated 
+        Gaussian. Each peak is fit as by fit_gaussian(): same initial guess, and
+        tolerances on the cost and on the parameters as those of scipy.curve_fit.
+
+        Args:
+            x (np.array): x data of each peak, of size (n_peaks, window)
+            y (np.array): y data of each peak, of size (n_peaks, window)
+            valid (np.array): (optional) boolean array of size (n_peaks, window), False 
+                for points not to fit, e.g. masked or padding of peaks with a shorter 
+                window. Defaults to None, which uses all points.
+            max_iter (int): maximum number of iterations
+            tol (float): relative tolerance on the cost and on the parameters
+            min_points (int): peaks with fewer valid points are not fit and their 
+                parameters are NaN
+        Returns:
+            np.array: array of size (4, n_peaks) containing best-fit 
+                parameters [a, mu, sigma, const] for each peak
+        """
+        x = np.array(x, dtype=float, ndmin=2)
+        y = np.array(y, dtype=float, ndmin=2)
+        valid = np.ones(y.shape, dtype=bool) if valid is None else np.array(valid, dtype=bool, ndmin=2)
+        n_peaks, window = y.shape
+        coefs = np.full((4, n_peaks), np.nan)
+        n_valid = np.count_nonzero(valid, axis=1)
+        fit = n_valid >= min_points
+        if not np.any(fit):
+            return coefs
+
+        # move the valid points of each peak first, in order, like np.ma.compressed()
+        order = np.argsort(~valid[fit], axis=1, kind='stable')
+        x = np.take_along_axis(x[fit], order, axis=1)
+        y = np.take_along_axis(y[fit], order, axis=1)
+        w = np.take_along_axis(valid[fit], order, axis=1).astype(float)
+        n_valid = n_valid[fit]
+
+        # initial guess: highest point in the central half of the valid points
+        pos = np.arange(window)
+        central = (pos >= (n_valid // 4)[:, np.newaxis]) & (pos < (n_valid * 3 // 4)[:, np.newaxis])
+        i_max = np.argmax(np.where(central, y, -np.inf), axis=1)[:, np.newaxis]
+        params = np.stack([
+            np.take_along_axis(y, i_max, axis=1)[:, 0],
+            np.take_along_axis(x, i_max, axis=1)[:, 0],
+            np.ones(len(y)),
+            np.min(np.where(w > 0, y, np.inf), axis=1)
+        ], axis=1)
+
+        int_width = 0.5
+        def residuals_and_jacobian(p, xs, ys):
+            a, mu, sig, const = (p[:, k:k+1] for k in range(4))
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                u_hi = (xs - mu + int_width) / (np.sqrt(2) * sig)
+                u_lo = (xs - mu - int_width) / (np.sqrt(2) * sig)
+                g_hi = np.exp(-u_hi ** 2)
+                g_lo = np.exp(-u_lo ** 2)
+                profile = 0.5 * (erf(u_hi) - erf(u_lo))
+                jac = np.empty(xs.shape + (4,))
+                jac[..., 0] = profile
+                jac[..., 1] = a / (np.sqrt(2 * np.pi) * sig) * (g_lo - g_hi)
+                jac[..., 2] = a / (np.sqrt(np.pi) * sig) * (u_lo * g_lo - u_hi * g_hi)
+                jac[..., 3] = 2 * int_width
+                residuals = ys - (a * profile + const * 2 * int_width)
+            return residuals, jac
+
+        residuals, jac = residuals_and_jacobian(params, x, y)
+        cost = np.sum(w * residuals ** 2, axis=1)
+        damping = np.full(len(y), 1e-3)
+        active = np.isfinite(cost)
+        diag = np.arange(4)
+        # damping scale of each parameter, the largest diagonal of J^T J so far as in MINPACK
+        scale = np.full((len(y), 4), 1e-12)
+        for _ in range(max_iter):
+            rows = np.flatnonzero(active)
+            if len(rows) == 0:
+                break
+            jac_w = jac[rows] * w[rows, :, np.newaxis]
+            jtj = np.einsum('nki,nkj->nij', jac_w, jac[rows])
+            jtr = np.einsum('nki,nk->ni', jac_w, residuals[rows])
+            scale[rows] = np.fmax(scale[rows], jtj[:, diag, diag])
+            lhs = jtj.copy()
+            lhs[:, diag, diag] += damping[rows, np.newaxis] * scale[rows]
+            try:
+                step = np.linalg.solve(lhs, jtr[..., np.newaxis])[..., 0]
+            except np.linalg.LinAlgError:
+                step = np.einsum('nij,nj->ni', np.linalg.pinv(lhs), jtr)
+            new_params = params[rows] + step
+            new_residuals, new_jac = residuals_and_jacobian(new_params, x[rows], y[rows])
+            new_cost = np.sum(w[rows] * new_residuals ** 2, axis=1)
+
+            better = new_cost < cost[rows]
+            converged = better & (
+                (cost[rows] - new_cost <= tol * cost[rows]) |
+                np.all(np.abs(step) <= tol * (np.abs(params[rows]) + tol), axis=1)
+            )
+            accepted = rows[better]
+            params[accepted] = new_params[better]
+            residuals[accepted] = new_residuals[better]
+            jac[accepted] = new_jac[better]
+            cost[accepted] = new_cost[better]
+            damping[rows] = np.where(better, damping[rows] / 10, damping[rows] * 10)
+            active[rows[converged]] = False
+            # no step reduces the cost any more
+            active[rows[damping[rows] > 1e16]] = False
+
+        coefs[:, fit] = params.T
+        return coefs
+
     def fit_polynomial(self, wls, n_pixels, fitted_peak_pixels, fit_iterations=5, sigma_clip=2.1, peak_heights=None, plot_path=None):
         """
         Given precise wavelengths of detected LFC order_flux lines, fits a 
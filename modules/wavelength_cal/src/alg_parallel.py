@@ -0,0 +1,65 @@
+from concurrent.futures import ProcessPoolExecutor
+
+# WaveCalibration instance and per-order inputs of each worker process
+_worker_wavecal = None
+_worker_order_args = None
+_worker_print_update = False
+
+
+def _init_worker(wavecal, order_args, print_update):
+    global _worker_wavecal, _worker_order_args, _worker_print_update
+    _worker_wavecal = wavecal
+    _worker_order_args = order_args
+    _worker_print_update = print_update
+
+
+def _fit_order(order_num):
+    return _worker_wavecal.fit_one_order(order_num, *_worker_order_args, plt_path=None,
+                                         print_update=_worker_print_update)
+
+
+class WaveCalibrationParallel:
+    """Process pool for fitting the wavelength solutions of the orders of one frame in parallel.
+
+    This module defines class 'WaveCalibrationParallel' which starts a pool of worker processes, each receiving
+    a copy of the `WaveCalibration` instance and of the calibration flux, rough wavelength solution and line
+    lists of the frame once. The fit of each order is submitted to the pool and results in the same output as
+    :func:`~alg.WaveCalibration.fit_one_order()`. No diagnostic plots are made by the workers.
+
+    Args:
+        wavecal (WaveCalibration): Instance of WaveCalibration with the settings of the fit.
+        order_args (tuple): cal_flux, order_list, rough_wls, comb_lines_angstrom and expected_peak_locs, as
+            passed to :func:`~alg.WaveCalibration.fit_many_orders()`.
+        n_workers (int): Total worker processes.
+        print_update (bool): Whether the workers print updates.
+
+    Attributes:
+        executor (concurrent.futures.ProcessPoolExecutor): Pool of worker processes.
+    """
+
+    def __init__(self, wavecal, order_args, n_workers, print_update=False):
+        self.executor = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                            initargs=(wavecal, order_args, print_update))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def submit(self, order_num):
+        """Submit the fit of one order.
+
+        Args:
+            order_num (int): Order to compute the wavelength solution for.
+
+        Returns:
+            concurrent.futures.Future: Future of the result of :func:`~alg.WaveCalibration.fit_one_order()`
+            on the order.
+
+        """
+        return self.executor.submit(_fit_order, order_num)
+
+    def close(self):
+        """Shut down the worker processes."""
+        self.executor.shutdown(wait=True)
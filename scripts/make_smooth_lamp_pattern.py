@@ -9,13 +9,15 @@
 # 3-pixels high (along cross-dispersion dimension) is used for computing the clipped mean, with
 # 3-sigma, double-sided outlier rejection.  The kernel is centered on the pixel of interest.
 #
-# The implemented method is slow and takes many hours to complete.
+# The clipped mean is computed by SmoothLampPattern (modules/smooth_lamp_pattern), which is also run
+# by the SmoothLampPatternFramework primitive (recipes/smooth_lamp_pattern.recipe).
 ####################################################################################################################
 
 import numpy as np
-import numpy.ma as ma
 from astropy.io import fits
 
+from modules.smooth_lamp_pattern.src.alg import SmoothLampPattern
+
 #fname_order_mask = "kpf_20230716_order_mask_untrimmed_made20230719.fits"
 fname_stack_average = "kpf_20230628_master_flat.fits"
 fname_smooth_lamp = "kpf_20230628_smooth_lamp_made20230720_float32.fits"
@@ -29,6 +31,7 @@ hdu_list = []
 x_window = 15          # Approximately along dispersion dimension.
 y_window = 3           # Approximately along cross-dispersion dimension.
 n_sigma = 3            # 3-sigma, double-sided outlier rejection
+max_ram_mb = 4000      # Approximate peak RAM in MB for smoothing a band of image rows
 
 empty_data = None
 hdu_list.append(fits.PrimaryHDU(empty_data))
@@ -43,49 +46,7 @@ for ffi in ffis:
     data = data_stack_average
     print("ffi,data[13,2077],data[12,2077],data[11,2077] = ",ffi,data[13,2077],data[12,2077],data[11,2077])
 
-    x_hwin = int((x_window - 1) / 2)
-    y_hwin = int((y_window - 1) / 2)
-    ny = 4080
-    nx = 4080
-    smooth_image = np.zeros(shape=(ny, nx))
-    smooth_image[:] = np.nan                                              # Initialize 2-D array of NaNs
-    for i in range(0,ny):
-        for j in range(0,nx):
-
-            if np.isnan(data[i, j]): continue
-
-            data_list = []
-            for ii in range(i - y_hwin, i + y_hwin + 1):
-                if ((ii < 0) or (ii >= ny)): continue
-                for jj in range(j - x_hwin, j + x_hwin + 1):
-                    if ((jj < 0) or (jj >= ny)): continue
-
-                    datum = data[ii, jj]
-
-                    #print(datum)
-
-                    if not np.isnan(datum):
-                        data_list.append(datum)
-
-            if len(data_list) > 0:
-
-                a = np.array(data_list)
-
-                med = np.median(a)
-                p16 = np.percentile(a,16)
-                p84 = np.percentile(a,84)
-                sigma = 0.5 * (p84 - p16)
-                mdmsg = med - n_sigma * sigma
-                b = np.less(a,mdmsg)
-                mdpsg = med + n_sigma * sigma
-                c = np.greater(a,mdpsg)
-                mask = b | c
-                mx = ma.masked_array(a, mask)
-                avg = ma.getdata(mx.mean())
-
-                smooth_image[i, j] = avg.item()
-                if smooth_image[i, j] <= 0.0:           # Avoid division by zero and no negative values.
-                    smooth_image[i, j] = 1.0
+    smooth_image = SmoothLampPattern(data,x_window,y_window,n_sigma,max_ram_mb=max_ram_mb).compute()
 
     hdu = fits.ImageHDU(smooth_image.astype(np.float32))
     hdu.header['EXTNAME'] = ffi
@@ -1,4 +1,4 @@
-from modules.Utils.kpf_fits import FitsHeaders
+from modules.Utils.kpf_fits import FitsHeaders, FitsHeaderIndex
 
 fits_files_path = '/data'
 files_in_dir = fits_files_path+'/KP*.fits'
@@ -35,6 +35,24 @@ def test_match_headers_string_lower():
         print(i,input_file)
         i += 1
 
+def test_header_index():
+
+    """
+    Select bias files twice, with the second selection answered from the header index.
+    """
+
+    fh = FitsHeaders(files_in_dir, 'IMTYPE', 'Bias')
+    bias_files,bias_objects = fh.get_good_biases()
+
+    for input_file in fh.input_fits_files:
+        assert input_file in FitsHeaderIndex.memory_index
+
+    fh2 = FitsHeaders(files_in_dir, 'IMTYPE', 'Bias')
+    bias_files2,bias_objects2 = fh2.get_good_biases()
+
+    assert bias_files == bias_files2
+    assert bias_objects == bias_objects2
+
 
 if __name__ == '__main__':
 
@@ -42,3 +60,4 @@ if __name__ == '__main__':
 
     test_match_headers_float_le()
     test_match_headers_string_lower()
+    test_header_index()
@@ -1,5 +1,5 @@
 import numpy as np
-from modules.Utils.frame_stacker import FrameStacker
+from modules.Utils.frame_stacker import FrameStacker, get_clip_corr_factor
 
 nsigma = 2.5
 
@@ -25,9 +25,47 @@ def test_compute():
     print("frame_cnt =",frame_cnt)
     print("frame_unc =",frame_unc)
 
+def test_compute_row_bands():
+
+    """
+    Test compute method of FrameStacker class with the stack processed in bands of rows.
+    """
+
+    print(test_compute_row_bands.__doc__)
+
+    fs = FrameStacker(a,nsigma)
+    frame_avg,frame_var,frame_cnt,frame_unc = fs.compute()
+
+    fs_bands = FrameStacker(list(a),nsigma,max_ram_mb=1.0e-6)
+    assert fs_bands.get_rows_per_band() == 1
+    band_avg,band_var,band_cnt,band_unc = fs_bands.compute()
+
+    assert np.array_equal(frame_avg,band_avg)
+    assert np.array_equal(frame_var,band_var)
+    assert np.array_equal(frame_cnt,band_cnt)
+    assert np.array_equal(frame_unc,band_unc)
+
+def test_clip_corr_factor():
+
+    """
+    Test that the analytic clip correction factor is reproducible and matches the Monte Carlo estimate.
+    """
+
+    print(test_clip_corr_factor.__doc__)
+
+    for n_sigma in [2.1,2.5]:
+        cf = get_clip_corr_factor(n_sigma)
+        cf_mc = get_clip_corr_factor(n_sigma,'monte_carlo')
+        print("n_sigma,cf,cf_mc =",n_sigma,cf,cf_mc)
+        assert cf == FrameStacker(a,n_sigma).compute_clip_corr()
+        assert cf_mc == get_clip_corr_factor(n_sigma,'monte_carlo')
+        assert abs(cf - cf_mc) < 5.0e-3 * cf
+
 if __name__ == '__main__':
 
 
     print("a=",a)
 
     test_compute()
+    test_compute_row_bands()
+    test_clip_corr_factor()
@@ -0,0 +1,57 @@
+import numpy as np
+import numpy.ma as ma
+from modules.smooth_lamp_pattern.src.alg import SmoothLampPattern
+
+x_window = 15
+y_window = 3
+n_sigma = 3
+
+rng = np.random.default_rng(0)
+data = rng.normal(100.0, 10.0, (20, 40))
+data[rng.random(data.shape) < 0.05] = np.nan    # Pixels outside the orderlets.
+data[5][5] = 1.0e5                               # Stick in an outlier.
+data[10][:] = -5.0                               # Negative clipped means are reset to unity.
+
+
+def smooth_pixel_by_pixel(data):
+
+    """
+    Sliding-window clipped mean computed one pixel at a time, as by the original script.
+    """
+
+    x_hwin = int((x_window - 1) / 2)
+    y_hwin = int((y_window - 1) / 2)
+    ny,nx = np.shape(data)
+    smooth_image = np.full((ny,nx),np.nan)
+    for i in range(0,ny):
+        for j in range(0,nx):
+            if np.isnan(data[i, j]): continue
+            window = data[max(i - y_hwin,0):i + y_hwin + 1,max(j - x_hwin,0):j + x_hwin + 1]
+            a = window[~np.isnan(window)]
+            med = np.median(a)
+            sigma = 0.5 * (np.percentile(a,84) - np.percentile(a,16))
+            mask = (a < med - n_sigma * sigma) | (a > med + n_sigma * sigma)
+            avg = ma.getdata(ma.masked_array(a, mask).mean()).item()
+            smooth_image[i, j] = avg if avg > 0.0 else 1.0
+    return smooth_image
+
+
+def test_compute():
+
+    """
+    Test compute method of SmoothLampPattern class against the pixel-by-pixel clipped mean.
+    """
+
+    print(test_compute.__doc__)
+
+    expected = smooth_pixel_by_pixel(data)
+
+    slp = SmoothLampPattern(data,x_window,y_window,n_sigma)
+    smooth_image = slp.compute()
+
+    assert np.array_equal(np.isnan(smooth_image),np.isnan(data))
+    assert np.allclose(smooth_image,expected,rtol=1.0e-12,equal_nan=True)
+
+    slp_bands = SmoothLampPattern(data,x_window,y_window,n_sigma,max_ram_mb=1.0e-6)
+    assert slp_bands.get_rows_per_band() == 1
+    assert np.array_equal(slp_bands.compute(),smooth_image,equal_nan=True)
@@ -42,5 +42,52 @@ barycentric_correction_neid_config = "examples/default_bc.cfg"
 def test_barycentric_correction_neid():
     recipe_test(barycentric_correction_neid_recipe, barycentric_correction_neid_config)
 
+
+def test_bc_corr_cache(monkeypatch, tmp_path):
+    import numpy as np
+    from modules.barycentric_correction.src.alg_barycentric_corr import BarycentricCorrectionAlg
+
+    calls = []
+    def get_bc_corr_jds(obs_config, jds):
+        calls.append(np.array(jds))
+        return np.asarray(jds) * 10.
+    monkeypatch.setattr(BarycentricCorrectionAlg, 'get_bc_corr_jds', staticmethod(get_bc_corr_jds))
+    monkeypatch.setattr(BarycentricCorrectionAlg, 'bc_cache', {})
+
+    obs_config = {BarycentricCorrectionAlg.RA: 26.0, BarycentricCorrectionAlg.DEC: -15.9,
+                  BarycentricCorrectionAlg.PMRA: -1721.05, BarycentricCorrectionAlg.PMDEC: 854.16,
+                  BarycentricCorrectionAlg.PX: 273.96, BarycentricCorrectionAlg.EPOCH: 2451545.0,
+                  BarycentricCorrectionAlg.LAT: 31.96, BarycentricCorrectionAlg.LON: -111.6,
+                  BarycentricCorrectionAlg.ALT: 2096.0, BarycentricCorrectionAlg.RV: -16.68,
+                  BarycentricCorrectionAlg.SPEC: 'NEID', BarycentricCorrectionAlg.STARNAME: 'Tau Ceti'}
+    jds = 2459000.5 + np.arange(3)
+
+    bc = BarycentricCorrectionAlg.get_bc_corr_cached(obs_config, jds, str(tmp_path))
+    assert np.allclose(bc, jds * 10.) and len(calls) == 1
+
+    # cache hit, in the process and from the cache file
+    BarycentricCorrectionAlg.get_bc_corr_cached(obs_config, jds[::-1], str(tmp_path))
+    BarycentricCorrectionAlg.bc_cache.clear()
+    assert np.allclose(BarycentricCorrectionAlg.get_bc_corr_cached(obs_config, jds, str(tmp_path)), jds * 10.)
+    assert len(calls) == 1
+
+    # only the missing days are computed, in one call
+    more_jds = 2459000.5 + np.arange(6)
+    assert np.allclose(BarycentricCorrectionAlg.get_bc_corr_cached(obs_config, more_jds, str(tmp_path)), more_jds * 10.)
+    assert len(calls) == 2 and np.array_equal(calls[1], more_jds[3:])
+
+    # the rows of a partially written cache file are recomputed
+    cache_file = tmp_path / ('bc_cache_' + BarycentricCorrectionAlg.get_bc_cache_key(obs_config) + '.csv')
+    cache_file.write_text(cache_file.read_text().rsplit(',', 1)[0])
+    BarycentricCorrectionAlg.bc_cache.clear()
+    BarycentricCorrectionAlg.get_bc_corr_cached(obs_config, more_jds, str(tmp_path))
+    assert len(calls) == 3 and np.array_equal(calls[2], more_jds[5:])
+
+    # the cache key depends on the star and observatory parameters
+    key = BarycentricCorrectionAlg.get_bc_cache_key(obs_config)
+    for k in [BarycentricCorrectionAlg.PMRA, BarycentricCorrectionAlg.LAT, BarycentricCorrectionAlg.RV]:
+        assert BarycentricCorrectionAlg.get_bc_cache_key(dict(obs_config, **{k: obs_config[k] + 1.})) != key
+    assert BarycentricCorrectionAlg.get_bc_cache_key(dict(obs_config, starname='Sun')) != key
+
 if __name__ == '__main__':
     test_barycentric_correction_neid()
\ No newline at end of file
@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+from math import ceil
+from scipy import linalg
+from modules.continuum_normalization.src.alg import ContNormAlgg
+
+rng = np.random.default_rng(0)
+
+
+def running_median_pixel_by_pixel(flux, window):
+
+    """
+    Running median computed one pixel at a time, as by the original RunningMedian.
+    """
+
+    flux_median = np.ones_like(flux)
+    for i in range(len(flux)):
+        flux_median[i] = np.nanmedian(flux[np.max([0,i-window]):np.min([len(flux),i+window])])
+    return flux_median
+
+
+def running_std_pixel_by_pixel(flux, window):
+
+    """
+    Running standard deviation computed one pixel at a time, as by the original RunningSTD.
+    """
+
+    flux_std = np.ones_like(flux)
+    for i in range(len(flux)):
+        flux_std[i] = np.nanstd(flux[np.max([0,i-window]):np.min([len(flux),i+window])])
+    return flux_std
+
+
+def lowess_pixel_by_pixel(x, y, d, n_iter):
+
+    """
+    Lowess smoother with the full n x n weight matrix, fitted one point at a time, as by the original lowess_ag.
+    """
+
+    n = len(x)
+    r = int(ceil(d * n))
+    h = [np.sort(np.abs(x - x[i]))[r] for i in range(n)]
+    w = np.clip(np.abs((x[:, None] - x[None, :]) / h), 0.0, 1.0)
+    w = (1 - w ** 3) ** 3
+    yest = np.zeros(n)
+    delta = np.ones(n)
+    for iteration in range(n_iter):
+        for i in range(n):
+            weights = delta * w[:, i]
+            b = np.array([np.sum(weights * y), np.sum(weights * y * x)])
+            A = np.array([[np.sum(weights), np.sum(weights * x)],
+                          [np.sum(weights * x), np.sum(weights * x * x)]])
+            beta = linalg.solve(A, b)
+            yest[i] = beta[0] + beta[1] * x[i]
+
+        residuals = y - yest
+        s = np.median(np.abs(residuals))
+        delta = np.clip(residuals / (6.0 * s), -1, 1)
+        delta = (1 - delta ** 2) ** 2
+
+    return yest
+
+
+def test_running_median_std():
+
+    """
+    Test RunningMedian and RunningSTD of ContNormAlgg class against the pixel-by-pixel loops.
+    """
+
+    print(test_running_median_std.__doc__)
+
+    cn = ContNormAlgg()
+    for n in [10, 100, 1000]:
+        flux = rng.normal(1.0, 0.1, n)
+        flux[rng.integers(0, n, n // 5)] = np.nan
+        flux[:3] = np.nan                        # NaN-padded edges.
+        flux[-3:] = np.nan
+
+        assert np.array_equal(cn.RunningMedian(flux), running_median_pixel_by_pixel(flux, cn.med_window),
+                              equal_nan=True)
+        assert np.allclose(cn.RunningSTD(flux), running_std_pixel_by_pixel(flux, cn.std_window),
+                           rtol=1.0e-12, atol=0.0, equal_nan=True)
+
+
+def test_lowess_ag():
+
+    """
+    Test lowess_ag of ContNormAlgg class against the full-matrix lowess, on sorted, unsorted and
+    duplicate x, with blocks smaller than the number of points.
+    """
+
+    print(test_lowess_ag.__doc__)
+
+    cn = ContNormAlgg()
+    cn.lowess_block = 7
+    for n in [50, 301]:
+        x_sets = {'sorted': np.sort(rng.uniform(0, 10, n)),
+                  'unsorted': rng.uniform(0, 10, n),
+                  'duplicate': rng.permutation(np.round(rng.uniform(0, 10, n), 1))}
+        for kind, x in x_sets.items():
+            y = np.sin(x) + rng.normal(0, 0.1, n)
+            expected = lowess_pixel_by_pixel(x, y, cn.d, cn.n_iter)
+            assert np.allclose(cn.lowess_ag(x, y), expected, rtol=0.0, atol=1.0e-9), kind
+
+
+def test_alpha_hull_upper():
+
+    """
+    Test alpha_hull_upper of ContNormAlgg class on spectra with hand-computed upper boundaries,
+    and check that no point lies inside the disc through neighbouring vertices of a random spectrum.
+    """
+
+    print(test_alpha_hull_upper.__doc__)
+
+    cn = ContNormAlgg()
+
+    # flat top: the disc touches every point
+    assert np.array_equal(cn.alpha_hull_upper(np.arange(11.0), np.zeros(11), 2.0), np.arange(11))
+    # the disc rolls over the dips
+    assert np.array_equal(cn.alpha_hull_upper(np.arange(5.0), np.array([0, -1, 0, -1, 0.0]), 10.0), [0, 2, 4])
+    # gap wider than 2*alpha: the disc drops onto the dip before the gap and the first point after it
+    x = np.array([0, 1, 2, 3, 20, 21, 22.0])
+    y = np.array([0, -1, 0, -1, 0, -1, 0.0])
+    assert np.array_equal(cn.alpha_hull_upper(x, y, 5.0), [0, 2, 3, 4, 6])
+    # duplicate wavelengths: only the upper point is a vertex
+    x = np.array([0, 1, 1, 2.0])
+    y = np.array([0, 0.5, 0.2, 0.0])
+    assert np.array_equal(cn.alpha_hull_upper(x, y, 10.0), [0, 1, 3])
+
+    x = np.sort(rng.uniform(0, 10, 500))
+    y = np.sin(x) + rng.normal(0, 0.1, 500)
+    radius = 0.5
+    vertices = cn.alpha_hull_upper(x, y, radius)
+    assert vertices[0] == 0 and vertices[-1] == 499 and np.all(np.diff(vertices) > 0)
+    for a, b in zip(vertices[:-1], vertices[1:]):
+        chord = np.array([x[b] - x[a], y[b] - y[a]])
+        d = np.hypot(*chord)
+        if d >= 2 * radius:
+            continue
+        # centre of the disc above the chord through both vertices
+        center = np.array([x[a], y[a]]) + chord / 2 + np.array([-chord[1], chord[0]]) / d * np.sqrt(radius ** 2 - d ** 2 / 4)
+        assert np.all(np.hypot(x - center[0], y - center[1]) > radius - 1.0e-9)
+
+
+def test_fast_AFS():
+
+    """
+    Test fast_AFS of ContNormAlgg class recovers the blaze of a synthetic spectrum with absorption lines.
+    """
+
+    print(test_fast_AFS.__doc__)
+
+    cn = ContNormAlgg()
+    wv = np.linspace(5000, 5050, 4080)
+    blaze = 1 - ((wv - 5025) / 30) ** 2
+    lines = np.exp(-((wv[:, None] - rng.uniform(5000, 5050, 60)) / 0.02) ** 2).sum(axis=1).clip(0, 0.9)
+    flux = blaze * (1 - 0.5 * lines) + rng.normal(0, 0.005, len(wv))
+
+    # unsorted wavelengths give the same result in the input order
+    shuffle = rng.permutation(len(wv))
+    normalized, fit = cn.fast_AFS(wv[shuffle], flux[shuffle])
+    scale = (wv[-1] - wv[0]) / 10 / np.max(flux)
+
+    assert np.max(np.abs(fit / scale - blaze[shuffle])) < 0.05
+    assert np.allclose(normalized, flux[shuffle] * scale / fit)
+    assert abs(np.median(normalized[lines[shuffle] < 0.01]) - 1) < 0.01
+
+
+def test_find_vertices():
+
+    """
+    Test find_vertices of ContNormAlgg class against the scan of the wavelength series for each vertex,
+    with duplicate wavelengths.
+    """
+
+    print(test_find_vertices.__doc__)
+
+    cn = ContNormAlgg()
+    ref = pd.Series(rng.permutation(np.round(rng.uniform(5000, 5010, 300), 1)))
+    vertex_wv = rng.choice(ref.values, 50)
+
+    expected = [ref[ref == wv].index[0] for wv in vertex_wv]
+    assert cn.find_vertices(ref.values, vertex_wv) == expected
+    assert cn.find_vertices(ref.values, vertex_wv, np.argsort(ref.values, kind='stable')) == expected
@@ -56,6 +56,33 @@ def test_aux_exceptions():
         # deleting a core HDU
         data.del_extension('PRIMARY')
 
+def test_lazy_read():
+    '''
+    Read a KPF file lazily and check that extensions are only read when accessed
+    '''
+    try:
+        os.mkdir('temp_level0_lazy')
+    except FileExistsError:
+        pass
+
+    data = KPF0()
+    data['GREEN_CCD'] = np.arange(12, dtype=np.float32).reshape(3, 4)
+    data.to_fits('temp_level0_lazy/lazy.fits')
+
+    data2 = KPF0.from_fits('temp_level0_lazy/lazy.fits', lazy=True)
+    assert('GREEN_CCD' not in data2.__dict__)
+    assert(data2.header['GREEN_CCD']['NAXIS'] == 2)
+    assert(np.all(data2['GREEN_CCD'] == data['GREEN_CCD']))
+    assert('GREEN_CCD' in data2.__dict__)
+
+    data2.del_extension('RED_CCD')
+    assert('RED_CCD' not in data2.extensions.keys())
+    data2.to_fits('temp_level0_lazy/lazy2.fits')
+    data3 = KPF0.from_fits('temp_level0_lazy/lazy2.fits')
+    assert(np.all(data3['GREEN_CCD'] == data['GREEN_CCD']))
+
+    shutil.rmtree('temp_level0_lazy')
+
 # =============================================================================
 # IO
 # Level 0 path: 
@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 from astropy.io import fits
 import numpy as np
 from modules.spectral_extraction.src.alg import SpectralExtractionAlg
+from modules.spectral_extraction.src.alg_parallel import SpectralExtractionParallel
 import configparser
 import os
 load_dotenv()
@@ -320,3 +321,61 @@ def test_optimal_extraction_vertical():
 def test_optimal_extraction_normal():
     method = SpectralExtractionAlg.NORMAL
     optimal_extraction_by_method(method)
+
+
+def test_optimal_extraction_columns():
+    rng = np.random.default_rng(0)
+    order_h, order_w = 12, 200
+    order_data = rng.random((order_h, order_w)) * 1000.0
+    order_flat = rng.random((order_h, order_w))
+    order_flat[:, 10:15] = 0.0
+
+    opt_result = SpectralExtractionAlg.optimal_extraction(order_data, order_flat, order_h, order_w)['extraction']
+    col_result = SpectralExtractionAlg.optimal_extraction_columns(order_data.T, order_flat.T)
+
+    assert np.shape(col_result) == (1, order_w), 'wrong result size'
+    assert np.allclose(opt_result, col_result, rtol=1e-12, atol=0.0), 'unmatched optimal extraction by columns'
+    assert not np.any(col_result[0, 10:15]), 'non-zero result for columns with no flat data'
+
+
+def test_clip_cache(tmp_path):
+    clip_pixels = [[[(1, 0, 0.25), (2, 0, 0.75)], None], [[(1, 1, 1.0)], [(2, 1, 0.5), (3, 1, 0.5)]]]
+    clip_areas = SpectralExtractionAlg.make_clip_areas(10, [1, 1], np.array([5, 6]), clip_pixels, [4, 3])
+    clip_file = str(tmp_path / ('test_order_0' + SpectralExtractionAlg.CLIP_CACHE_EXT))
+    SpectralExtractionAlg.write_clip_cache(clip_file, clip_areas, 'checksum')
+
+    assert SpectralExtractionAlg.read_clip_cache(clip_file, 'other') is None, 'clip file from other order trace'
+    cached_areas = SpectralExtractionAlg.read_clip_cache(clip_file, 'checksum')
+    assert cached_areas['y_center'] == 10 and cached_areas['edges'] == [1, 1]
+    assert np.array_equal(cached_areas['x_output'], [5, 6])
+
+    image = np.arange(12, dtype=float).reshape((3, 4))
+    rectified = SpectralExtractionAlg.get_clip_matrix(cached_areas) @ image.ravel()
+    assert np.allclose(rectified, [0.25 * 1 + 0.75 * 2, 0.0, 5.0, 0.5 * 6 + 0.5 * 7]), 'wrong rectified flux'
+
+    rectified_order = SpectralExtractionAlg.rectify_order_data(cached_areas, image)
+    assert np.shape(rectified_order) == (2, 2), 'wrong rectified order size'
+    assert np.allclose(rectified_order, [[1.75, 5.0], [0.0, 6.5]]), 'wrong rectified order'
+
+
+def test_extract_spectrum_parallel():
+    test_data_dir = os.getenv('KPFPIPE_TEST_DATA') + '/'
+    order_trace_csv = test_data_dir + \
+        'order_trace_test/for_optimal_extraction/paras_poly_3sigma_gaussian_pixel_3_width_3.csv'
+    order_trace_result = np.genfromtxt(order_trace_csv, delimiter=',')
+    order_trace_header = {'POLY DEGREE': 3}
+
+    opt_ext = start_paras_optimal_extraction()
+    order_sets = [np.arange(0, 4), np.arange(4, 8)]
+    results = [opt_ext.extract_spectrum(order_set=o_set, first_index=0) for o_set in order_sets]
+
+    opt_ext = start_paras_optimal_extraction()
+    opt_ext.update_spectrum_flux()
+    with SpectralExtractionParallel(opt_ext, order_trace_result, order_trace_header, None, 2) as extraction_pool:
+        pending_results = [extraction_pool.submit(o_set, 0) for o_set in order_sets]
+        results_p = [pending.result() for pending in pending_results]
+
+    for result, result_p in zip(results, results_p):
+        is_equal, msg = np_equal(result['spectral_extraction_result'].values,
+                                 result_p['spectral_extraction_result'].values, "parallel extraction on paras: ")
+        assert is_equal, msg
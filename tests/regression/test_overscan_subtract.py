@@ -0,0 +1,111 @@
+import logging
+import numpy as np
+from modules.Utils.overscan_subtract import OverscanSubtraction
+
+prescan_reg = [0, 4]
+datasec_ncols = 40
+datasec_nrows = 30
+oscan_clip_no = 5
+n_sigma = 2.5
+order = 2
+
+exts = ['GREEN_AMP1', 'GREEN_AMP2', 'GREEN_AMP3', 'GREEN_AMP4']
+channel_keys = [4, 1, 3, 2]
+channel_rows = [1, 1, 2, 2]
+channel_cols = [1, 2, 1, 2]
+
+
+def make_amps(rng, shapes):
+    amps = []
+    for shape in shapes:
+        amp = rng.normal(1000.0, 5.0, shape) + np.linspace(0.0, 3.0, shape[0])[:, None]
+        amp[::7, -3] += 500.0                   # Overscan outliers.
+        amps.append(amp)
+    return amps
+
+
+def make_overscan_subtraction(mode):
+    oscan = OverscanSubtraction.__new__(OverscanSubtraction)
+    oscan.mode = mode
+    oscan.order = order
+    oscan.oscan_clip_no = oscan_clip_no
+    oscan.prescan_reg = prescan_reg
+    oscan.channel_datasec_ncols = datasec_ncols
+    oscan.channel_datasec_nrows = datasec_nrows
+    oscan.n_sigma = n_sigma
+    oscan.overscan_clipped_mean = {}
+    oscan.logger = logging.getLogger('test_overscan_subtract')
+    return oscan
+
+
+def orient(img, key):
+    return {1: img[:, ::-1], 2: img[::-1, ::-1], 3: img[::-1, :], 4: img}[key]
+
+
+def subtract_row_by_row(amps, mode):
+
+    """
+    Overscan subtraction of one amplifier at a time and, for median and polynomial modes, one row at a time,
+    as by the original per-amplifier loop. Returns the full frame image and the clipped means by extension.
+    """
+
+    clipped_means = {}
+    quadrants = {}
+    for amp, key, ext, row, col in zip(amps, channel_keys, exts, channel_rows, channel_cols):
+        img = orient(amp, key)
+        srl = np.arange(datasec_ncols + prescan_reg[1], img.shape[1])
+        srl = srl[oscan_clip_no:len(srl) - 1 - oscan_clip_no]
+        img = img[:, prescan_reg[1]:-1]
+        sub = np.empty_like(img)
+        if mode == 'median':
+            for i in range(img.shape[0]):
+                sub[i] = img[i] - np.median(img[i, srl])
+        elif mode == 'polynomial':
+            means = np.array([np.mean(img[i, srl]) for i in range(img.shape[0])])
+            xx = np.arange(img.shape[0])
+            fit = np.polyval(np.polyfit(xx, means, order), xx)
+            for i in range(img.shape[0]):
+                sub[i] = img[i] - fit[i]
+        else:
+            a = img[:, srl]
+            med = np.median(a)
+            sigma = 0.5 * (np.percentile(a, 84) - np.percentile(a, 16))
+            keep = (a >= med - n_sigma * sigma) & (a <= med + n_sigma * sigma)
+            clipped_means[ext] = np.mean(a[keep])
+            sub = img - clipped_means[ext]
+        quadrants[(row, col)] = orient(sub[:datasec_nrows, :datasec_ncols], key)
+    full_frame_img = np.block([[quadrants[(1, 1)], quadrants[(1, 2)]], [quadrants[(2, 1)], quadrants[(2, 2)]]])
+    return full_frame_img, clipped_means
+
+
+def test_run_oscan_subtraction():
+
+    """
+    Test run_oscan_subtraction method of OverscanSubtraction class against the row-by-row subtraction of each
+    amplifier, for amplifiers of the same shape (stacked) and of different shapes (one at a time).
+    """
+
+    print(test_run_oscan_subtraction.__doc__)
+
+    rng = np.random.default_rng(0)
+    same_shape = [(36, 60)] * 4
+    ragged_shape = [(36, 60), (36, 63), (38, 60), (36, 60)]
+
+    for shapes in [same_shape, ragged_shape]:
+        amps = make_amps(rng, shapes)
+        for mode in ['median', 'polynomial', 'clippedmean']:
+            expected, clipped_means = subtract_row_by_row(amps, mode)
+
+            oscan = make_overscan_subtraction(mode)
+            channel_imgs = np.array(amps) if shapes == same_shape else amps
+            full_frame_img = oscan.run_oscan_subtraction(channel_imgs, [1, 2, 3, 4], channel_keys, channel_rows,
+                                                         channel_cols, exts)
+
+            assert full_frame_img.shape == (2 * datasec_nrows, 2 * datasec_ncols)
+            assert np.allclose(full_frame_img, expected, rtol=0.0, atol=1.0e-9), mode
+
+            if mode == 'clippedmean':
+                # OSCANV1..OSCANV4 are written in the order of the channel extensions
+                assert list(oscan.overscan_clipped_mean) == exts
+                assert np.allclose([oscan.overscan_clipped_mean[ext] for ext in exts],
+                                   [clipped_means[ext] for ext in exts], rtol=1.0e-12)
@@ -4,6 +4,8 @@ from astropy.io import fits
 import numpy as np
 from modules.radial_velocity.src.alg import RadialVelocityAlg
 from modules.radial_velocity.src.alg_rv_init import RadialVelocityAlgInit
+from modules.radial_velocity.src.alg_rv_parallel import RadialVelocityParallelCCF
+from modules.CLib.CCF import CCF_3d_cpython
 import configparser
 import os
 import pandas as pd
@@ -228,6 +230,92 @@ def test_neid_compute_rv_by_cc_c():
             assert is_equal, msg
 
 
+def test_neid_compute_rv_by_cc_numpy():
+    rv_handler = start_neid_radial_velocity()
+    rv_handler.ccf_code = 'numpy'
+
+    rv_result = rv_handler.compute_rv_by_cc(start_seg=s_order, end_seg=e_order)
+    assert 'ccf_ary' in rv_result, "no radial velocity computation result"
+    assert isinstance(rv_result['ccf_ary'], np.ndarray), "wrong radial velocity result type"
+
+    target_file = result_data + str(s_order) + '_' + str(e_order) + '.fits'
+    if os.path.isfile(target_file):
+        target_data = get_result_from_rv_fits(target_file)
+        if target_data is not None:
+            is_equal, msg = np_equal(target_data, rv_result.get('ccf_ary'), "compute radial velocity on neid: ")
+            assert is_equal, msg
+
+
+def test_calc_ccf_vectorized():
+    rv_handler = start_neid_radial_velocity()
+    spectrum = rv_handler.spectrum_data[s_order, 600:-600]
+    wave_cal = rv_handler.wave_cal[s_order, 600:-600]
+    line = rv_handler.get_mask_line()
+    line_index = np.where((line.get('bc_corr_start') > np.min(wave_cal)) &
+                          (line.get('bc_corr_end') < np.max(wave_cal)))[0]
+    n_pixel = np.size(wave_cal)
+    x_pixel_wave = np.zeros(n_pixel + 1)
+    x_pixel_wave[1:n_pixel] = (wave_cal[1:] + wave_cal[:-1]) / 2.0
+    x_pixel_wave[0] = wave_cal[0] - (wave_cal[1] - wave_cal[0]) / 2.0
+    x_pixel_wave[n_pixel] = wave_cal[-1] + (wave_cal[-1] - wave_cal[-2]) / 2.0
+    args = (rv_handler.velocity_steps, line['start'][line_index], line['end'][line_index], x_pixel_wave,
+            spectrum, line['weight'][line_index], np.ones(n_pixel), 0.0)
+
+    ccf, ccf_pixels = rv_handler.calc_ccf(*args)
+    ccf_v, ccf_pixels_v = rv_handler.calc_ccf_vectorized(*args)
+
+    is_equal, msg = np_equal(ccf, ccf_v, "vectorized ccf: ")
+    assert is_equal, msg
+    is_equal, msg = np_equal(ccf_pixels, ccf_pixels_v, "vectorized ccf pixels: ")
+    assert is_equal, msg
+
+
+def test_calc_ccf_steps_c():
+    rv_handler = start_neid_radial_velocity_c()
+    spectrum = np.pad(rv_handler.spectrum_data[s_order, 600:-600], (1, 1), 'constant').astype('float64')
+    wave_cal = rv_handler.wave_cal[s_order, 599:-599].astype('float64')
+    line = rv_handler.get_mask_line()
+    line_index = np.where((line.get('bc_corr_start') > np.min(wave_cal)) &
+                          (line.get('bc_corr_end') < np.max(wave_cal)))[0]
+    args = [line['start'][line_index].astype('float64'), line['end'][line_index].astype('float64'), wave_cal,
+            spectrum, line['weight'][line_index].astype('float64'), np.ones(np.size(spectrum))]
+
+    ccf = np.array([CCF_3d_cpython.calc_ccf(*args, v, 0.0) for v in rv_handler.velocity_loop])
+    ccf_steps = CCF_3d_cpython.calc_ccf_steps(*args, rv_handler.velocity_loop, 0.0)
+
+    is_equal, msg = np_equal(ccf, ccf_steps, "ccf on all velocity steps: ")
+    assert is_equal, msg
+
+
+def test_neid_compute_rv_by_cc_parallel():
+    rv_handler = start_neid_radial_velocity()
+    rv_result = rv_handler.compute_rv_by_cc(start_seg=s_order, end_seg=e_order)
+
+    rv_init, _ = init_radial_velocity()
+    rv_handler = start_neid_radial_velocity()
+    with RadialVelocityParallelCCF(rv_init.start(), 2) as ccf_pool:
+        rv_handler.get_segment_limits()
+        pending_ccf, _ = rv_handler.submit_rv_on_spectrum(start_seg=s_order, end_seg=e_order, ccf_pool=ccf_pool)
+        rv_result_p = rv_handler.compute_rv_by_cc(start_seg=s_order, end_seg=e_order, pending_ccf=pending_ccf)
+
+    is_equal, msg = np_equal(rv_result.get('ccf_ary'), rv_result_p.get('ccf_ary'), "parallel ccf on neid: ")
+    assert is_equal, msg
+
+    # the pool kept for the same init data is reused after its shared memory is released
+    init_data = rv_init.start()
+    ccf_pool = RadialVelocityParallelCCF.get_pool(init_data, 2)
+    for _ in range(2):
+        assert RadialVelocityParallelCCF.get_pool(init_data, 2) is ccf_pool
+        rv_handler = start_neid_radial_velocity()
+        rv_handler.get_segment_limits()
+        pending_ccf, _ = rv_handler.submit_rv_on_spectrum(start_seg=s_order, end_seg=e_order, ccf_pool=ccf_pool)
+        rv_result_p = rv_handler.compute_rv_by_cc(start_seg=s_order, end_seg=e_order, pending_ccf=pending_ccf)
+        ccf_pool.release()
+        is_equal, msg = np_equal(rv_result.get('ccf_ary'), rv_result_p.get('ccf_ary'), "reused pool ccf on neid: ")
+        assert is_equal, msg
+    ccf_pool.close()
+
+
 def test_neid_make_reweighting_ratio_table():
     rv_file = os.getenv('KPFPIPE_TEST_DATA') + result_lev2_dir + 'neidL2_20191217T030724.fits'
     table_ref = os.getenv('KPFPIPE_TEST_DATA') + pytest_dir + 'ccf_ratio_030724_' \
@@ -107,6 +107,32 @@ a = 42
 invoke_subrecipe("{}")
 """
 
+nested_recipe = """# test resuming within nested blocks
+n = 0
+for a in [1, 2]:
+    for b in [3, 4, 5]:
+        if b > 3:
+            test_primitive_validate_args(b > 3, True)
+            n = n + 1
+        else:
+            test_primitive_validate_args(b, 3)
+        test_primitive_validate_args(a < 3, True)
+    test_primitive_validate_args(b, 5)
+test_primitive_validate_args(n, 4)
+"""
+
+loop_sub_recipe = """# subrecipe to invoke in a loop
+n = n + 1
+test_primitive_validate_args(n, a)
+"""
+
+loop_main_recipe = """# test subrecipe invoked in a loop, run as for several files in watch mode
+n = 0
+for a in [1, 2]:
+    invoke_subrecipe("{}")
+test_primitive_validate_args(n, 2)
+"""
+
 # experimental_recipe = """s = 'panama'
 # t = 'nam' in s
 # f = 'man' in s
@@ -147,6 +173,48 @@ def test_recipe_subrecipe():
         f.seek(0)
         run_recipe(subrecipe_main_recipe.format(f.name))
 
+def test_recipe_nested():
+    try:
+        run_recipe(nested_recipe)
+    except Exception as e:
+        assert False, f"test_recipe_nested: unexpected exception {e}"
+
+def test_recipe_subrecipe_loop_repeated():
+    with tempfile.NamedTemporaryFile(mode='w+') as f:
+        f.write(loop_sub_recipe)
+        f.seek(0)
+        run_recipe(loop_main_recipe.format(f.name), repeat=3)
+
+def test_recipe_subrecipe_modified():
+    # a subrecipe edited between two files in watch mode is parsed again
+    from keckdrpframework.core.framework import Framework
+    from keckdrpframework.models.arguments import Arguments
+    from kpfpipe.tools.recipe_test_unit import KpfPipelineForTesting, framework_config, pipe_config
+
+    framework = Framework(KpfPipelineForTesting, framework_config, testing=True)
+    framework.pipeline.start(pipe_config)
+    with tempfile.NamedTemporaryFile(mode='w+', suffix='.recipe') as sub, \
+            tempfile.NamedTemporaryFile(mode='w+', suffix='.recipe') as main:
+        main.write('invoke_subrecipe("{}")\n'.format(sub.name))
+        main.flush()
+        arg = Arguments(name="start_recipe_args", recipe=main.name)
+        arg.file_path = ''
+        visitors = []
+        for n in [1, None, 22]:
+            if n is not None:
+                sub.seek(0)
+                sub.truncate()
+                sub.write('n = {}\n'.format(n))
+                sub.flush()
+            else:
+                n = 1
+            framework.append_event('start_recipe', arg)
+            framework.main_loop()
+            visitors.append(framework.pipeline._recipe_visitor)
+            subrecipe = framework.pipeline._recipe_ast.body[0].value._kpf_subrecipe
+            assert subrecipe.body[0].value.value == n
+        # the recipe is compiled again only once its subrecipe is modified
+        assert visitors[1] is visitors[0] and visitors[2] is not visitors[1]
 
 # def test_recipe_experimental():
 #     try:
@@ -161,3 +229,6 @@ def main():
     test_recipe_undefined_variable()
     test_recipe_bad_assignment()
     test_recipe_subrecipe()
+    test_recipe_nested()
+    test_recipe_subrecipe_loop_repeated()
+    test_recipe_subrecipe_modified()
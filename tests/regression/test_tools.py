@@ -24,3 +24,217 @@ from kpfpipe.tools.harps2kpf import Converter
 #     assert(np.all(C1.wave == C3.wave))
 #     assert(C1.berv == C2.berv == C3.berv)
 #     assert(C1.julian == C2.julian == C3.julian)
+
+
+def test_checksum_tools(tmp_path):
+    import hashlib
+    import os
+    from kpfpipe.tools import checksum_tools
+
+    fn = str(tmp_path / 'checksum.dat')
+    content = os.urandom(3 * 1024 + 17)
+    with open(fn, 'wb') as f:
+        f.write(content)
+    expected = hashlib.md5(content).hexdigest()
+
+    checksum_tools.clear_md5_cache()
+    assert checksum_tools.md5_file(fn, block_size=1024) == expected
+    assert checksum_tools.verify_md5(fn, expected)
+
+    # a changed file is hashed again
+    with open(fn, 'ab') as f:
+        f.write(b'more')
+    assert checksum_tools.md5_file(fn) == hashlib.md5(content + b'more').hexdigest()
+
+
+def test_git_provenance_override(monkeypatch, tmp_path):
+    from kpfpipe.tools import git_tools
+
+    info_file = tmp_path / 'git_info.txt'
+    info_file.write_text('commit=abc123\nbranch=main\ntag=v1.0\n')
+    monkeypatch.setenv(git_tools.GIT_INFO_FILE_ENV, str(info_file))
+    monkeypatch.setenv(git_tools.GIT_TAG_ENV, 'v2.0')
+    monkeypatch.setattr(git_tools, '_git_provenance', None)
+
+    assert git_tools.get_git_provenance() == ('abc123', 'main', 'v2.0')
+    # cached for the process
+    monkeypatch.delenv(git_tools.GIT_TAG_ENV)
+    assert git_tools.get_git_provenance() == ('abc123', 'main', 'v2.0')
+
+
+def test_worker_stats():
+    import time
+    from kpfpipe.tools.worker_stats import WorkerStats
+
+    stats = WorkerStats('KPFPipe-0')
+    assert stats.finish_file() is None
+    stats.start_file('a.fits', queued_at=time.time() - 10.)
+    done = stats.finish_file()
+    assert done['file_path'] == 'a.fits'
+    assert done['latency'] >= 10. > done['processing_time']
+    # a file not finished before the next one starts
+    stats.start_file('b.fits')
+    stats.start_file('c.fits')
+    stats.finish_file()
+    assert (stats.n_files, stats.n_unfinished) == (2, 1)
+    assert stats.max_latency >= 10.
+    assert stats.summary().startswith('KPFPipe-0: 2 files')
+
+
+def test_reference_cache(monkeypatch, tmp_path):
+    import os
+    from kpfpipe.tools import reference_cache
+    from kpfpipe.models.level0 import KPF0
+
+    reference_cache.clear_reference_cache()
+    fn = str(tmp_path / 'trace.csv')
+    with open(fn, 'w') as f:
+        f.write('a,b\n1,2\n3,4\n')
+    loads = []
+    def loader(f):
+        loads.append(f)
+        return np.loadtxt(f, delimiter=',', skiprows=1)
+
+    first = reference_cache.load_reference(fn, loader)
+    first[0, 0] = -1.
+    second = reference_cache.load_reference(fn, loader)
+    # the cached data is copied, not modified by the caller
+    assert len(loads) == 1 and second[0, 0] == 1.
+    # a modified file is read again
+    with open(fn, 'w') as f:
+        f.write('a,b\n5,6\n')
+    os.utime(fn, ns=(0, 0))
+    assert reference_cache.load_reference(fn, loader)[0] == 5. and len(loads) == 2
+
+    # data model with its image shared through a memory-mapped file
+    monkeypatch.setenv(reference_cache.REFERENCE_CACHE_DIR_ENV, str(tmp_path / 'shared'))
+    monkeypatch.setattr(reference_cache, 'SHARE_MIN_BYTES', 0)
+    fits_fn = str(tmp_path / 'master.fits')
+    data = KPF0()
+    data.GREEN_CCD = np.arange(12, dtype=np.float32).reshape(3, 4)
+    data.to_fits(fits_fn)
+    l0 = KPF0.from_fits(fits_fn, cache=True)
+    l0.GREEN_CCD += 1
+    l0_again = KPF0.from_fits(fits_fn, cache=True)
+    assert isinstance(l0_again.GREEN_CCD, np.memmap)
+    assert np.array_equal(l0_again.GREEN_CCD, data.GREEN_CCD)
+    assert len(os.listdir(tmp_path / 'shared')) >= 1
+    reference_cache.clear_reference_cache()
+
+
+def use_fake_db(monkeypatch, queries):
+    import psycopg2
+    from kpfpipe.tools import db_tools
+
+    class FakeCursor:
+        def __enter__(self):
+            return self
+        def __exit__(self, *args):
+            pass
+        def execute(self, query, args=None):
+            queries.append(query)
+            if 'bad' in query:
+                raise (psycopg2.ProgrammingError if ';\n' in query else psycopg2.OperationalError)(query)
+            self.records = [(0, 'p1', 'p2'), (1, 'q1', 'q2')] if 'l0infobits' in query else [('PostgreSQL',)]
+        def fetchone(self):
+            return self.records[0]
+        def fetchall(self):
+            return self.records
+    class FakeConnection:
+        closed = 0
+        def cursor(self):
+            return FakeCursor()
+        def commit(self):
+            queries.append('commit')
+        def rollback(self):
+            pass
+    class FakePool:
+        def __init__(self, minconn, maxconn, **kwargs):
+            self.conn = FakeConnection()
+        def getconn(self):
+            return self.conn
+        def putconn(self, conn, close=False):
+            pass
+        def closeall(self):
+            pass
+
+    monkeypatch.setattr(db_tools.pool, 'ThreadedConnectionPool', FakePool)
+    monkeypatch.setenv('DBNAME', 'test_db_tools')
+    db_tools.close_db_pools()
+    db_tools.clear_db_cache()
+
+
+def test_db_tools(monkeypatch):
+    import os
+    import psycopg2
+    from kpfpipe.tools import db_tools
+
+    queries = []
+    use_fake_db(monkeypatch, queries)
+
+    for _ in range(2):
+        with db_tools.db_connection() as conn:
+            assert db_tools.get_db_version(conn) == ('PostgreSQL',)
+            assert db_tools.get_l0_infobit_params(conn) == (['p1', 'q1'], ['p2', 'q2'])
+    # version and infobits queried once, the infobits in a single query
+    assert len([query for query in queries if query != 'commit']) == 2
+
+    queries.clear()
+    assert db_tools.queue_db_insert('insert 1;', batch_size=2) == 0 and queries == []
+    assert db_tools.queue_db_insert('insert 2', batch_size=2) == 2
+    assert queries == ['insert 1;\ninsert 2;', 'commit']
+
+    # a lost connection while retrying the statements one at a time keeps the statements not yet run
+    queries.clear()
+    for query in ['insert 3', 'insert bad', 'insert 4']:
+        db_tools.queue_db_insert(query, batch_size=4)
+    with pytest.raises(psycopg2.OperationalError):
+        db_tools.flush_db_inserts()
+    assert queries[-3:] == ['insert 3', 'commit', 'insert bad']
+    key = (os.getpid(), db_tools._connection_params())
+    assert [query for query, _ in db_tools._pending_inserts[key]] == ['insert bad', 'insert 4']
+
+    # the pending inserts of another (parent) process are not run at exit
+    db_tools._pending_inserts[(-1, key[1])] = db_tools._pending_inserts.pop(key)
+    queries.clear()
+    db_tools._flush_at_exit()
+    assert queries == []
+    db_tools._pending_inserts.pop((-1, key[1]))
+    db_tools.close_db_pools()
+    db_tools.clear_db_cache()
+
+
+def test_db_inserts_flushed_by_pipeline(monkeypatch):
+    import os
+    from keckdrpframework.core.framework import Framework
+    from keckdrpframework.models.arguments import Arguments
+    from kpfpipe.tools import db_tools
+    from kpfpipe.tools.recipe_test_unit import (run_recipe, KpfPipelineForTesting, framework_config,
+                                                pipe_config)
+
+    queries = []
+    use_fake_db(monkeypatch, queries)
+
+    # the inserts queued by a recipe are run when it finishes
+    db_tools.queue_db_insert('insert 1', batch_size=10)
+    run_recipe('a = 1\n')
+    assert queries == ['insert 1;', 'commit']
+
+    # and those still queued when the pipeline exits, which ends the process with os._exit()
+    class PipelineExit(Exception):
+        pass
+    def fake_exit(code):
+        raise PipelineExit(code)
+
+    framework = Framework(KpfPipelineForTesting, framework_config, testing=True)
+    framework.pipeline.start(pipe_config)
+    queries.clear()
+    for query in ['insert 2', 'insert 3']:
+        db_tools.queue_db_insert(query, batch_size=10)
+    monkeypatch.setattr(os, '_exit', fake_exit)
+    framework.append_event('exit', Arguments(name='exit_args'))
+    with pytest.raises(PipelineExit):
+        framework.main_loop()
+    assert queries == ['insert 2;\ninsert 3;', 'commit']
+    assert not db_tools._pending_inserts.get((os.getpid(), db_tools._connection_params()))
+    db_tools.close_db_pools()
@@ -63,3 +63,58 @@ def etalon_run():
     peak_wavelengths_ang = np.load(linelist_path, allow_pickle=True).tolist()
     et_init = WaveCalibration(cal_type,quicklook)
     wl_soln, wls_and_pixels = et_init.run_wavelength_cal(calflux,rough_wls,peak_wavelengths_ang=peak_wavelengths_ang)
+
+def test_fit_gaussians():
+    wavecal = WaveCalibration.__new__(WaveCalibration)
+    rng = np.random.default_rng(0)
+    n_peaks, window = 50, 21
+    x = np.tile(np.arange(window, dtype=float), (n_peaks, 1))
+    truth = np.array([rng.uniform(1e3, 1e4, n_peaks), rng.uniform(8., 12., n_peaks),
+                      rng.uniform(1., 2., n_peaks), rng.uniform(10., 100., n_peaks)])
+    y = wavecal.integrate_gaussian(x, *truth[:, :, np.newaxis]) + rng.normal(0., 5., (n_peaks, window))
+    # shorter windows are padded
+    valid = np.ones(y.shape, dtype=bool)
+    valid[:5, 17:] = False
+
+    coefs = wavecal.fit_gaussians(x, y, valid)
+    assert coefs.shape == (4, n_peaks)
+    for j in range(n_peaks):
+        xj, yj = x[j, valid[j]], y[j, valid[j]]
+        i = np.argmax(yj[len(yj) // 4 : len(yj) * 3 // 4]) + len(yj) // 4
+        popt, _ = curve_fit(wavecal.integrate_gaussian, xj, yj, p0=[yj[i], xj[i], 1, np.min(yj)], maxfev=100000)
+        assert np.allclose(coefs[:, j], popt, rtol=1e-4, atol=1e-5)
+
+    # too few points to fit
+    assert np.all(np.isnan(wavecal.fit_gaussians(x[:1, :3], y[:1, :3])))
+
+def test_fit_many_orders_parallel():
+    rng = np.random.default_rng(1)
+    n_orders, n_pixels = 4, 2000
+    x = np.arange(n_pixels)
+    flux = np.full((n_orders, n_pixels), 50.)
+    rough_wls = np.zeros((n_orders, n_pixels))
+    expected_peak_locs = {}
+    for order_num in range(n_orders):
+        centers = np.arange(15, n_pixels - 15, 25.3)
+        n_lines = len(centers)
+        centers = centers + rng.uniform(-0.3, 0.3, n_lines)
+        for c, a, s in zip(centers, rng.uniform(500, 5000, n_lines), rng.uniform(1, 1.8, n_lines)):
+            flux[order_num] += a * 0.5 * (erf((x - c + 0.5) / (np.sqrt(2) * s)) - erf((x - c - 0.5) / (np.sqrt(2) * s)))
+        rough_wls[order_num] = 5000 + 50 * order_num + 0.01 * x
+        expected_peak_locs[order_num] = {'known_wavelengths_vac': 5000 + 50 * order_num + 0.01 * centers,
+                                         'line_positions': centers + rng.normal(0, 0.2, n_lines)}
+    flux += rng.normal(0, np.sqrt(flux))
+
+    results = []
+    for n_workers in (1, 2):
+        config = configparser.ConfigParser()
+        config['PARAM'] = {'wls_workers': str(n_workers), 'fit_order': '5', 'n_sections': '1'}
+        wavecal = WaveCalibration('ThAr', False, False, 0, n_orders - 1, config=config)
+        results.append(wavecal.fit_many_orders(flux, list(range(n_orders)), rough_wls=rough_wls,
+                                               expected_peak_locs=expected_peak_locs))
+    (serial_wls, serial_lines), (parallel_wls, parallel_lines) = results
+    assert np.array_equal(serial_wls, parallel_wls)
+    assert list(serial_lines) == list(parallel_lines)
+    for order_num in serial_lines:
+        for key in serial_lines[order_num]:
+            assert np.array_equal(serial_lines[order_num][key], parallel_lines[order_num][key])